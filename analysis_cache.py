@@ -0,0 +1,183 @@
+import os
+import hashlib
+import logging
+import numpy as np
+
+from audio_analysis import ANALYSIS_CHANNELS, ANALYSIS_FRAME_RATE, AudioEnvelope, FRAME_LENGTH_MS, compute_file_envelope
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 缓存目录，与config.json放在同一目录下
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_cache')
+
+# 默认缓存上限(MB)，一小时音频的响度曲线和波形峰值共约4.5MB
+DEFAULT_CACHE_SIZE_MB = 200
+
+# 计算文件哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_cache_key(file_path):
+    """
+    文件的缓存键：内容哈希加上文件大小和修改时间
+
+    文件被修改或替换后键就会变化，旧的缓存项不再命中，之后被LRU淘汰。
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}_{stat.st_size}_{stat.st_mtime_ns}"
+
+
+class AnalysisCache:
+    """
+    磁盘上的分析缓存
+
+    每个输入文件的响度曲线(连同波形峰值)保存为一个 .npz 文件，换参数重新分段和绘制波形时不必再解码。
+    命中时更新文件的修改时间，超过容量上限时按修改时间淘汰最久未使用的项(LRU)。
+
+    低采样率分析和按原格式分析(full_rate)的每帧响度不同，两者分开保存，
+    缓存项中记录分析时的采样率和声道数，与要求的不一致时视为未命中。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_CACHE_SIZE_MB):
+        """
+        参数:
+        cache_dir (str): 缓存目录
+        max_size_mb (int): 缓存总大小上限(MB)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self._keys = {}  # (路径, 大小, 修改时间) -> 缓存键，避免同一文件重复计算哈希
+
+    def key_for(self, file_path):
+        """返回文件的缓存键，同一次运行中相同的文件只计算一次哈希"""
+        stat = os.stat(file_path)
+        identity = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if identity not in self._keys:
+            self._keys[identity] = file_cache_key(file_path)
+        return self._keys[identity]
+
+    def _entry_path(self, key, full_rate=False):
+        return os.path.join(self.cache_dir, f"{key}_full.npz" if full_rate else f"{key}.npz")
+
+    def load(self, file_path, full_rate=False):
+        """
+        读取文件的响度曲线
+
+        参数:
+        file_path (str): 音频文件路径
+        full_rate (bool): 为True时读取按原格式分析的结果，否则读取低采样率分析的结果
+
+        返回:
+        AudioEnvelope: 没有缓存或缓存无效时返回None
+        """
+        if self.max_bytes <= 0:
+            return None
+        try:
+            path = self._entry_path(self.key_for(file_path), full_rate)
+            if not os.path.exists(path):
+                return None
+            with np.load(path) as data:
+                if int(data['frame_length']) != FRAME_LENGTH_MS:
+                    return None
+                # 早期的缓存项没有记录分析格式，不知道是哪种分析的结果，同样视为未命中
+                if 'analysis_rate' not in data.files:
+                    return None
+                expected = ((int(data['frame_rate']), int(data['channels'])) if full_rate
+                            else (ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS))
+                if (int(data['analysis_rate']), int(data['analysis_channels'])) != expected:
+                    return None
+                # 早期的缓存项和按原采样率分析的结果没有波形峰值
+                peaks = data['peaks'] if 'peaks' in data.files else None
+                envelope = AudioEnvelope(data['frame_dbfs'], int(data['duration_ms']), float(data['dbfs']),
+                                         int(data['frame_rate']), int(data['channels']), int(data['frame_length']),
+                                         peaks)
+            # 更新修改时间，作为LRU的访问时间
+            os.utime(path)
+            logger.info(f"分析缓存命中: {file_path}")
+            return envelope
+        except Exception as e:
+            logger.warning(f"读取分析缓存失败: {str(e)}")
+            return None
+
+    def store(self, file_path, envelope, full_rate=False):
+        """
+        保存文件的响度曲线，然后按容量上限淘汰旧的缓存项
+
+        参数:
+        full_rate (bool): 为True时 envelope 是按原格式(envelope.frame_rate、envelope.channels)分析的结果，
+            否则是低采样率单声道分析的结果
+        """
+        if self.max_bytes <= 0:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._entry_path(self.key_for(file_path), full_rate)
+            if full_rate:
+                analysis_rate, analysis_channels = envelope.frame_rate, envelope.channels
+            else:
+                analysis_rate, analysis_channels = ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS
+            # 先写临时文件再替换，中途退出不会留下损坏的缓存项
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            arrays = {} if envelope.peaks is None else {'peaks': envelope.peaks}
+            with open(temp_path, 'wb') as f:
+                np.savez(f, frame_dbfs=envelope.frame_dbfs, duration_ms=envelope.duration_ms, dbfs=envelope.dbfs,
+                         frame_rate=envelope.frame_rate, channels=envelope.channels,
+                         frame_length=envelope.frame_length, analysis_rate=analysis_rate,
+                         analysis_channels=analysis_channels, **arrays)
+            os.replace(temp_path, path)
+            self.evict()
+        except Exception as e:
+            logger.warning(f"写入分析缓存失败: {str(e)}")
+
+    def entries(self):
+        """返回所有缓存项 [(修改时间, 大小, 路径), ...]，最久未使用的在前"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """删除最久未使用的缓存项，直到总大小不超过上限"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logger.info(f"淘汰分析缓存: {path}")
+
+    def clear(self):
+        """清空缓存"""
+        for _, _, path in self.entries():
+            os.remove(path)
+
+
+def load_envelope(file_path, cache=None, progress_callback=None):
+    """
+    读取文件的响度曲线：有缓存时直接读取，否则以低采样率解码计算并写入缓存
+
+    参数:
+    file_path (str): 音频文件路径
+    cache (AnalysisCache): 分析缓存，为None时不使用缓存
+    progress_callback (callable): 计算响度时的进度回调，参数为0-1之间的进度
+
+    返回:
+    AudioEnvelope: 响度曲线
+    """
+    envelope = cache.load(file_path) if cache else None
+    if envelope is None:
+        envelope = compute_file_envelope(file_path, progress_callback=progress_callback)
+        if cache:
+            cache.store(file_path, envelope)
+    return envelope
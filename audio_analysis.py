@@ -0,0 +1,880 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+
+from audio_decoder import DEFAULT_BLOCK_MS, SAMPLE_WIDTH, iter_pcm_blocks, probe_audio
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 检测静默时让ffmpeg输出的采样率和声道数：按10ms分帧的响度只需要低采样率的单声道PCM，
+# 与44.1kHz立体声相比要处理的采样少到约1/11
+ANALYSIS_FRAME_RATE = 8000
+ANALYSIS_CHANNELS = 1
+
+# 分析帧长度(毫秒)，与原先 audio[::10] 的切片步长一致
+FRAME_LENGTH_MS = 10
+
+# 每批处理的分析帧数(6000帧 = 60秒音频)，用于控制临时内存和进度回调频率
+BLOCK_FRAMES = 6000
+
+# 分片并行分析时每个分片至少包含的分析帧数，音频太短时不值得启动进程池
+MIN_SHARD_FRAMES = BLOCK_FRAMES * 5
+
+# 每个片段前后默认保留的静默长度(毫秒)，听起来不会被切得太急
+DEFAULT_KEEP_SILENCE_MS = 200
+
+# 片段的默认最短和最长时长(毫秒)：短于最短时长的片段并入相邻片段，合并后不超过最长时长
+DEFAULT_MIN_SEGMENT_MS = 1000
+DEFAULT_MAX_SEGMENT_MS = 30000
+
+# 短片段只并入间隔不超过该长度(毫秒)的相邻片段，间隔更长时单独成段或被丢弃
+MAX_MERGE_GAP_MS = 1000
+
+# 相对阈值以音频开头这么长(毫秒)的平均响度为参考：流式检测读完这一段就能确定阈值，
+# 之后边解码边确认片段，不必等读完整个文件
+REFERENCE_LEVEL_MS = 60000
+
+# 自动阈值：在滚动窗口(毫秒)内估计背景噪声和语音的响度，窗口之间相隔半个窗口
+NOISE_FLOOR_WINDOW_MS = 30000
+
+# 噪声底和语音响度分别取窗口内响度的这两个百分位
+NOISE_FLOOR_PERCENTILE = 10
+SPEECH_PERCENTILE = 90
+
+# 阈值位于噪声底之上，取噪声底到语音响度之间这一比例处，且至少高出 ADAPTIVE_MIN_MARGIN_DB
+ADAPTIVE_THRESHOLD_RATIO = 0.35
+ADAPTIVE_MIN_MARGIN_DB = 6.0
+
+# 一个窗口的噪声底最多比整个文件的噪声底高出这么多(dB)，
+# 避免连续说话没有停顿的窗口把噪声底估计成语音的响度
+MAX_NOISE_FLOOR_RISE_DB = 15.0
+
+# 完全静音(-inf)的帧按此响度参与统计，即16位PCM的最低电平
+SILENCE_FLOOR_DBFS = -96.0
+
+# 波形峰值金字塔中相邻两层的项数之比
+PEAK_PYRAMID_FACTOR = 4
+
+# 一个音频文件的分析结果：每帧的dBFS、总时长(毫秒)、整体dBFS、采样率、声道数、帧长度(毫秒)，
+# 以及每帧采样的最小值和最大值(低采样率PCM上的16位整数，形状为 (帧数, 2)，没有计算时为None)。
+# 换参数重新分段和绘制波形只需要它，不必重新解码
+AudioEnvelope = namedtuple('AudioEnvelope', ['frame_dbfs', 'duration_ms', 'dbfs', 'frame_rate', 'channels',
+                                             'frame_length', 'peaks'], defaults=(None,))
+
+
+def audio_to_samples(audio):
+    """
+    把AudioSegment的PCM看作 (采样帧数, 声道数) 的NumPy数组
+
+    直接以 raw_data 为底层缓冲区，不复制采样(结果只读)：
+    分析时的峰值内存与解码后的音频大小相当，而不是它的两到三倍。
+    pydub的采样都是小端有符号整数。
+    """
+    dtype = np.dtype(f'<i{audio.sample_width}')
+    return np.frombuffer(audio.raw_data, dtype=dtype).reshape(-1, audio.channels)
+
+
+def _frame_bounds(first_frame, frame_count, duration_ms, samples_per_ms, frame_length):
+    """按pydub的毫秒到采样帧换算，计算一组分析帧的起止采样帧下标"""
+    starts_ms = np.arange(first_frame, first_frame + frame_count, dtype=np.float64) * frame_length
+    ends_ms = np.minimum(starts_ms + frame_length, duration_ms)
+    return (starts_ms * samples_per_ms).astype(np.int64), (ends_ms * samples_per_ms).astype(np.int64)
+
+
+def _frame_sum_squares(samples, start_idx, end_idx):
+    """
+    计算一组连续分析帧的采样平方和
+
+    samples 为 (采样帧数, 声道数) 数组，start_idx/end_idx 是相对它的下标；
+    超出samples末尾的部分视为静音。
+    """
+    total_frames, channels = samples.shape
+    frame_count = len(start_idx)
+    sum_squares = np.zeros(frame_count, dtype=np.float64)
+    if frame_count == 0:
+        return sum_squares
+
+    first = start_idx[0]
+    hop = end_idx[0] - start_idx[0]
+    if hop > 0 and np.all(start_idx == first + np.arange(frame_count) * hop):
+        # 帧长为整数个采样帧：直接reshape成 (帧数, 每帧采样数) 逐行求平方和
+        interleaved = samples.reshape(-1)
+        full = min(total_frames - first, frame_count * hop) // hop
+        if end_idx[-1] - start_idx[-1] != hop:
+            full = min(full, frame_count - 1)
+        rows = interleaved[first * channels:(first + full * hop) * channels].reshape(full, hop * channels)
+        sum_squares[:full] = np.einsum('ij,ij->i', rows, rows, dtype=np.float64)
+
+        # 音频末尾不足一帧的部分，缺失的采样按静音处理
+        if full < frame_count:
+            tail_end = min(end_idx[full], total_frames)
+            tail = interleaved[(first + full * hop) * channels:tail_end * channels]
+            sum_squares[full] = np.einsum('i,i->', tail, tail, dtype=np.float64)
+    else:
+        # 帧长不是整数个采样帧时退回到reduceat
+        block = samples[first:min(end_idx[-1], total_frames)]
+        power = np.append(np.einsum('ij,ij->i', block, block, dtype=np.float64), 0.0)
+        sum_squares[:] = np.add.reduceat(power, np.minimum(start_idx - first, len(power) - 1))
+        sum_squares[end_idx <= start_idx] = 0.0
+
+    return sum_squares
+
+
+def _frame_peaks(samples, start_idx, end_idx):
+    """
+    计算一组连续分析帧内所有声道采样的最小值和最大值
+
+    返回:
+    np.ndarray: 形状为 (帧数, 2) 的int16数组；超出samples末尾的部分视为静音
+    """
+    peaks = np.zeros((len(start_idx), 2), dtype=np.int16)
+    if len(start_idx) == 0:
+        return peaks
+    first = start_idx[0]
+    block = samples[first:min(end_idx[-1], len(samples))]
+    if len(block) == 0:
+        return peaks
+    offsets = np.minimum(start_idx - first, len(block) - 1)
+    peaks[:, 0] = np.minimum.reduceat(block.min(axis=1), offsets)
+    peaks[:, 1] = np.maximum.reduceat(block.max(axis=1), offsets)
+    peaks[(end_idx <= start_idx) | (start_idx - first >= len(block))] = 0
+    return peaks
+
+
+def _to_dbfs(sum_squares, sample_counts, max_possible_amplitude):
+    """由平方和换算dBFS，audioop.rms 返回的是截断后的整数，这里保持一致"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_squares = np.where(sample_counts > 0, sum_squares / np.maximum(sample_counts, 1), 0.0)
+        rms = np.floor(np.sqrt(mean_squares))
+        return 20 * np.log10(rms / max_possible_amplitude)
+
+
+def compute_frame_dbfs(audio, frame_length=FRAME_LENGTH_MS, progress_callback=None):
+    """
+    计算每个分析帧的响度(dBFS)
+
+    结果与逐帧计算 audio[i:i+frame_length].dBFS 一致(只差浮点运算最后一位的舍入)：
+    帧边界使用pydub相同的毫秒到采样帧换算，RMS同样取整，
+    超出音频末尾的部分按静音补零计入分母。
+
+    参数:
+    audio (AudioSegment): 输入音频
+    frame_length (int): 分析帧长度(毫秒)
+    progress_callback (callable): 进度回调，参数为0-1之间的进度
+
+    返回:
+    numpy.ndarray: 每帧的dBFS，完全静音的帧为 -inf
+    """
+    samples = audio_to_samples(audio)
+    duration_ms = len(audio)
+    frame_count = -(-duration_ms // frame_length)
+    start_idx, end_idx = _frame_bounds(0, frame_count, duration_ms, audio.frame_rate / 1000.0, frame_length)
+
+    sum_squares = np.zeros(frame_count, dtype=np.float64)
+    for block_start in range(0, frame_count, BLOCK_FRAMES):
+        block_end = min(block_start + BLOCK_FRAMES, frame_count)
+        sum_squares[block_start:block_end] = _frame_sum_squares(
+            samples, start_idx[block_start:block_end], end_idx[block_start:block_end])
+
+        if progress_callback:
+            progress_callback(block_end / frame_count)
+
+    sample_counts = (end_idx - start_idx) * audio.channels
+    return _to_dbfs(sum_squares, sample_counts, audio.max_possible_amplitude)
+
+
+def _shard_sum_squares(shm_name, shape, dtype, first_frame, frame_count, duration_ms, samples_per_ms, frame_length):
+    """
+    在进程池中计算一个分片内各分析帧的平方和
+
+    PCM通过共享内存读取，不在进程之间复制音频数据；
+    帧边界按整个文件的下标计算，与单进程的结果完全一致。
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        samples = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        start_idx, end_idx = _frame_bounds(first_frame, frame_count, duration_ms, samples_per_ms, frame_length)
+        sum_squares = np.zeros(frame_count, dtype=np.float64)
+        for block_start in range(0, frame_count, BLOCK_FRAMES):
+            block_end = min(block_start + BLOCK_FRAMES, frame_count)
+            sum_squares[block_start:block_end] = _frame_sum_squares(
+                samples, start_idx[block_start:block_end], end_idx[block_start:block_end])
+        # 关闭共享内存前必须释放指向它的数组
+        del samples
+        return sum_squares
+    finally:
+        shm.close()
+
+
+def compute_frame_dbfs_sharded(audio, jobs, frame_length=FRAME_LENGTH_MS, progress_callback=None):
+    """
+    用多个进程分片计算每个分析帧的响度(dBFS)，结果与 compute_frame_dbfs 完全一致
+
+    PCM复制一份到共享内存，按分析帧把整个文件平均分成 jobs 个分片，
+    各进程只读取自己的分片。分片边界就是分析帧的边界，没有跨分片的帧；
+    静默检测在拼接后的完整响度曲线上进行，跨越分片边界的静默也能正确识别。
+    音频太短(每个分片不足 MIN_SHARD_FRAMES 帧)时直接在当前进程中计算。
+
+    参数:
+    audio (AudioSegment): 输入音频
+    jobs (int): 进程数
+    frame_length (int): 分析帧长度(毫秒)
+    progress_callback (callable): 进度回调，参数为0-1之间的进度，每完成一个分片调用一次
+
+    返回:
+    numpy.ndarray: 每帧的dBFS，完全静音的帧为 -inf
+    """
+    duration_ms = len(audio)
+    frame_count = -(-duration_ms // frame_length)
+    shard_frames = max(MIN_SHARD_FRAMES, -(-frame_count // max(1, int(jobs))))
+    if frame_count <= shard_frames:
+        return compute_frame_dbfs(audio, frame_length, progress_callback)
+
+    samples = audio_to_samples(audio)
+    samples_per_ms = audio.frame_rate / 1000.0
+    shm = shared_memory.SharedMemory(create=True, size=samples.nbytes)
+    try:
+        shared = np.ndarray(samples.shape, dtype=samples.dtype, buffer=shm.buf)
+        shared[:] = samples
+        del shared
+
+        sum_squares = np.zeros(frame_count, dtype=np.float64)
+        done = 0
+        with ProcessPoolExecutor(max_workers=int(jobs)) as executor:
+            futures = {
+                executor.submit(_shard_sum_squares, shm.name, samples.shape, samples.dtype.str, first,
+                                min(shard_frames, frame_count - first), duration_ms, samples_per_ms,
+                                frame_length): first
+                for first in range(0, frame_count, shard_frames)
+            }
+            try:
+                for future in as_completed(futures):
+                    first = futures[future]
+                    shard = future.result()
+                    sum_squares[first:first + len(shard)] = shard
+                    done += len(shard)
+                    if progress_callback:
+                        progress_callback(done / frame_count)
+            finally:
+                # 取消或出错时放弃还没开始的分片
+                for future in futures:
+                    future.cancel()
+    finally:
+        shm.close()
+        shm.unlink()
+
+    start_idx, end_idx = _frame_bounds(0, frame_count, duration_ms, samples_per_ms, frame_length)
+    return _to_dbfs(sum_squares, (end_idx - start_idx) * audio.channels, audio.max_possible_amplitude)
+
+
+def compute_envelope(audio, progress_callback=None, jobs=1):
+    """
+    计算AudioSegment的响度曲线，返回AudioEnvelope
+
+    jobs 大于1时用多个进程分片计算，见 compute_frame_dbfs_sharded
+    """
+    if jobs > 1:
+        frame_dbfs = compute_frame_dbfs_sharded(audio, jobs, FRAME_LENGTH_MS, progress_callback)
+    else:
+        frame_dbfs = compute_frame_dbfs(audio, FRAME_LENGTH_MS, progress_callback)
+    return AudioEnvelope(frame_dbfs, len(audio), audio.dBFS, audio.frame_rate, audio.channels, FRAME_LENGTH_MS)
+
+
+class StreamingSilenceDetector:
+    """
+    增量式静默检测器
+
+    按块喂入PCM，跨块边界计算每10ms的响度并检测静默区间。
+    只缓存不足一帧的采样和每帧一个浮点数的响度曲线，
+    内存占用与块大小有关而与文件长度无关。
+    分帧方式与 compute_frame_dbfs 相同，结果与整文件检测一致。
+    """
+
+    def __init__(self, frame_rate, channels, sample_width, min_silence_len,
+                 silence_thresh=None, frame_length=FRAME_LENGTH_MS, track_peaks=False):
+        """
+        参数:
+        frame_rate (int): 采样率
+        channels (int): 声道数
+        sample_width (int): 采样宽度(字节)
+        min_silence_len (int): 最小静默长度(毫秒)
+        silence_thresh (float): 静默阈值(dBFS)；为None时不做增量检测，
+            由调用方在结束后根据 dbfs 换算阈值再检测
+        frame_length (int): 分析帧长度(毫秒)
+        track_peaks (bool): 为True时同时记录每帧采样的最小值和最大值，用于绘制波形(仅支持16位PCM)
+        """
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.max_possible_amplitude = float(2 ** (sample_width * 8 - 1))
+        self.min_silence_len = min_silence_len
+        self.silence_thresh = silence_thresh
+        self.frame_length = frame_length
+        self.samples_per_ms = frame_rate / 1000.0
+
+        self.pending = np.zeros((0, channels), dtype=np.int16)  # 尚未凑满一帧的采样
+        self.pending_offset = 0  # pending 第一个采样在整个文件中的下标
+        self.next_frame = 0  # 下一个待计算的分析帧
+        self.total_samples = 0
+        self.total_sum_squares = 0.0
+        self.silence_start = None  # 当前静默开始的帧，不在静默中时为None
+        self.envelope_blocks = []
+        self.track_peaks = track_peaks
+        self.peak_blocks = []
+
+    def feed(self, samples):
+        """
+        喂入一块 (采样帧数, 声道数) 的PCM
+
+        返回:
+        list: 本块中已确认结束的静默区间 [(start_ms, end_ms), ...]
+        """
+        samples = np.concatenate((self.pending, samples)) if len(self.pending) else samples
+        buffered_end = self.pending_offset + len(samples)
+        self.total_samples += len(samples) - len(self.pending)
+
+        # 结束位置已落在缓冲区内的帧都可以计算了
+        last_frame = int(buffered_end / self.samples_per_ms // self.frame_length) + 1
+        start_idx, end_idx = _frame_bounds(self.next_frame, max(0, last_frame - self.next_frame),
+                                           np.inf, self.samples_per_ms, self.frame_length)
+        ready = int(np.searchsorted(end_idx, buffered_end, side='right'))
+        start_idx, end_idx = start_idx[:ready], end_idx[:ready]
+
+        frame_dbfs = self._compute(samples, start_idx, end_idx)
+
+        # 丢弃已经用完的采样，只保留下一帧开始之后的部分
+        keep_from = (end_idx[-1] if ready else self.pending_offset) - self.pending_offset
+        self.total_sum_squares += float(np.einsum('ij,ij->', samples[len(self.pending):],
+                                                  samples[len(self.pending):], dtype=np.float64))
+        self.pending = samples[keep_from:].copy()
+        self.pending_offset += keep_from
+
+        return self._update_runs(frame_dbfs, final_ms=None)
+
+    def finish(self):
+        """
+        处理剩余的采样，结束检测
+
+        返回:
+        list: 最后确认的静默区间(包括结尾处的静默)
+        """
+        duration_ms = self.duration_ms
+        frame_count = -(-duration_ms // self.frame_length) - self.next_frame
+        start_idx, end_idx = _frame_bounds(self.next_frame, max(0, frame_count), duration_ms,
+                                           self.samples_per_ms, self.frame_length)
+        frame_dbfs = self._compute(self.pending, start_idx, end_idx)
+        self.pending = self.pending[:0]
+        return self._update_runs(frame_dbfs, final_ms=duration_ms)
+
+    def set_silence_thresh(self, silence_thresh):
+        """
+        在检测过程中确定静默阈值，已计算的帧按新阈值补做检测
+
+        返回:
+        list: 已确认结束的静默区间 [(start_ms, end_ms), ...]
+        """
+        self.silence_thresh = silence_thresh
+        self.silence_start = None
+        envelope = self.envelope()
+        return self._update_runs(envelope, final_ms=None) if len(envelope) else []
+
+    @property
+    def duration_ms(self):
+        """已喂入音频的总时长(毫秒)，与 len(AudioSegment) 的取整方式一致"""
+        return round(1000 * (self.total_samples / self.frame_rate))
+
+    @property
+    def dbfs(self):
+        """已喂入音频整体的dBFS，与 AudioSegment.dBFS 一致"""
+        counts = np.array([self.total_samples * self.channels])
+        return float(_to_dbfs(np.array([self.total_sum_squares]), counts, self.max_possible_amplitude)[0])
+
+    def envelope(self):
+        """返回目前为止每帧的dBFS曲线"""
+        if not self.envelope_blocks:
+            return np.zeros(0, dtype=np.float64)
+        return np.concatenate(self.envelope_blocks)
+
+    def peaks(self):
+        """返回目前为止每帧的 (最小值, 最大值)，没有记录时返回None"""
+        if not self.track_peaks:
+            return None
+        if not self.peak_blocks:
+            return np.zeros((0, 2), dtype=np.int16)
+        return np.concatenate(self.peak_blocks)
+
+    def audio_envelope(self):
+        """返回整个文件的AudioEnvelope，应在 finish() 之后调用"""
+        return AudioEnvelope(self.envelope(), self.duration_ms, self.dbfs, self.frame_rate, self.channels,
+                             self.frame_length, self.peaks())
+
+    def _compute(self, samples, start_idx, end_idx):
+        """计算一批帧的dBFS并追加到响度曲线"""
+        sum_squares = _frame_sum_squares(samples, start_idx - self.pending_offset, end_idx - self.pending_offset)
+        frame_dbfs = _to_dbfs(sum_squares, (end_idx - start_idx) * self.channels, self.max_possible_amplitude)
+        if self.track_peaks:
+            # 与响度在同一遍中计算，绘制波形不必再次解码
+            self.peak_blocks.append(_frame_peaks(samples, start_idx - self.pending_offset,
+                                                 end_idx - self.pending_offset))
+        self.next_frame += len(frame_dbfs)
+        self.envelope_blocks.append(frame_dbfs)
+        return frame_dbfs
+
+    def _update_runs(self, frame_dbfs, final_ms):
+        """根据新计算的帧更新静默状态，返回已确认的静默区间"""
+        if self.silence_thresh is None:
+            return []
+
+        first_frame = self.next_frame - len(frame_dbfs)
+        silent = frame_dbfs <= self.silence_thresh
+        # 状态翻转的位置：在静默中时找第一个非静默帧，反之亦然
+        changes = np.flatnonzero(np.diff(np.concatenate(([self.silence_start is not None], silent)).astype(np.int8)))
+
+        ranges = []
+        for change in changes:
+            frame = first_frame + int(change)
+            if self.silence_start is None:
+                self.silence_start = frame
+            else:
+                ranges.append((self.silence_start * self.frame_length, frame * self.frame_length))
+                self.silence_start = None
+
+        # 结尾的静默以音频总长度为终点
+        if final_ms is not None and self.silence_start is not None:
+            ranges.append((self.silence_start * self.frame_length, final_ms))
+            self.silence_start = None
+
+        return [(start, end) for start, end in ranges if end - start >= self.min_silence_len]
+
+
+def compute_file_envelope(file_path, audio_info=None, progress_callback=None, block_ms=DEFAULT_BLOCK_MS):
+    """
+    计算音频文件的响度曲线，不把原采样率的音频载入内存
+
+    ffmpeg把音频解码并重采样为 ANALYSIS_FRAME_RATE 的单声道PCM，按块计算每10ms的响度，
+    同时记录每帧的波形峰值。分析帧以毫秒为单位，与采样率无关，得到的片段边界可以直接用于原文件。
+
+    参数:
+    file_path (str): 输入音频文件路径
+    audio_info (dict): probe_audio 的结果，为None时自动探测
+    progress_callback (callable): 进度回调，参数为0-1之间的进度
+    block_ms (int): 每块的时长(毫秒)
+
+    返回:
+    AudioEnvelope: 响度曲线；frame_rate 和 channels 是原文件的格式，导出时按原格式解码片段
+    """
+    info = audio_info or probe_audio(file_path)
+    detector = StreamingSilenceDetector(ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS, SAMPLE_WIDTH, 0, track_peaks=True)
+    for block in iter_pcm_blocks(file_path, ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS, block_ms):
+        detector.feed(block)
+        if progress_callback and info['duration_ms']:
+            progress_callback(min(1.0, detector.duration_ms / info['duration_ms']))
+    detector.finish()
+    return detector.audio_envelope()._replace(frame_rate=info['frame_rate'], channels=info['channels'])
+
+
+def adaptive_silence_thresholds(frame_dbfs, frame_length=FRAME_LENGTH_MS, window_ms=NOISE_FLOOR_WINDOW_MS):
+    """
+    根据滚动的噪声底为每个分析帧确定静默阈值，不需要手动调整阈值
+
+    在每个窗口内取响度的低百分位作为背景噪声、高百分位作为语音响度，
+    阈值取两者之间靠近噪声的位置；窗口之间的阈值线性插值，
+    背景噪声逐渐变化的录音(例如空调声、换了录音设备)在各处都能用合适的阈值。
+    所有窗口的百分位一次向量化算出，只用到响度曲线。
+
+    参数:
+    frame_dbfs (numpy.ndarray): 每帧的dBFS
+    frame_length (int): 分析帧长度(毫秒)
+    window_ms (int): 估计噪声底的窗口长度(毫秒)
+
+    返回:
+    numpy.ndarray: 每帧的静默阈值(dBFS)，与 frame_dbfs 等长
+    """
+    levels = np.maximum(np.asarray(frame_dbfs, dtype=np.float64), SILENCE_FLOOR_DBFS)
+    frame_count = len(levels)
+    if frame_count == 0:
+        return levels
+
+    window = max(1, min(frame_count, int(window_ms // frame_length)))
+    hop = max(1, window // 2)
+    # 窗口矩阵是levels的视图，最后一个窗口对齐到结尾，保证覆盖所有帧
+    windows = np.lib.stride_tricks.sliding_window_view(levels, window)
+    starts = np.arange(0, frame_count - window + 1, hop)
+    if starts[-1] != frame_count - window:
+        starts = np.append(starts, frame_count - window)
+    floor, speech = np.percentile(windows[starts], [NOISE_FLOOR_PERCENTILE, SPEECH_PERCENTILE], axis=1)
+
+    global_floor = np.percentile(levels, NOISE_FLOOR_PERCENTILE)
+    floor = np.minimum(floor, global_floor + MAX_NOISE_FLOOR_RISE_DB)
+    thresholds = floor + np.maximum((speech - floor) * ADAPTIVE_THRESHOLD_RATIO, ADAPTIVE_MIN_MARGIN_DB)
+
+    centers = starts + window / 2
+    return np.interp(np.arange(frame_count) + 0.5, centers, thresholds)
+
+
+def detect_silent_ranges(frame_dbfs, silence_thresh, min_silence_len, duration_ms, frame_length=FRAME_LENGTH_MS):
+    """
+    用向量化游程编码找出所有静默区间
+
+    参数:
+    frame_dbfs (numpy.ndarray): 每帧的dBFS
+    silence_thresh (float): 静默阈值(dBFS)，不高于该值的帧视为静默；
+        也可以是与 frame_dbfs 等长的数组，为每帧指定阈值
+    min_silence_len (int): 最小静默长度(毫秒)
+    duration_ms (int): 音频总长度(毫秒)，结尾的静默以此为终点
+    frame_length (int): 分析帧长度(毫秒)
+
+    返回:
+    list: 静默区间列表 [(start_ms, end_ms), ...]
+    """
+    silent = np.asarray(frame_dbfs) <= silence_thresh
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], silent, [False])).astype(np.int8)))
+    run_starts = edges[0::2]
+    run_ends = edges[1::2]
+
+    starts_ms = run_starts * frame_length
+    ends_ms = np.where(run_ends == len(silent), duration_ms, run_ends * frame_length)
+    keep = ends_ms - starts_ms >= min_silence_len
+
+    return [(int(start), int(end)) for start, end in zip(starts_ms[keep], ends_ms[keep])]
+
+
+def nonsilent_ranges(silent_ranges, duration_ms):
+    """根据静默区间求出非静默(有声)区间 [(start_ms, end_ms), ...]"""
+    ranges = []
+    last_end = 0
+
+    for start, end in silent_ranges:
+        # 静默前的有声部分
+        if start - last_end > 0:
+            ranges.append((last_end, start))
+        last_end = end
+
+    # 最后一段
+    if last_end < duration_ms:
+        ranges.append((last_end, duration_ms))
+
+    return ranges
+
+
+def pad_ranges(ranges, keep_silence, duration_ms):
+    """
+    给有声区间前后各加 keep_silence 毫秒的静默，与pydub的split_on_silence一致
+
+    相邻区间的保留部分重叠时在中点切开，结果限制在 [0, duration_ms] 内。
+    """
+    padded = [[start - keep_silence, end + keep_silence] for start, end in ranges]
+    for current, following in zip(padded, padded[1:]):
+        if following[0] < current[1]:
+            current[1] = following[0] = (current[1] + following[0]) // 2
+    return [(max(start, 0), min(end, duration_ms)) for start, end in padded]
+
+
+def reference_level(frame_dbfs, dbfs, reference_ms=None, frame_length=FRAME_LENGTH_MS):
+    """
+    相对阈值的参考响度(dBFS)
+
+    reference_ms 为None或音频不长于 reference_ms 时就是整段音频的 dbfs；
+    否则是开头 reference_ms 毫秒内各帧的功率平均。只用到开头的响度曲线，
+    流式检测和整文件检测得到的参考响度相同。
+
+    参数:
+    frame_dbfs (numpy.ndarray): 每帧的dBFS，可以只有开头的一部分
+    dbfs (float): 整段音频的dBFS，只在音频不长于 reference_ms 时使用
+    reference_ms (int): 参考段的长度(毫秒)
+    frame_length (int): 分析帧长度(毫秒)
+    """
+    if reference_ms is None or len(frame_dbfs) <= reference_ms // frame_length:
+        return dbfs
+    frames = np.asarray(frame_dbfs[:reference_ms // frame_length], dtype=np.float64)
+    mean_power = np.power(10.0, frames / 10).mean()
+    return float(10 * np.log10(mean_power)) if mean_power > 0 else float('-inf')
+
+
+def envelope_segment_ranges(envelope, min_silence_len, silence_thresh, relative_thresh=False, keep_silence=0,
+                            adaptive_thresh=False, reference_ms=None):
+    """
+    根据响度曲线求出片段区间，只做阈值比较，不需要音频数据
+
+    参数:
+    envelope (AudioEnvelope): 响度曲线
+    min_silence_len (int): 最小静默长度(毫秒)
+    silence_thresh (float): 静默阈值(dB)
+    relative_thresh (bool): 为True时阈值是相对整段音频平均响度的偏移
+    keep_silence (int): 每个片段前后保留的静默长度(毫秒)
+    adaptive_thresh (bool): 为True时忽略 silence_thresh，按滚动噪声底自动确定各处的阈值
+    reference_ms (int): 不为None时相对阈值改为相对开头 reference_ms 毫秒的平均响度，见 reference_level
+
+    返回:
+    list: 片段区间 [(start_ms, end_ms), ...]
+    """
+    if adaptive_thresh:
+        silence_thresh = adaptive_silence_thresholds(envelope.frame_dbfs, envelope.frame_length)
+    elif relative_thresh:
+        silence_thresh = reference_level(envelope.frame_dbfs, envelope.dbfs, reference_ms,
+                                         envelope.frame_length) + silence_thresh
+    silent_ranges = detect_silent_ranges(envelope.frame_dbfs, silence_thresh, min_silence_len,
+                                         envelope.duration_ms, envelope.frame_length)
+    ranges = nonsilent_ranges(silent_ranges, envelope.duration_ms)
+    return pad_ranges(ranges, keep_silence, envelope.duration_ms)
+
+
+class SegmentMerger:
+    """
+    短片段合并策略
+
+    只处理片段的起止位置，在切分音频之前完成：短于 min_segment_ms 的片段
+    并入间隔较近的相邻片段(两段之间的静默一并保留)，合并后的长度不超过 max_segment_ms；
+    两侧都不能合并的短片段才被丢弃，不再把一两个字的短句直接丢掉。
+    合并和丢弃的数量记录在 merged_count 和 dropped_count 中。
+    """
+
+    def __init__(self, min_segment_ms=DEFAULT_MIN_SEGMENT_MS, max_segment_ms=DEFAULT_MAX_SEGMENT_MS,
+                 max_gap_ms=MAX_MERGE_GAP_MS):
+        """
+        参数:
+        min_segment_ms (int): 最短片段时长(毫秒)
+        max_segment_ms (int): 合并后的最长片段时长(毫秒)，0表示不限制；本身已超过的片段保持不变
+        max_gap_ms (int): 只与间隔不超过该长度(毫秒)的相邻片段合并
+        """
+        self.min_segment_ms = min_segment_ms
+        self.max_segment_ms = max_segment_ms
+        self.max_gap_ms = max_gap_ms
+        self.merged_count = 0
+        self.dropped_count = 0
+
+    def merge(self, ranges):
+        """
+        合并一组片段区间
+
+        参数:
+        ranges (iterable): 按时间顺序排列的片段区间 [(start_ms, end_ms), ...]
+
+        返回:
+        list: 合并后的片段区间，都不短于 min_segment_ms
+        """
+        segments = [list(segment) for segment in ranges]
+        i = 0
+        while i < len(segments):
+            start, end = segments[i]
+            if end - start >= self.min_segment_ms:
+                i += 1
+                continue
+
+            # 优先并入间隔较短的一侧
+            neighbours = []
+            if i > 0:
+                neighbours.append((start - segments[i - 1][1], i - 1))
+            if i + 1 < len(segments):
+                neighbours.append((segments[i + 1][0] - end, i + 1))
+            for gap, j in sorted(neighbours):
+                first, last = min(i, j), max(i, j)
+                length = segments[last][1] - segments[first][0]
+                if gap <= self.max_gap_ms and (not self.max_segment_ms or length <= self.max_segment_ms):
+                    segments[first:last + 1] = [[segments[first][0], segments[last][1]]]
+                    self.merged_count += 1
+                    # 合并后可能仍然太短，从合并结果处继续检查
+                    i = first
+                    break
+            else:
+                i += 1
+
+        kept = [(start, end) for start, end in segments if end - start >= self.min_segment_ms]
+        self.dropped_count += len(segments) - len(kept)
+        return kept
+
+    def iter_merge(self, ranges):
+        """
+        逐个产出合并后的片段，用于流式检测
+
+        间隔超过 max_gap_ms 的两个片段之间不会发生合并，
+        因此每遇到这样的间隔就把之前积累的片段合并后产出，结果与 merge() 相同。
+        """
+        group = []
+        for segment in ranges:
+            if group and segment[0] - group[-1][1] > self.max_gap_ms:
+                yield from self.merge(group)
+                group = []
+            group.append(segment)
+        yield from self.merge(group)
+
+
+def envelope_levels(envelope, start_ms, end_ms):
+    """
+    由响度曲线估算 [start_ms, end_ms) 这段音频的电平
+
+    返回:
+    tuple: (峰值, 平均)，单位dBFS。峰值是最响的一个分析帧的RMS电平，
+        平均是整段的RMS电平；整段无声时为 -inf
+    """
+    first = int(start_ms // envelope.frame_length)
+    last = max(first + 1, -(-int(end_ms) // envelope.frame_length))
+    frame_dbfs = np.asarray(envelope.frame_dbfs[first:last], dtype=np.float64)
+    if len(frame_dbfs) == 0:
+        return float('-inf'), float('-inf')
+    mean_power = np.power(10.0, frame_dbfs / 10).mean()
+    rms_dbfs = 10 * np.log10(mean_power) if mean_power > 0 else float('-inf')
+    return float(frame_dbfs.max()), float(rms_dbfs)
+
+
+class PeakPyramid:
+    """
+    波形的多分辨率峰值金字塔
+
+    第0层是每个分析帧的 (最小值, 最大值)，往上每层把 PEAK_PYRAMID_FACTOR 个相邻的项合并为一项。
+    绘制一段范围时选用每列至少包含一项的最粗的层，每列只合并几项，
+    工作量与列数(像素数)成正比，与音频长度和缩放比例无关。
+    """
+
+    def __init__(self, peaks, frame_length=FRAME_LENGTH_MS):
+        """
+        参数:
+        peaks (np.ndarray): 形状为 (帧数, 2) 的16位峰值，即 AudioEnvelope.peaks
+        frame_length (int): 分析帧长度(毫秒)
+        """
+        level = np.asarray(peaks, dtype=np.int16).reshape(-1, 2)
+        self.levels = [level]
+        while len(level) > PEAK_PYRAMID_FACTOR:
+            count = -(-len(level) // PEAK_PYRAMID_FACTOR)
+            # 末尾不足一组时重复最后一项，不影响最小值和最大值
+            padded = np.concatenate((level, np.repeat(level[-1:], count * PEAK_PYRAMID_FACTOR - len(level), axis=0)))
+            groups = padded.reshape(count, PEAK_PYRAMID_FACTOR, 2)
+            level = np.stack((groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)), axis=1)
+            self.levels.append(level)
+        self.frame_length = frame_length
+        self.duration_ms = len(self.levels[0]) * frame_length
+
+    @classmethod
+    def from_envelope(cls, envelope):
+        """由响度曲线中的峰值建立金字塔，没有峰值时返回None"""
+        if envelope is None or envelope.peaks is None or len(envelope.peaks) == 0:
+            return None
+        return cls(envelope.peaks, envelope.frame_length)
+
+    def range_peaks(self, start_ms, end_ms, columns):
+        """
+        把 [start_ms, end_ms) 分成 columns 列，返回每列的峰值
+
+        返回:
+        np.ndarray: 形状为 (columns, 2) 的float32，范围为-1到1；超出音频范围的列为0
+        """
+        columns = max(1, int(columns))
+        column_ms = (end_ms - start_ms) / columns
+        level, bin_ms = 0, self.frame_length
+        while level + 1 < len(self.levels) and bin_ms * PEAK_PYRAMID_FACTOR <= column_ms:
+            level += 1
+            bin_ms *= PEAK_PYRAMID_FACTOR
+        data = self.levels[level]
+
+        edges = np.floor(np.linspace(start_ms, end_ms, columns + 1) / bin_ms).astype(np.int64)
+        starts = np.clip(edges[:-1], 0, len(data))
+        valid = (edges[:-1] >= 0) & (starts < len(data))
+        result = np.zeros((columns, 2), dtype=np.float32)
+        if not valid.any():
+            return result
+
+        # 相邻列的起点相同时(放大到一帧以下)，reduceat 取该项本身
+        indices = starts[valid]
+        end = min(len(data), max(int(edges[-1]), int(indices[-1]) + 1))
+        block = data[:end]
+        result[valid, 0] = np.minimum.reduceat(block[:, 0], indices)
+        result[valid, 1] = np.maximum.reduceat(block[:, 1], indices)
+        return result / 32768.0
+
+
+def _split_silence(silence, keep_silence, duration_ms=None):
+    """
+    在一段静默处切分，两侧各保留 keep_silence 毫秒，与 pad_ranges 的结果一致
+
+    保留部分重叠时在静默中点切开；文件开头和结尾的静默只有一侧有片段，
+    不在中点切开，只保留 keep_silence 毫秒。duration_ms 为None表示还不知道音频总长度，
+    这时的静默后面一定还有声音。返回(前一片段的结束, 后一片段的开始)。
+    """
+    start, end = silence
+    middle = (start + end) // 2
+    segment_end, next_start = min(start + keep_silence, middle), max(end - keep_silence, middle)
+    if start <= 0:
+        next_start = max(end - keep_silence, 0)
+    if duration_ms is not None and end >= duration_ms:
+        segment_end = min(start + keep_silence, duration_ms)
+    return segment_end, next_start
+
+
+def stream_segment_ranges(file_path, min_silence_len, silence_thresh, relative_thresh=False,
+                          keep_silence=0, block_ms=DEFAULT_BLOCK_MS, audio_info=None, progress_callback=None,
+                          envelope_callback=None, adaptive_thresh=False, reference_ms=None):
+    """
+    流式解码并检测静默，每确认一个片段就立即产出
+
+    PCM按块从ffmpeg管道读取，峰值内存只与块大小有关；与 compute_file_envelope 一样
+    在低采样率的单声道PCM上检测。
+
+    参数:
+    file_path (str): 输入音频文件路径
+    min_silence_len (int): 最小静默长度(毫秒)
+    silence_thresh (float): 静默阈值(dB)
+    relative_thresh (bool): 为True时阈值是相对整段音频平均响度的偏移；
+        平均响度要读完整个文件才能确定，因此片段在解码结束后才会产出(除非给出 reference_ms)
+    keep_silence (int): 每个片段前后保留的静默长度(毫秒)
+    block_ms (int): 每块的时长(毫秒)
+    audio_info (dict): probe_audio 的结果，为None时自动探测
+    progress_callback (callable): 进度回调，参数为0-1之间的进度
+    envelope_callback (callable): 解码结束后以整个文件的AudioEnvelope(记录原文件的格式)调用一次，例如写入分析缓存
+    adaptive_thresh (bool): 为True时忽略 silence_thresh，按滚动噪声底自动确定阈值；
+        各处的噪声底要用到前后的窗口，片段在解码结束后才会产出
+    reference_ms (int): 不为None时相对阈值改为相对开头 reference_ms 毫秒的平均响度(见 reference_level)，
+        解码到这里就确定阈值，之后的片段边解码边产出；结果与 envelope_segment_ranges 相同
+
+    返回:
+    generator: 依次产出有声片段区间 (start_ms, end_ms)
+    """
+    info = audio_info or probe_audio(file_path)
+    detector = StreamingSilenceDetector(ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS, SAMPLE_WIDTH, min_silence_len,
+                                        None if relative_thresh or adaptive_thresh else silence_thresh,
+                                        track_peaks=envelope_callback is not None)
+    last_end = 0  # 上一段静默的结束位置
+    segment_start = 0  # 下一个片段(含保留静默)的开始位置
+
+    def close_segments(silent_ranges, duration_ms=None):
+        nonlocal last_end, segment_start
+        for silence in silent_ranges:
+            segment_end, next_start = _split_silence(silence, keep_silence, duration_ms)
+            if silence[0] - last_end > 0:
+                yield segment_start, segment_end
+            last_end = silence[1]
+            segment_start = next_start
+
+    # 参考段读完后，相对阈值就确定了
+    reference_frames = None
+    if relative_thresh and not adaptive_thresh and reference_ms is not None:
+        reference_frames = reference_ms // detector.frame_length
+
+    for block in iter_pcm_blocks(file_path, ANALYSIS_FRAME_RATE, ANALYSIS_CHANNELS, block_ms):
+        silent_ranges = detector.feed(block)
+        if reference_frames is not None and detector.silence_thresh is None and detector.next_frame > reference_frames:
+            level = reference_level(detector.envelope(), detector.dbfs, reference_ms, detector.frame_length)
+            silent_ranges = detector.set_silence_thresh(level + silence_thresh)
+        yield from close_segments(silent_ranges)
+        if progress_callback and info['duration_ms']:
+            progress_callback(min(1.0, detector.duration_ms / info['duration_ms']))
+
+    silent_ranges = detector.finish()
+    duration_ms = detector.duration_ms
+    if envelope_callback:
+        envelope_callback(detector.audio_envelope()._replace(frame_rate=info['frame_rate'], channels=info['channels']))
+    if adaptive_thresh:
+        frame_dbfs = detector.envelope()
+        silent_ranges = detect_silent_ranges(frame_dbfs, adaptive_silence_thresholds(frame_dbfs),
+                                             min_silence_len, duration_ms)
+    elif detector.silence_thresh is None:
+        # 相对阈值，音频不长于参考段(或没有给出 reference_ms)时以整段音频的响度为参考
+        frame_dbfs = detector.envelope()
+        level = reference_level(frame_dbfs, detector.dbfs, reference_ms, detector.frame_length)
+        silent_ranges = detect_silent_ranges(frame_dbfs, level + silence_thresh, min_silence_len, duration_ms)
+    yield from close_segments(silent_ranges, duration_ms)
+
+    # 最后一段
+    if last_end < duration_ms:
+        yield segment_start, duration_ms
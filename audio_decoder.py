@@ -0,0 +1,226 @@
+import os
+import math
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import mediainfo_json
+from mp3_frames import DECODER_DELAY, MP3File
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 流式解码时每块的时长(毫秒)，10秒的44.1kHz立体声约1.7MB
+DEFAULT_BLOCK_MS = 10000
+
+# 流式解码统一输出16位有符号整数PCM
+SAMPLE_WIDTH = 2
+
+# 按区间解码时提前开始解码的时长(毫秒)。MP3定位后最初几帧缺少比特池和重叠数据，
+# 解码结果不准确，多解码一段再丢掉
+SEEK_PREROLL_MS = 200
+
+# 并行解码的默认ffmpeg进程数
+DEFAULT_DECODE_JOBS = os.cpu_count() or 1
+
+# 并行解码时每段至少包含的帧数(44.1kHz下约1分钟)，更短的文件直接整体解码
+MIN_DECODE_CHUNK_FRAMES = 2400
+
+# 比特池最多引用前面511字节的主数据；此外MDCT重叠和合成滤波器还依赖前两帧的状态
+RESERVOIR_BYTES = 511
+OVERLAP_FRAMES = 2
+
+
+def probe_audio(file_path):
+    """
+    用ffprobe读取音频的采样率、声道数和时长，不解码PCM
+
+    返回:
+    dict: {'frame_rate': int, 'channels': int, 'duration_ms': int}
+    """
+    info = mediainfo_json(file_path)
+    audio_streams = [s for s in info.get('streams', []) if s.get('codec_type') == 'audio']
+    if not audio_streams:
+        raise ValueError(f"未找到音频流: {file_path}")
+
+    stream = audio_streams[0]
+    duration = stream.get('duration') or info.get('format', {}).get('duration') or 0
+    return {
+        'frame_rate': int(stream['sample_rate']),
+        'channels': int(stream['channels']),
+        'duration_ms': int(round(float(duration) * 1000)),
+    }
+
+
+def _pcm_command(file_path, frame_rate, channels, start_ms=None, duration_ms=None):
+    """构建把音频解码为原始PCM并写到stdout的ffmpeg命令"""
+    command = [AudioSegment.converter, '-nostdin', '-v', 'error']
+    if start_ms is not None:
+        command += ['-ss', f"{start_ms / 1000:.3f}"]
+    command += ['-i', file_path]
+    if duration_ms is not None:
+        command += ['-t', f"{duration_ms / 1000:.3f}"]
+    command += ['-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+                '-ar', str(frame_rate), '-ac', str(channels), '-']
+    return command
+
+
+def iter_pcm_blocks(file_path, frame_rate, channels, block_ms=DEFAULT_BLOCK_MS):
+    """
+    从ffmpeg管道按固定大小的块读取PCM，内存占用只与块大小有关
+
+    参数:
+    file_path (str): 输入音频文件路径
+    frame_rate (int): 输出采样率
+    channels (int): 输出声道数
+    block_ms (int): 每块的时长(毫秒)
+
+    返回:
+    generator: 依次产出形状为 (采样帧数, 声道数) 的int16数组
+    """
+    frame_width = SAMPLE_WIDTH * channels
+    block_bytes = max(1, int(frame_rate * block_ms / 1000)) * frame_width
+
+    process = subprocess.Popen(_pcm_command(file_path, frame_rate, channels),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        pending = b''
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                break
+            data = pending + data
+            usable = len(data) - len(data) % frame_width
+            pending = data[usable:]
+            if usable:
+                # 直接在读到的缓冲区上建立视图，不再复制一份
+                yield np.frombuffer(data, dtype=np.int16, count=usable // SAMPLE_WIDTH).reshape(-1, channels)
+
+        process.wait()
+        if process.returncode != 0:
+            error = process.stderr.read().decode('utf-8', 'ignore').strip()
+            raise RuntimeError(f"ffmpeg解码失败: {error}")
+    finally:
+        # 提前结束(例如取消处理)时终止ffmpeg进程
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def _priming_frames(mp3, first):
+    """
+    从第 first 帧开始解码时需要提前送入解码器的帧数
+
+    先退回 OVERLAP_FRAMES 帧，再继续退回直到覆盖比特池可能引用的 RESERVOIR_BYTES 字节，
+    这样第 first 帧及之后的输出与从文件开头解码完全相同。
+    """
+    start = max(0, first - OVERLAP_FRAMES)
+    reservoir = 0
+    while start > 0 and reservoir < RESERVOIR_BYTES:
+        start -= 1
+        reservoir += mp3.sizes[start]
+    return first - start
+
+
+def _decode_frames(mp3, first, last, frame_width):
+    """
+    解码 [first, last) 这些帧，返回原始PCM(不做无缝播放的裁剪)
+
+    把帧数据通过管道直接送给ffmpeg，前面带上比特池需要的帧，解码后丢掉它们的输出。
+    """
+    priming = _priming_frames(mp3, first)
+    start = first - priming
+    data = mp3.data[mp3.offsets[start]:mp3.offsets[last - 1] + mp3.sizes[last - 1]]
+    command = [AudioSegment.converter, '-nostdin', '-v', 'error', '-f', 'mp3', '-i', 'pipe:0',
+               '-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-']
+    result = subprocess.run(command, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', 'ignore').strip()
+        raise RuntimeError(f"ffmpeg解码失败: {error}")
+
+    frame_bytes = mp3.samples_per_frame * frame_width
+    expected = (last - start) * frame_bytes
+    if len(result.stdout) != expected:
+        raise RuntimeError(f"解码得到的采样数不符: {len(result.stdout)} != {expected}")
+    return result.stdout[priming * frame_bytes:]
+
+
+def decode_mp3_parallel(file_path, jobs=DEFAULT_DECODE_JOBS):
+    """
+    在帧边界上把MP3拆成几段，用多个ffmpeg进程同时解码后拼接
+
+    每段前面多送入比特池和重叠所需的几帧，拼接后再按LAME标签做与ffmpeg相同的
+    无缝播放裁剪，结果与 AudioSegment.from_mp3 逐采样一致。
+
+    参数:
+    file_path (str): MP3文件路径
+    jobs (int): 同时运行的ffmpeg进程数
+
+    返回:
+    AudioSegment: 解码后的音频；不是有效的MP3文件时抛出ValueError
+    """
+    mp3 = MP3File(file_path)
+    channels = 1 if mp3.header.channel_mode == 3 else 2
+    frame_width = SAMPLE_WIDTH * channels
+    frame_count = len(mp3)
+
+    chunk_count = max(1, min(int(jobs), frame_count // MIN_DECODE_CHUNK_FRAMES))
+    bounds = [frame_count * i // chunk_count for i in range(chunk_count + 1)]
+    with ThreadPoolExecutor(max_workers=chunk_count) as executor:
+        chunks = list(executor.map(lambda i: _decode_frames(mp3, bounds[i], bounds[i + 1], frame_width),
+                                   range(chunk_count)))
+    data = b''.join(chunks)
+    del chunks
+
+    # 与ffmpeg一样去掉开头的编码器和解码器延迟以及结尾的填充
+    if mp3.lame_tag:
+        total = frame_count * mp3.samples_per_frame - mp3.encoder_delay - max(mp3.encoder_padding, DECODER_DELAY)
+        data = data[mp3.start_skip * frame_width:(mp3.start_skip + max(0, total)) * frame_width]
+    return AudioSegment(data=data, sample_width=SAMPLE_WIDTH, frame_rate=mp3.sample_rate, channels=channels)
+
+
+def load_audio(file_path, jobs=DEFAULT_DECODE_JOBS):
+    """
+    加载音频文件，可直接替换 AudioSegment.from_mp3
+
+    MP3文件用 decode_mp3_parallel 并行解码；不是MP3或并行解码失败时交给pydub整体解码。
+    """
+    if jobs > 1:
+        try:
+            return decode_mp3_parallel(file_path, jobs)
+        except ValueError:
+            pass
+        except Exception as e:
+            logger.warning(f"并行解码失败，改为整体解码: {str(e)}")
+    return AudioSegment.from_file(file_path)
+
+
+def decode_range(file_path, start_ms, end_ms, frame_rate, channels):
+    """
+    只解码音频的 [start_ms, end_ms) 区间，返回AudioSegment
+
+    结果与整个文件解码后再切片 audio[start_ms:end_ms] 逐采样一致：
+    从区间前的一个整采样位置开始解码，再按pydub的毫秒换算方式截取。
+    """
+    # 定位点取在换算成采样数恰好为整数的毫秒上，避免ffmpeg和pydub取整方式不同
+    step_ms = 1000 // math.gcd(frame_rate, 1000)
+    seek_ms = max(0, start_ms - SEEK_PREROLL_MS) // step_ms * step_ms
+    seek_frame = seek_ms * frame_rate // 1000
+
+    # 从文件开头解码时不加 -ss，保证与整文件解码一样跳过编码器延迟
+    command = _pcm_command(file_path, frame_rate, channels, seek_ms or None, end_ms - seek_ms + step_ms)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', 'ignore').strip()
+        raise RuntimeError(f"ffmpeg解码失败: {error}")
+
+    frame_width = SAMPLE_WIDTH * channels
+    start_frame = int(start_ms * frame_rate / 1000.0) - seek_frame
+    end_frame = int(end_ms * frame_rate / 1000.0) - seek_frame
+    data = result.stdout[start_frame * frame_width:end_frame * frame_width]
+    # 文件末尾定位解码可能少几个采样，与pydub切片一样用静音补齐
+    data += b'\0' * ((end_frame - start_frame) * frame_width - len(data))
+    return AudioSegment(data=data, sample_width=SAMPLE_WIDTH, frame_rate=frame_rate, channels=channels)
@@ -2,17 +2,211 @@ import sys
 import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, QSlider, 
                             QHBoxLayout, QVBoxLayout, QWidget, QStyle, QSizePolicy, QFileDialog, 
-                            QComboBox)
+                            QComboBox, QCheckBox)
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtCore import Qt, QUrl, pyqtSignal, QTime, QPropertyAnimation, QEasingCurve
-from PyQt5.QtGui import QIcon, QColor
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtCore import Qt, QUrl, pyqtSignal, QTime
-from PyQt5.QtGui import QIcon, QColor
+from PyQt5.QtCore import Qt, QUrl, pyqtSignal, QTimer, QLineF, QRectF
+from PyQt5.QtGui import QIcon, QColor, QPainter, QPixmap, QPen
 
 # 导入pydub用于准确计算音频时长
 from pydub import AudioSegment
 import logging
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from mp3_frames import probe_duration_ms
+from audio_decoder import decode_range, probe_audio
+from time_stretch import StretchKey, TimeStretchCache
+
+# 预读文件时每次读取的字节数
+PREFETCH_CHUNK_SIZE = 1024 * 1024
+
+# 更改播放速率后等待播放器确认的最长时间(毫秒)，没有收到 playbackRateChanged 信号时到时继续
+RATE_CHANGE_TIMEOUT_MS = 100
+
+# 播放器报告位置的间隔(毫秒)；播放时由界面刷新定时器读取位置，报告只用于暂停时跳转后的更新
+POSITION_NOTIFY_MS = 250
+
+# 无法获取显示器刷新率时的界面刷新间隔(毫秒)
+DEFAULT_REFRESH_MS = 16
+
+# 播放时界面刷新的最长间隔(毫秒)，显示的内容都变化得很慢时也不低于这一频率
+MAX_REFRESH_MS = 1000
+
+# 波形概览的高度(像素)和最多放大到的可见时长(毫秒)
+WAVEFORM_HEIGHT = 56
+MIN_WAVEFORM_VIEW_MS = 2000
+
+# 滚轮每格的缩放比例
+WAVEFORM_ZOOM_STEP = 1.25
+
+# 后台准备好的轨道：文件路径和准确时长(毫秒，获取失败时为None)
+PreparedTrack = namedtuple('PreparedTrack', ['file_path', 'duration_ms'])
+
+
+def format_time(ms, with_hours=False):
+    """毫秒格式化为 mm:ss，with_hours 为True时格式化为 hh:mm:ss"""
+    seconds = max(0, int(ms)) // 1000
+    if with_hours:
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class WaveformView(QWidget):
+    """
+    波形概览：源文件的波形、各片段的位置和播放位置
+
+    波形按列从 PeakPyramid 取峰值后画到缓存的QPixmap中，只在缩放、滚动或改变大小时重画，
+    取数和绘制的工作量都与控件宽度成正比；播放位置变化时只重画一条竖线。
+    滚轮缩放，Shift+滚轮左右滚动，单击跳转。
+    """
+
+    seekRequested = pyqtSignal(int)  # 单击波形时请求跳转，参数为源文件中的位置(毫秒)
+
+    def __init__(self, wave_color, segment_color, current_color, playhead_color, parent=None):
+        super().__init__(parent)
+        self.wave_color = wave_color
+        self.segment_color = segment_color
+        self.current_color = current_color
+        self.playhead_color = playhead_color
+        self.pyramid = None
+        self.segments = []  # 各片段在源文件中的 (start_ms, end_ms)，与播放列表对应，未知时为None
+        self.segment_order = []  # 已知位置的片段 (start_ms, end_ms, 序号)，按开始位置排序
+        self.segment_starts = []
+        self.current_segment = -1
+        self.view_start, self.view_end = 0, 0  # 可见范围(毫秒)
+        self.playhead = None  # 播放位置(毫秒)，未知时为None
+        self.playhead_x = None
+        self.pixmap = None  # 缓存的波形图，为None时下次绘制时重画
+        self.setFixedHeight(WAVEFORM_HEIGHT)
+        self.setCursor(Qt.PointingHandCursor)
+
+    def set_data(self, pyramid, segments):
+        """
+        设置波形和片段位置，显示整个文件
+
+        参数:
+        pyramid (PeakPyramid): 源文件的峰值金字塔，为None时隐藏波形
+        segments (list): 每个片段在源文件中的 (start_ms, end_ms)，未知时为None
+        """
+        self.pyramid = pyramid
+        self.segments = list(segments)
+        self.segment_order = sorted((s[0], s[1], i) for i, s in enumerate(self.segments) if s is not None)
+        self.segment_starts = [start for start, _, _ in self.segment_order]
+        self.current_segment = -1
+        self.playhead = self.playhead_x = None
+        self.view_start, self.view_end = 0, pyramid.duration_ms if pyramid else 0
+        self.pixmap = None
+        self.setVisible(pyramid is not None)
+        self.update()
+
+    def segment_at(self, position):
+        """包含 position 的片段序号；位于片段之间时返回后面的片段，都没有时返回None"""
+        index = bisect_right(self.segment_starts, position) - 1
+        if index >= 0 and position < self.segment_order[index][1]:
+            return self.segment_order[index][2]
+        if index + 1 < len(self.segment_order):
+            return self.segment_order[index + 1][2]
+        return None
+
+    def set_current_segment(self, index):
+        """突出显示当前片段"""
+        if index != self.current_segment:
+            self.current_segment = index
+            self.pixmap = None
+            self.update()
+
+    def set_playhead(self, position):
+        """更新播放位置，竖线移动不到一个像素时不重画；播放到可见范围以外时向后翻页"""
+        if self.pyramid is None:
+            return
+        span = self.view_end - self.view_start
+        if position is not None and not self.view_start <= position < self.view_end:
+            self.set_view(position - span // 10, position - span // 10 + span)
+        self.playhead = position
+        x = None if position is None else int(self.x_for(position))
+        if x != self.playhead_x:
+            self.playhead_x = x
+            self.update()
+
+    def set_view(self, start_ms, end_ms):
+        """设置可见范围，限制在文件范围内"""
+        duration = self.pyramid.duration_ms
+        span = int(min(duration, max(MIN_WAVEFORM_VIEW_MS, end_ms - start_ms)))
+        start = int(min(max(0, start_ms), duration - span))
+        if (start, start + span) != (self.view_start, self.view_end):
+            self.view_start, self.view_end = start, start + span
+            self.playhead_x = None if self.playhead is None else int(self.x_for(self.playhead))
+            self.pixmap = None
+            self.update()
+
+    def x_for(self, position):
+        return (position - self.view_start) * self.width() / max(1, self.view_end - self.view_start)
+
+    def position_for(self, x):
+        return int(self.view_start + x * (self.view_end - self.view_start) / max(1, self.width()))
+
+    def render_pixmap(self):
+        """把可见范围的片段位置和波形画到缓存中"""
+        width, height = self.width(), self.height()
+        self.pixmap = QPixmap(max(1, width), max(1, height))
+        self.pixmap.fill(Qt.white)
+        painter = QPainter(self.pixmap)
+
+        # 只画与可见范围相交的片段
+        first = max(0, bisect_right(self.segment_starts, self.view_start) - 1)
+        last = bisect_right(self.segment_starts, self.view_end)
+        for start, end, index in self.segment_order[first:last]:
+            if end <= self.view_start:
+                continue
+            left, right = self.x_for(start), self.x_for(end)
+            color = self.current_color if index == self.current_segment else self.segment_color
+            painter.fillRect(QRectF(left, 0, max(1.0, right - left), height), color)
+
+        # 每列一条从最小值到最大值的竖线
+        peaks = self.pyramid.range_peaks(self.view_start, self.view_end, width)
+        middle = height / 2
+        painter.setPen(QPen(self.wave_color, 1))
+        painter.drawLines([QLineF(x, middle - high * middle, x, middle - low * middle)
+                           for x, (low, high) in enumerate(peaks.tolist())])
+        painter.end()
+
+    def paintEvent(self, event):
+        if self.pyramid is None:
+            return
+        if self.pixmap is None or self.pixmap.size() != self.size():
+            self.render_pixmap()
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.pixmap)
+        if self.playhead_x is not None:
+            painter.setPen(QPen(self.playhead_color, 2))
+            painter.drawLine(self.playhead_x, 0, self.playhead_x, self.height())
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.pixmap = None
+        if self.playhead is not None:
+            self.playhead_x = int(self.x_for(self.playhead))
+        super().resizeEvent(event)
+
+    def wheelEvent(self, event):
+        """滚轮以鼠标位置为中心缩放，按住Shift时左右滚动"""
+        if self.pyramid is None:
+            return
+        steps = event.angleDelta().y() / 120
+        span = self.view_end - self.view_start
+        if event.modifiers() & Qt.ShiftModifier:
+            offset = int(-steps * span / 5)
+            self.set_view(self.view_start + offset, self.view_end + offset)
+        else:
+            anchor = self.position_for(event.pos().x())
+            scale = WAVEFORM_ZOOM_STEP ** -steps
+            self.set_view(anchor - (anchor - self.view_start) * scale, anchor + (self.view_end - anchor) * scale)
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if self.pyramid is not None and event.button() == Qt.LeftButton:
+            self.seekRequested.emit(self.position_for(event.pos().x()))
+
 
 class AudioPlayer(QWidget):
     """音频播放器组件"""
@@ -22,6 +216,8 @@ class AudioPlayer(QWidget):
     nextTrackRequested = pyqtSignal()  # 请求播放下一个音频的信号
     prevTrackRequested = pyqtSignal()  # 请求播放上一个音频的信号
     trackChanged = pyqtSignal(int)  # 当前播放轨道改变信号
+    trackPrepared = pyqtSignal(object)  # 后台线程准备好相邻轨道的信号，参数为PreparedTrack
+    stretchRendered = pyqtSignal(object, object)  # 后台渲染完变速结果的信号，参数为StretchKey和异常(成功时为None)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -48,22 +244,72 @@ class AudioPlayer(QWidget):
         self.mediaPlayer = QMediaPlayer()
         
         # 连接信号
-        self.mediaPlayer.positionChanged.connect(self.position_changed)
-        self.mediaPlayer.durationChanged.connect(self.duration_changed)
-        self.mediaPlayer.stateChanged.connect(self.media_state_changed)
-        self.mediaPlayer.volumeChanged.connect(self.volume_changed)
-        self.mediaPlayer.mediaStatusChanged.connect(self.media_status_changed)
+        self.connect_player(self.mediaPlayer)
 
-        # 设置位置更新间隔为50毫秒(0.05秒)
-        self.mediaPlayer.setNotifyInterval(50)
+        # 播放时位置由刷新定时器读取，播放器不需要频繁报告
+        self.mediaPlayer.setNotifyInterval(POSITION_NOTIFY_MS)
+
+        # 播放时由定时器读取位置并更新界面。间隔按界面需要确定：进度条或波形上的播放位置
+        # 移动一个像素、时间标签的秒数变化或虚拟片段结束所需的时间，最短为显示器的一帧
+        self.refresh_timer = QTimer(self)
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 0
+        self.frame_interval = int(1000 / refresh_rate) if refresh_rate > 0 else DEFAULT_REFRESH_MS
+        self.refresh_timer.setInterval(self.frame_interval)
+        self.refresh_timer.timeout.connect(self.refresh_position)
+        self.total_time_text = format_time(0)  # 当前片段总时长的显示文本，每个片段只格式化一次
+        self.time_with_hours = False
+        self.displayed_second = None  # 时间标签中显示的秒数
 
         # 初始化音量
         self.mediaPlayer.setVolume(100)  # 默认音量为100
 
+        # 备用播放器：提前加载下一个片段，切换时直接交换播放器，连续播放没有停顿
+        self.standbyPlayer = QMediaPlayer()
+        self.standby_file = None  # 备用播放器中已加载的文件
+
+        # 在后台线程中准备相邻的片段(获取时长、预读文件)，切换时不再卡住界面
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        self.prepared_tracks = {}  # 文件路径 -> PreparedTrack
+        self.prefetching = set()  # 正在准备的文件
+        self.track_durations = {}  # 已知的准确时长(例如来自片段清单)，文件路径 -> 毫秒
+        self.trackPrepared.connect(self.track_prepared)
+
+        # 虚拟片段：不写入片段文件，直接在源文件中播放每个片段的时间范围
+        self.track_windows = []  # 与 track_list 对应的 (start_ms, end_ms)，为空时按文件播放
+        self.window_source = None  # 播放器中已加载的源文件
+        self.window_start = 0  # 当前片段在源文件中的起止位置(毫秒)，window_end 为None时播放整个文件
+        self.window_end = None
+
+        # 部分后端(例如Windows的DirectShow)会丢弃媒体加载完成前的跳转：
+        # 设置媒体后到加载完成之前的跳转位置先记下来，加载完成后再设置一次
+        self.media_loading = False
+        self.pending_seek = None  # 播放器中的位置(毫秒)
+
         # 初始化播放速率
         self.playback_rates = [0.5, 0.75, 0.9, 1.0, 1.1, 1.2, 1.25, 1.5, 2.0, 3.0]  # 支持的播放速率
         self.current_rate_index = 3  # 默认1.0倍速
 
+        # 更改速率时先暂停，等播放器确认新速率后再恢复位置和播放，不阻塞界面
+        self.rate_change_player = None  # 正在更改速率的播放器，没有进行中的更改时为None
+        self.rate_change_position = 0  # 更改前的播放位置
+        self.rate_change_resume = False  # 更改前是否正在播放
+        self.rate_change_timer = QTimer(self)
+        self.rate_change_timer.setSingleShot(True)
+        self.rate_change_timer.timeout.connect(self.finish_rate_change)
+
+        # 变速不变调：速率不是1倍时在后台用WSOLA渲染当前片段，渲染好后以1倍速播放渲染结果，
+        # 渲染完成前由播放器自身变速
+        self.preserve_pitch = True
+        self.stretch_cache = TimeStretchCache()
+        self.stretch_executor = ThreadPoolExecutor(max_workers=1)
+        self.stretch_rendering = set()  # 正在渲染的StretchKey
+        self.stretch_rate = None  # 播放器中是渲染结果时为它的速率，播放原始文件时为None
+        self.stretch_offset = 0  # 渲染结果的开头在原始文件中的位置(毫秒)
+        self.current_file = None  # 当前片段的原始文件
+        self.source_formats = {}  # 源文件 -> (采样率, 声道数)，渲染虚拟片段时使用
+        self.stretchRendered.connect(self.stretch_rendered)
+
         # 音频片段列表管理
         self.track_list = []  # 存储音频片段文件路径
         self.current_track_index = -1  # 当前播放的轨道索引
@@ -72,11 +318,6 @@ class AudioPlayer(QWidget):
         # 创建UI
         self.setup_ui()
 
-        # 创建进度条动画对象
-        self.position_animation = QPropertyAnimation(self.positionSlider, b'value')
-        self.position_animation.setDuration(50)  # 动画持续时间（毫秒）
-        self.position_animation.setEasingCurve(QEasingCurve.Linear)
-
     def setup_ui(self):
         """设置UI"""
         # 主布局
@@ -312,6 +553,18 @@ class AudioPlayer(QWidget):
         """)
         self.rateComboBox.currentIndexChanged.connect(self.change_playback_rate)
 
+        # 保持音调复选框
+        self.pitchCheckBox = QCheckBox("保持音调")
+        self.pitchCheckBox.setChecked(self.preserve_pitch)
+        self.pitchCheckBox.setToolTip("变速时保持原来的音调，慢速播放时更清楚")
+        self.pitchCheckBox.setStyleSheet(f"""
+            QCheckBox {{
+                color: {self.text_color.name()};
+                font-size: 9pt;
+            }}
+        """)
+        self.pitchCheckBox.toggled.connect(self.set_preserve_pitch)
+
         # 添加控件到控制布局
         control_layout.addWidget(self.prevButton)
         control_layout.addWidget(self.rewindButton)
@@ -327,6 +580,7 @@ class AudioPlayer(QWidget):
         control_layout.addWidget(self.volumeValueLabel)
         control_layout.addWidget(self.rateLabel)
         control_layout.addWidget(self.rateComboBox)
+        control_layout.addWidget(self.pitchCheckBox)
 
         # 创建进度条
         self.positionSlider = QSlider(Qt.Horizontal)
@@ -358,7 +612,17 @@ class AudioPlayer(QWidget):
             }}
         """)
 
+        # 波形概览，有分析结果时才显示
+        highlight = QColor(self.primary_color)
+        highlight.setAlpha(60)
+        segment = QColor(self.border_color)
+        segment.setAlpha(120)
+        self.waveformView = WaveformView(self.text_color, segment, highlight, self.accent_color)
+        self.waveformView.seekRequested.connect(self.waveform_seek)
+        self.waveformView.hide()
+
         # 添加布局到主布局
+        main_layout.addWidget(self.waveformView)
         main_layout.addWidget(self.positionSlider)
         main_layout.addLayout(control_layout)
 
@@ -368,7 +632,17 @@ class AudioPlayer(QWidget):
 
     
     def get_accurate_duration(self, file_path):
-        """使用pydub获取音频文件的准确时长(毫秒)"""
+        """
+        获取音频文件的准确时长(毫秒)
+
+        MP3文件只读取帧头和标签帧，不解码，切换片段时不会卡住界面；
+        其他格式仍然使用pydub解码。
+        """
+        try:
+            return probe_duration_ms(file_path)
+        except (OSError, ValueError) as e:
+            logging.info(f"无法从帧头读取时长，改用pydub解码: {str(e)}")
+
         try:
             audio = AudioSegment.from_file(file_path)
             duration_ms = len(audio)
@@ -378,21 +652,139 @@ class AudioPlayer(QWidget):
             logging.error(f"pydub获取音频时长失败: {str(e)}")
             return None
 
-    def load_file(self, file_path, track_number=None):
-        """加载单个音频文件"""
+    def connect_player(self, player):
+        """把播放器的信号连接到界面"""
+        player.positionChanged.connect(self.media_position_changed)
+        player.durationChanged.connect(self.duration_changed)
+        player.stateChanged.connect(self.media_state_changed)
+        player.volumeChanged.connect(self.volume_changed)
+        player.mediaStatusChanged.connect(self.media_status_changed)
+        player.playbackRateChanged.connect(self.playback_rate_applied)
+
+    def disconnect_player(self, player):
+        """断开播放器与界面的信号"""
+        player.positionChanged.disconnect(self.media_position_changed)
+        player.durationChanged.disconnect(self.duration_changed)
+        player.stateChanged.disconnect(self.media_state_changed)
+        player.volumeChanged.disconnect(self.volume_changed)
+        player.mediaStatusChanged.disconnect(self.media_status_changed)
+        player.playbackRateChanged.disconnect(self.playback_rate_applied)
+
+    def swap_players(self):
+        """换用已经加载好下一个片段的备用播放器，音量、速率等设置保持不变"""
+        old_player = self.mediaPlayer
+        old_player.stop()
+        self.disconnect_player(old_player)
+
+        self.mediaPlayer, self.standbyPlayer = self.standbyPlayer, old_player
+        self.standby_file = None
+        self.mediaPlayer.setVolume(old_player.volume())
+        self.mediaPlayer.setPlaybackRate(old_player.playbackRate())
+        self.mediaPlayer.setNotifyInterval(old_player.notifyInterval())
+        self.mediaPlayer.setPosition(0)
+        self.connect_player(self.mediaPlayer)
+
+        # 释放旧播放器占用的文件
+        old_player.setMedia(QMediaContent())
+
+    def prepare_track(self, file_path):
+        """
+        在后台线程中准备一个片段：获取准确时长，并读取一遍文件使其进入系统缓存
+
+        返回:
+        PreparedTrack: 准备好的片段
+        """
+        duration_ms = self.track_durations.get(file_path)
+        try:
+            if duration_ms is None:
+                duration_ms = self.get_accurate_duration(file_path)
+            with open(file_path, 'rb') as f:
+                while f.read(PREFETCH_CHUNK_SIZE):
+                    pass
+        except OSError as e:
+            logging.warning(f"预读音频文件失败: {str(e)}")
+        return PreparedTrack(file_path, duration_ms)
+
+    def neighbor_tracks(self):
+        """当前片段的下一个和上一个片段，下一个在前；虚拟片段都在同一个文件中，不需要预先准备"""
+        if self.track_windows:
+            return []
+        neighbors = []
+        for index in (self.current_track_index + 1, self.current_track_index - 1):
+            if 0 <= index < len(self.track_list) and self.current_track_index >= 0:
+                neighbors.append(self.track_list[index])
+        return neighbors
+
+    def prefetch_neighbors(self):
+        """在后台准备相邻的片段，只保留相邻片段的准备结果"""
+        neighbors = self.neighbor_tracks()
+        self.prepared_tracks = {path: track for path, track in self.prepared_tracks.items() if path in neighbors}
+
+        for file_path in neighbors:
+            if file_path in self.prepared_tracks:
+                self.track_prepared(self.prepared_tracks[file_path])
+            elif file_path not in self.prefetching:
+                self.prefetching.add(file_path)
+                future = self.prefetch_executor.submit(self.prepare_track, file_path)
+                # 信号从后台线程发出，由Qt排队到界面线程处理
+                future.add_done_callback(lambda f: self.trackPrepared.emit(f.result()))
+
+    def track_prepared(self, track):
+        """相邻片段准备好后保存结果，下一个片段再提前加载到备用播放器中"""
+        self.prefetching.discard(track.file_path)
+        neighbors = self.neighbor_tracks()
+        if track.file_path not in neighbors:
+            return
+        self.prepared_tracks[track.file_path] = track
+
+        if track.file_path == neighbors[0] and self.current_track_index + 1 < len(self.track_list) \
+                and self.standby_file != track.file_path:
+            self.standbyPlayer.setMedia(QMediaContent(QUrl.fromLocalFile(track.file_path)))
+            # 暂停状态下后端会打开文件并预先解码开头，播放时可以立即出声
+            self.standbyPlayer.pause()
+            self.standby_file = track.file_path
+
+    def load_file(self, file_path, track_number=None, duration_ms=None):
+        """
+        加载单个音频文件
+
+        参数:
+        file_path (str): 音频文件路径
+        track_number (int): 段落编号
+        duration_ms (int): 已知的准确时长(毫秒，例如来自片段清单)，为None时从文件获取
+        """
         if not file_path or not os.path.exists(file_path):
             logging.error(f"文件不存在: {file_path}")
             return False
         
-        # 使用pydub获取准确时长
-        accurate_duration = self.get_accurate_duration(file_path)
+        if file_path in self.track_list:
+            self.current_track_index = self.track_list.index(file_path)
+            # 从列表中直接选择片段时不经过 set_current_track，波形上的当前片段在这里更新
+            self.waveformView.set_current_segment(self.current_track_index)
+        self.window_source = None
+        self.window_start, self.window_end = 0, None
+        self.current_file = file_path
+        self.stretch_rate, self.stretch_offset = None, 0
         
-        # 创建媒体内容
-        url = QUrl.fromLocalFile(file_path)
-        content = QMediaContent(url)
+        # 优先使用片段清单或后台准备好的时长，都没有时从MP3帧头获取
+        prepared = self.prepared_tracks.get(file_path)
+        if duration_ms is None:
+            duration_ms = prepared.duration_ms if prepared else self.track_durations.get(file_path)
+        accurate_duration = duration_ms if duration_ms is not None else self.get_accurate_duration(file_path)
         
-        # 设置媒体内容
-        self.mediaPlayer.setMedia(content)
+        if self.standby_file == file_path:
+            # 备用播放器已经加载好这个文件，直接交换
+            self.swap_players()
+            self.media_loading, self.pending_seek = False, None
+        else:
+            # 创建媒体内容
+            url = QUrl.fromLocalFile(file_path)
+            content = QMediaContent(url)
+            
+            # 设置媒体内容
+            self.set_media(content)
+        # 上一个片段可能在以1倍速播放渲染结果
+        self.mediaPlayer.setPlaybackRate(self.playback_rates[self.current_rate_index])
         
         # 更新UI
         self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
@@ -421,30 +813,130 @@ class AudioPlayer(QWidget):
         if accurate_duration is not None:
             self.accurate_duration = accurate_duration
             # 手动更新时间标签
-            current_time = QTime(0, 0)
-            current_time = current_time.addMSecs(0)
-            total_time = QTime(0, 0)
-            total_time = total_time.addMSecs(accurate_duration)
-            
-            time_format = "mm:ss"
-            if accurate_duration > 3600000:  # 如果时长超过1小时，显示小时
-                time_format = "hh:mm:ss"
-            
-            time_text = f"{current_time.toString(time_format)} / {total_time.toString(time_format)}"
-            self.timeLabel.setText(time_text)
+            self.set_display_duration(accurate_duration)
+            self.update_time_label(0)
+            self.positionSlider.setRange(0, accurate_duration)
+
+        # 已经渲染好当前速率的变速结果时直接换用
+        self.apply_stretch(position=0)
+        
+        # 在后台准备前后相邻的片段
+        self.prefetch_neighbors()
         
         return True
     
-    def set_track_list(self, track_list):
-        """设置音频片段列表"""
-        self.track_list = track_list
+    def set_track_list(self, track_list, durations=None):
+        """
+        设置音频片段列表
+
+        参数:
+        track_list (list): 片段文件路径
+        durations (dict): 已知的准确时长，文件路径 -> 毫秒
+        """
+        self.track_list = list(track_list)
         self.current_track_index = -1
+        self.track_durations = dict(durations or {})
+        self.track_windows = []
+        self.prepared_tracks = {}
+        self.standby_file = None
+        self.standbyPlayer.setMedia(QMediaContent())
+        self.waveformView.set_data(None, [])
+        # 重新分段时片段文件名不变而内容不同，之前的变速结果不能再用
+        self.stretch_cache.clear()
+
+    def add_track(self, file_path, duration_ms=None):
+        """在片段列表末尾追加一个片段，用于处理过程中逐个导出的片段"""
+        self.track_list.append(file_path)
+        if duration_ms is not None:
+            self.track_durations[file_path] = duration_ms
+        # 当前片段原来是最后一个时，现在可以准备下一个片段了
+        if self.current_track_index == len(self.track_list) - 2:
+            self.prefetch_neighbors()
+
+    def set_track_durations(self, durations):
+        """补充已知的准确时长(例如全部导出后写入的片段清单)，文件路径 -> 毫秒"""
+        self.track_durations.update(durations)
+
+    def set_waveform(self, pyramid, ranges=None):
+        """
+        显示源文件的波形概览，应在设置片段列表之后调用
+
+        参数:
+        pyramid (PeakPyramid): 源文件的峰值金字塔，为None时不显示波形
+        ranges (list): 每个片段在源文件中的 (start_ms, end_ms)，未知时为None；
+            为None时使用虚拟片段的范围
+        """
+        ranges = list(self.track_windows) if ranges is None else list(ranges)
+        self.waveformView.set_data(pyramid, ranges)
+        self.waveformView.set_current_segment(self.current_track_index)
+
+    def waveform_seek(self, position):
+        """单击波形：跳转到该位置，不在当前片段中时先切换到所在的片段"""
+        index = self.waveformView.segment_at(position)
+        if index is None:
+            return
+        start_ms, end_ms = self.waveformView.segments[index]
+        if index != self.current_track_index:
+            self.set_current_track(index)
+            self.mediaPlayer.play()
+        self.set_position(min(max(0, position - start_ms), end_ms - start_ms))
+
+    def set_segment_windows(self, source_file, windows):
+        """
+        设置虚拟片段列表：每个片段是源文件中的一段时间范围，播放时定位到片段开头，播放到片段结尾为止
+
+        参数:
+        source_file (str): 源音频文件路径
+        windows (list): 每个片段的 (start_ms, end_ms)
+        """
+        self.set_track_list([source_file] * len(windows))
+        self.track_windows = list(windows)
+
+    def load_window(self, index):
+        """加载第 index 个虚拟片段；源文件已经加载时只需要跳转，切换片段没有停顿"""
+        source_file = self.track_list[index]
+        start_ms, end_ms = self.track_windows[index]
+        self.current_file = source_file
+        self.stretch_rate, self.stretch_offset = None, 0
+        if self.window_source != source_file:
+            # 上一个片段播放的是渲染结果时也要重新加载源文件，并继续播放
+            playing = self.mediaPlayer.state() == QMediaPlayer.PlayingState
+            self.set_media(QMediaContent(QUrl.fromLocalFile(source_file)))
+            self.mediaPlayer.setPlaybackRate(self.playback_rates[self.current_rate_index])
+            if playing:
+                self.mediaPlayer.play()
+            self.window_source = source_file
+            logging.info(f"加载音频文件: {source_file}")
+
+        self.window_start, self.window_end = start_ms, end_ms
+        self.accurate_duration = end_ms - start_ms
+        self.positionSlider.setRange(0, self.accurate_duration)
+        self.set_display_duration(self.accurate_duration)
+        self.seek_source(start_ms)
+        self.trackLabel.setText(f"第 {index + 1} 段")
+        self.position_changed(start_ms)
+        self.apply_stretch(position=start_ms)
+
+    def window_finished(self):
+        """播放到虚拟片段的结尾：与文件播放结束时一样，有下一个片段就继续播放，否则停在片段结尾"""
+        if self.current_track_index < len(self.track_list) - 1:
+            self.set_current_track(self.current_track_index + 1)
+        else:
+            self.mediaPlayer.pause()
+            self.seek_source(self.window_end)
         
     def set_current_track(self, index):
         """设置当前播放的音频片段索引"""
         if 0 <= index < len(self.track_list):
+            # 切换片段后不再恢复更改速率前的位置
+            self.rate_change_timer.stop()
+            self.rate_change_player = None
             self.current_track_index = index
-            self.load_file(self.track_list[index], index + 1)
+            if self.track_windows:
+                self.load_window(index)
+            else:
+                self.load_file(self.track_list[index], index + 1)
+            self.waveformView.set_current_segment(index)
             self.trackChanged.emit(index)
             return True
         return False
@@ -455,6 +947,13 @@ class AudioPlayer(QWidget):
     
     def media_status_changed(self, status):
         """媒体状态改变时的处理"""
+        # 媒体加载完成：补上加载期间的跳转
+        if self.media_loading and status in (QMediaPlayer.LoadedMedia, QMediaPlayer.BufferedMedia):
+            self.media_loading = False
+            if self.pending_seek is not None:
+                self.mediaPlayer.setPosition(self.pending_seek)
+                self.pending_seek = None
+
         # 当媒体加载完成时，确保更新时长
         if status == QMediaPlayer.LoadedMedia:
             self.duration_changed(self.mediaPlayer.duration())
@@ -471,6 +970,9 @@ class AudioPlayer(QWidget):
         if self.mediaPlayer.state() == QMediaPlayer.PlayingState:
             self.mediaPlayer.pause()
         else:
+            # 虚拟片段已经播放到结尾(或停止后回到了文件开头)时从片段开头重新播放
+            if self.window_end is not None and not self.window_start <= self.source_position() < self.window_end:
+                self.seek_source(self.window_start)
             self.mediaPlayer.play()
     
     def stop(self):
@@ -478,10 +980,12 @@ class AudioPlayer(QWidget):
         self.mediaPlayer.stop()
     
     def seek_relative(self, msecs):
-        """相对跳转"""
-        current_position = self.mediaPlayer.position()
-        new_position = max(0, current_position + msecs)
-        self.mediaPlayer.setPosition(new_position)
+        """相对跳转，虚拟片段不超出片段的范围"""
+        current_position = self.source_position()
+        new_position = max(self.window_start, current_position + msecs)
+        if self.window_end is not None:
+            new_position = min(new_position, self.window_end)
+        self.seek_source(new_position)
     
     def slider_pressed(self):
         """进度条按下时的处理"""
@@ -494,106 +998,308 @@ class AudioPlayer(QWidget):
         self.set_position(self.positionSlider.value())
 
     def set_position(self, position):
-        """设置播放位置"""
-        self.mediaPlayer.setPosition(position)
+        """设置播放位置，position 是相对当前片段开头的位置"""
+        self.seek_source(self.window_start + position)
         # 确保设置位置后如果是播放状态则继续播放
         if self.mediaPlayer.state() == QMediaPlayer.PausedState:
             self.mediaPlayer.play()
     
+    def media_to_source(self, media_position):
+        """播放器中的位置换算为原始文件中的位置(毫秒)"""
+        if self.stretch_rate is None:
+            return media_position
+        return self.stretch_offset + int(round(media_position * self.stretch_rate))
+
+    def source_position(self):
+        """当前播放位置在原始文件中的位置(毫秒)"""
+        return self.media_to_source(self.mediaPlayer.position())
+
+    def seek_source(self, position):
+        """跳转到原始文件中的位置(毫秒)，播放渲染结果时换算为渲染结果中的位置"""
+        if self.stretch_rate is not None:
+            position = max(0, int(round((position - self.stretch_offset) / self.stretch_rate)))
+        if self.media_loading:
+            self.pending_seek = position
+        self.mediaPlayer.setPosition(position)
+
+    def set_media(self, content):
+        """给当前播放器设置媒体，加载完成前的跳转在加载完成后重新设置"""
+        self.mediaPlayer.setMedia(content)
+        self.media_loading, self.pending_seek = True, None
+
+    def media_position_changed(self, media_position):
+        """播放器报告的位置换算为原始文件中的位置后更新UI；播放时由刷新定时器统一更新"""
+        if not self.refresh_timer.isActive():
+            self.position_changed(self.media_to_source(media_position))
+
+    def refresh_position(self):
+        """刷新定时器：读取播放位置并更新UI，然后按界面需要调整下一次刷新的间隔"""
+        position = self.source_position()
+        self.position_changed(position)
+        if self.refresh_timer.isActive():
+            self.refresh_timer.setInterval(self.refresh_interval(position))
+
+    def refresh_interval(self, position):
+        """
+        距离界面下一次需要变化的时间(毫秒)
+
+        取进度条移动一个像素、波形上的播放位置移动一个像素、时间标签的秒数变化
+        和虚拟片段结束中最早的一个，按播放速率换算为实际时间。
+
+        参数:
+        position (int): 原始文件中的播放位置(毫秒)
+
+        返回:
+        int: 在显示器的一帧到 MAX_REFRESH_MS 之间
+        """
+        local = max(0, position - self.window_start)
+        waits = [1000 - local % 1000,
+                 max(1, self.positionSlider.maximum()) / max(1, self.positionSlider.width())]
+        view = self.waveformView
+        if not view.isHidden() and view.pyramid is not None:
+            waits.append((view.view_end - view.view_start) / max(1, view.width()))
+        if self.window_end is not None:
+            waits.append(self.window_end - position)
+        interval = min(waits) / self.playback_rates[self.current_rate_index]
+        return int(min(max(self.frame_interval, interval), MAX_REFRESH_MS))
+
+    def set_display_duration(self, duration):
+        """设置时间标签中的总时长，文本在切换片段时格式化一次"""
+        self.time_with_hours = duration > 3600000  # 如果时长超过1小时，显示小时
+        self.total_time_text = format_time(duration, self.time_with_hours)
+        self.displayed_second = None
+
+    def update_time_label(self, position):
+        """显示的秒数变化时才更新时间标签"""
+        second = max(0, position) // 1000
+        if second != self.displayed_second:
+            self.displayed_second = second
+            self.timeLabel.setText(f"{format_time(position, self.time_with_hours)} / {self.total_time_text}")
+
     def position_changed(self, position):
-        """播放位置改变时更新UI"""
-        # 直接更新进度条位置以确保精确性
+        """播放位置改变时更新UI，position 是原始文件中的位置"""
+        # 虚拟片段：到达片段结尾时切换或停止，界面显示相对片段开头的位置
+        if self.window_end is not None:
+            if position >= self.window_end and self.mediaPlayer.state() == QMediaPlayer.PlayingState:
+                self.window_finished()
+                return
+            position = min(max(0, position - self.window_start), self.window_end - self.window_start)
+
         if not self.is_dragging:
-            # 使用准确时长来限制进度条位置
-            max_position = self.accurate_duration if self.accurate_duration is not None else self.mediaPlayer.duration()
-            self.positionSlider.setValue(min(position, max_position))
-        
-        # 更新时间标签
-        actual_duration = self.accurate_duration if self.accurate_duration is not None else self.mediaPlayer.duration()
-        
-        # 转换为时分秒格式
-        current_time = QTime(0, 0)
-        current_time = current_time.addMSecs(position)
-        total_time = QTime(0, 0)
-        total_time = total_time.addMSecs(actual_duration)
-        
-        time_format = "mm:ss"
-        if actual_duration > 3600000:  # 如果时长超过1小时，显示小时
-            time_format = "hh:mm:ss"
-        
-        time_text = f"{current_time.toString(time_format)} / {total_time.toString(time_format)}"
-        self.timeLabel.setText(time_text)
+            # 使用进度条的范围(准确时长)来限制进度条位置
+            position_value = min(position, self.positionSlider.maximum())
+            # 移动不到一个像素时不重绘进度条
+            step = max(1, self.positionSlider.maximum() // max(1, self.positionSlider.width()))
+            if abs(position_value - self.positionSlider.value()) >= step:
+                self.positionSlider.setValue(position_value)
+
+        self.update_time_label(position)
+        self.update_waveform_playhead(position)
+
+    def update_waveform_playhead(self, position):
+        """在波形上标出播放位置，position 是相对当前片段开头的位置"""
+        segments = self.waveformView.segments
+        if self.waveformView.isHidden() or not 0 <= self.current_track_index < len(segments):
+            return
+        segment = segments[self.current_track_index]
+        self.waveformView.set_playhead(None if segment is None else segment[0] + position)
 
     def change_playback_rate(self, index):
-        """更改播放速率"""
-        if 0 <= index < len(self.playback_rates):
-            # 记录当前播放位置和状态
-            current_position = self.mediaPlayer.position()
-            was_playing = self.mediaPlayer.state() == QMediaPlayer.PlayingState
-            
-            self.current_rate_index = index
-            rate = self.playback_rates[index]
-            
-            # 先暂停播放再更改速率
-            if was_playing:
-                self.mediaPlayer.pause()
-            
-            # 设置新的播放速率
-            self.mediaPlayer.setPlaybackRate(rate)
-            
-            # 根据播放速率调整位置更新间隔
-            # 播放速度越快，更新间隔应该越小，以保持进度条的准确性
-            base_interval = 50  # 基础间隔50ms
-            new_interval = max(10, int(base_interval / rate))  # 最小10ms
-            self.mediaPlayer.setNotifyInterval(new_interval)
-            
-            # 延迟一小段时间后再设置播放位置，确保速率变更生效
-            import time
-            time.sleep(0.1)  # 延迟100ms
-            
-            # 重新设置播放位置，确保同步
-            self.mediaPlayer.setPosition(current_position)
-            
-            # 强制更新一次进度条
-            self.position_changed(current_position)
-            
-            # 如果之前是播放状态，恢复播放
-            if was_playing:
-                self.mediaPlayer.play()
+        """
+        更改播放速率
+
+        保持音调时优先换用渲染好的变速结果；没有渲染好时先由播放器自身变速，
+        同时在后台渲染，完成后再换过去。
+        """
+        if not 0 <= index < len(self.playback_rates):
+            return
+        self.current_rate_index = index
+        if self.apply_stretch():
+            return
+        self.set_native_rate(self.playback_rates[index])
+
+    def set_native_rate(self, rate):
+        """
+        由播放器自身更改播放速率
+
+        先暂停再设置速率，等播放器发出 playbackRateChanged (或等待超时)后
+        回到原来的位置并恢复播放；等待期间不阻塞界面，连续切换速率时只恢复一次。
+        """
+        player = self.mediaPlayer
+        if self.rate_change_player is not player:
+            self.rate_change_player = player
+            self.rate_change_position = self.source_position()
+            self.rate_change_resume = player.state() == QMediaPlayer.PlayingState
+
+        # 先暂停播放再更改速率
+        if self.rate_change_resume:
+            player.pause()
+
+        # 有的播放器在 setPlaybackRate 中就同步发出信号，计时要在此之前开始
+        self.rate_change_timer.start(RATE_CHANGE_TIMEOUT_MS)
+        player.setPlaybackRate(rate)
+
+    def playback_rate_applied(self, rate):
+        """播放器确认了新的速率"""
+        if self.rate_change_player is self.mediaPlayer and rate == self.playback_rates[self.current_rate_index]:
+            self.finish_rate_change()
+
+    def finish_rate_change(self):
+        """速率变更生效后重新设置播放位置，确保同步，之前在播放时恢复播放"""
+        self.rate_change_timer.stop()
+        player, self.rate_change_player = self.rate_change_player, None
+        if player is not self.mediaPlayer:
+            return
+
+        self.seek_source(self.rate_change_position)
+        # 强制更新一次进度条
+        self.position_changed(self.rate_change_position)
+        if self.rate_change_resume:
+            player.play()
+
+    def set_preserve_pitch(self, checked):
+        """开启或关闭变速不变调"""
+        self.preserve_pitch = bool(checked)
+        if not self.apply_stretch():
+            self.set_native_rate(self.playback_rates[self.current_rate_index])
+
+    def stretch_key(self, index=None):
+        """
+        第 index 个片段(默认为当前片段)在当前速率下的变速结果
+
+        返回:
+        StretchKey: 不需要变速渲染(1倍速或没有保持音调)时返回None
+        """
+        rate = self.playback_rates[self.current_rate_index]
+        if not self.preserve_pitch or rate == 1.0:
+            return None
+        if index is None:
+            if not self.current_file:
+                return None
+            if self.window_end is not None:
+                return StretchKey(self.current_file, self.window_start, self.window_end, rate)
+            return StretchKey(self.current_file, 0, None, rate)
+        if not 0 <= index < len(self.track_list):
+            return None
+        if self.track_windows:
+            start_ms, end_ms = self.track_windows[index]
+            return StretchKey(self.track_list[index], start_ms, end_ms, rate)
+        return StretchKey(self.track_list[index], 0, None, rate)
+
+    def apply_stretch(self, position=None):
+        """
+        按当前速率选择播放的内容：已经渲染好时换用渲染结果，不需要时换回原始文件，
+        没有渲染好时在后台渲染
+
+        参数:
+        position (int): 原始文件中的播放位置(毫秒)，为None时使用当前位置
+
+        返回:
+        bool: 是否正在播放渲染结果
+        """
+        key = self.stretch_key()
+        path = self.stretch_cache.file_for(key) if key else None
+        if path:
+            if self.stretch_rate != key.rate:
+                self.switch_media(path, key.rate, key.start_ms, position)
+            return True
+        if self.stretch_rate is not None:
+            self.switch_media(self.current_file, None, 0, position)
+        if key:
+            self.request_stretch(key)
+        return False
+
+    def switch_media(self, file_path, stretch_rate, offset, position=None):
+        """
+        换用另一个文件播放当前片段(渲染结果或原始文件)，保持原始文件中的位置和播放状态
+
+        参数:
+        file_path (str): 要播放的文件
+        stretch_rate (float): 渲染结果的速率，播放原始文件时为None
+        offset (int): 渲染结果的开头在原始文件中的位置(毫秒)
+        position (int): 原始文件中的播放位置(毫秒)，为None时使用当前位置
+        """
+        if position is None:
+            position = self.source_position()
+        playing = self.mediaPlayer.state() == QMediaPlayer.PlayingState
+        # 换用文件后不再恢复更改速率前的位置
+        self.rate_change_timer.stop()
+        self.rate_change_player = None
+
+        self.set_media(QMediaContent(QUrl.fromLocalFile(file_path)))
+        self.stretch_rate, self.stretch_offset = stretch_rate, offset
+        # 渲染结果已经是目标速度，以1倍速播放
+        self.mediaPlayer.setPlaybackRate(1.0 if stretch_rate else self.playback_rates[self.current_rate_index])
+        # 虚拟片段播放渲染结果时播放器中不再是源文件，下一个片段需要重新加载源文件
+        self.window_source = file_path if stretch_rate is None and self.window_end is not None else None
+        self.seek_source(position)
+        if playing:
+            self.mediaPlayer.play()
+
+    def load_stretch_source(self, key):
+        """读取要渲染的原速片段(在后台线程中调用)"""
+        if key.end_ms is None:
+            return AudioSegment.from_file(key.source_file)
+        if key.source_file not in self.source_formats:
+            info = probe_audio(key.source_file)
+            self.source_formats[key.source_file] = (info['frame_rate'], info['channels'])
+        frame_rate, channels = self.source_formats[key.source_file]
+        return decode_range(key.source_file, key.start_ms, key.end_ms, frame_rate, channels)
+
+    def request_stretch(self, key):
+        """在后台渲染一个变速结果，已经缓存或正在渲染时不重复"""
+        if key in self.stretch_rendering or key in self.stretch_cache:
+            return
+        self.stretch_rendering.add(key)
+        future = self.stretch_executor.submit(self.stretch_cache.render, key, self.load_stretch_source)
+        # 信号从后台线程发出，由Qt排队到界面线程处理
+        future.add_done_callback(lambda f: self.stretchRendered.emit(key, f.exception()))
+
+    def stretch_rendered(self, key, error):
+        """变速结果渲染完成：仍是当前片段和速率时换用它，然后渲染下一个片段"""
+        self.stretch_rendering.discard(key)
+        if error is not None:
+            logging.error(f"渲染变速音频失败: {str(error)}")
+            return
+        if key == self.stretch_key():
+            self.apply_stretch()
+            # 连续播放时下一个片段不必再等待渲染
+            next_key = self.stretch_key(self.current_track_index + 1)
+            if next_key:
+                self.request_stretch(next_key)
     
     def duration_changed(self, duration):
         """媒体时长改变时更新UI"""
+        # 渲染结果的时长换算为原速的时长
+        if self.stretch_rate is not None:
+            duration = int(round(duration * self.stretch_rate))
         # 确定使用哪个时长值
         actual_duration = self.accurate_duration if self.accurate_duration is not None else duration
         
         self.positionSlider.setRange(0, actual_duration)
         
         # 添加日志记录时长信息
-        import logging
         logging.info(f"QMediaPlayer提供的时长: {duration}毫秒 ({duration/1000:.2f}秒)")
         if self.accurate_duration is not None:
-            logging.info(f"使用pydub获取的准确时长: {self.accurate_duration}毫秒 ({self.accurate_duration/1000:.2f}秒)")
+            # 准确时长来自片段清单或MP3帧头，只有非MP3文件才由pydub解码获得
+            logging.info(f"使用准确时长: {self.accurate_duration}毫秒 ({self.accurate_duration/1000:.2f}秒)")
         
         # 更新时间标签
         if actual_duration > 0:
-            current_time = QTime(0, 0)
-            current_time = current_time.addMSecs(0)
-            total_time = QTime(0, 0)
-            total_time = total_time.addMSecs(actual_duration)
-            
-            time_format = "mm:ss"
-            if actual_duration > 3600000:  # 如果时长超过1小时，显示小时
-                time_format = "hh:mm:ss"
-            
-            time_text = f"{current_time.toString(time_format)} / {total_time.toString(time_format)}"
-            self.timeLabel.setText(time_text)
+            self.set_display_duration(actual_duration)
+            self.update_time_label(0)
     
     def media_state_changed(self, state):
         """媒体状态改变时更新UI"""
+        # 更改速率时的短暂暂停不显示在界面上
+        if self.rate_change_player is not None and self.rate_change_resume and state == QMediaPlayer.PausedState:
+            return
         if state == QMediaPlayer.PlayingState:
+            self.refresh_timer.start(self.frame_interval)
             self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
             self.playStateChanged.emit(True)
         else:
+            self.refresh_timer.stop()
             self.playButton.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
             self.playStateChanged.emit(False)
             
@@ -626,13 +1332,6 @@ class AudioPlayer(QWidget):
         self.volumeSlider.setValue(value)
         self.volumeValueLabel.setText(f"{value}%")
 
-    def change_playback_rate(self, index):
-        """更改播放速率"""
-        if 0 <= index < len(self.playback_rates):
-            self.current_rate_index = index
-            rate = self.playback_rates[index]
-            self.mediaPlayer.setPlaybackRate(rate)
-
 
 # 测试代码
 if __name__ == "__main__":
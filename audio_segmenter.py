@@ -1,14 +1,41 @@
 import os
+import glob
+import json
+import time
 import argparse
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pydub.silence import detect_nonsilent
 import logging
+from analysis_cache import DEFAULT_CACHE_SIZE_MB, AnalysisCache
+from audio_analysis import (DEFAULT_KEEP_SILENCE_MS, DEFAULT_MAX_SEGMENT_MS, DEFAULT_MIN_SEGMENT_MS, SegmentMerger,
+                            compute_envelope, compute_file_envelope, envelope_segment_ranges, pad_ranges,
+                            stream_segment_ranges)
+from audio_decoder import DEFAULT_BLOCK_MS, DEFAULT_DECODE_JOBS, decode_range, load_audio, probe_audio
+from mp3_frames import probe_duration_ms
+from segment_exporter import DEFAULT_WORKERS, EXPORT_BACKENDS, ExportTask, create_exporter, segment_output_path
+from segment_manifest import write_manifest
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def segment_audio(file_path, output_dir, min_silence_len=1000, silence_thresh=-40):
+# 批量模式识别的音频扩展名
+AUDIO_EXTENSIONS = ('.mp3',)
+
+# 批量模式默认同时处理的文件数
+DEFAULT_JOBS = os.cpu_count() or 1
+
+# 批量模式在每个文件的输出子目录中记录处理结果，用于跳过已是最新的输入
+BATCH_STAMP_FILE = '.segmenter_stamp.json'
+
+def describe_threshold(silence_thresh, adaptive_thresh):
+    """日志中显示的静默阈值"""
+    return "自动(按背景噪声)" if adaptive_thresh else f"{silence_thresh}dB"
+
+def segment_audio(file_path, output_dir, min_silence_len=1000, silence_thresh=-40, streaming=False, block_ms=DEFAULT_BLOCK_MS,
+                  workers=DEFAULT_WORKERS, export_backend='pydub', cache_size_mb=DEFAULT_CACHE_SIZE_MB,
+                  adaptive_thresh=False, min_segment_ms=DEFAULT_MIN_SEGMENT_MS, max_segment_ms=DEFAULT_MAX_SEGMENT_MS,
+                  analysis_jobs=1, decode_jobs=DEFAULT_DECODE_JOBS, full_rate_analysis=False, pydub_silence=False):
     """
     将音频文件按照静默部分分段
     
@@ -17,6 +44,20 @@ def segment_audio(file_path, output_dir, min_silence_len=1000, silence_thresh=-4
     output_dir (str): 输出目录
     min_silence_len (int): 最小静默长度(毫秒)
     silence_thresh (int): 静默阈值(分贝)
+    streaming (bool): 是否使用流式模式(不把整个文件解码到内存)
+    block_ms (int): 流式模式下每次解码的块时长(毫秒)
+    workers (int): 并发导出片段的数量
+    export_backend (str): 导出方式，'pydub'逐段编码，'ffmpeg'由ffmpeg直接从源文件切分，
+        'copy'在MP3帧边界上无损复制
+    cache_size_mb (int): 分析缓存的容量上限(MB)，0表示不使用缓存
+    adaptive_thresh (bool): 为True时忽略 silence_thresh，按背景噪声自动确定静默阈值
+    min_segment_ms (int): 最短片段时长(毫秒)，更短的片段并入相邻片段，无法合并时跳过
+    max_segment_ms (int): 合并后的最长片段时长(毫秒)，0表示不限制
+    analysis_jobs (int): 全采样率分析时计算响度使用的进程数，大于1时分片并行计算
+    decode_jobs (int): 全采样率分析时解码MP3使用的ffmpeg进程数，大于1时把长文件按帧拆开并行解码
+    full_rate_analysis (bool): 为True时把整个文件按原格式解码到内存再分析，片段直接从内存中切出；
+        默认只解码低采样率的单声道PCM用于检测，导出时按原格式解码各片段
+    pydub_silence (bool): 为True时按早期版本的方式检测静默，见 segment_audio_pydub
     
     返回:
     list: 分段后的音频文件路径列表
@@ -29,58 +70,447 @@ def segment_audio(file_path, output_dir, min_silence_len=1000, silence_thresh=-4
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
     
-    # 加载音频文件
+    if pydub_silence:
+        return segment_audio_pydub(file_path, output_dir, min_silence_len, silence_thresh, workers, export_backend,
+                                   min_segment_ms, max_segment_ms, decode_jobs)
+    
+    # 同一个文件分析过就直接用缓存的响度曲线，不再解码
+    cache = AnalysisCache(max_size_mb=cache_size_mb) if cache_size_mb > 0 else None
+    envelope = cache.load(file_path, full_rate_analysis) if cache else None
+    
+    if envelope is None and streaming:
+        return segment_audio_streaming(file_path, output_dir, min_silence_len, silence_thresh, block_ms, workers,
+                                       export_backend, cache, adaptive_thresh, min_segment_ms, max_segment_ms)
+    
+    audio = None
+    if envelope is None and full_rate_analysis:
+        # 加载音频文件
+        logger.info(f"正在加载音频文件: {file_path}")
+        try:
+            audio = load_audio(file_path, decode_jobs)
+            logger.info(f"音频加载完成，长度: {len(audio)/1000:.2f}秒")
+        except Exception as e:
+            logger.error(f"加载音频失败: {str(e)}")
+            return []
+        
+        envelope = compute_envelope(audio, jobs=analysis_jobs)
+        if cache:
+            cache.store(file_path, envelope, full_rate=True)
+    elif envelope is None:
+        # 只解码低采样率的单声道PCM计算响度，不把整个文件载入内存
+        logger.info(f"正在分析音频文件: {file_path}")
+        try:
+            envelope = compute_file_envelope(file_path)
+            logger.info(f"音频分析完成，长度: {envelope.duration_ms/1000:.2f}秒")
+        except Exception as e:
+            logger.error(f"分析音频失败: {str(e)}")
+            return []
+        
+        if cache:
+            cache.store(file_path, envelope)
+    else:
+        logger.info(f"使用缓存的分析结果，长度: {envelope.duration_ms/1000:.2f}秒")
+    
+    # 分割音频
+    logger.info(f"开始分割音频，最小静默长度: {min_silence_len}ms，静默阈值: {describe_threshold(silence_thresh, adaptive_thresh)}")
+    ranges = envelope_segment_ranges(
+        envelope,
+        min_silence_len,
+        silence_thresh,
+        keep_silence=DEFAULT_KEEP_SILENCE_MS,  # 保留每个片段前后200ms的静默
+        adaptive_thresh=adaptive_thresh
+    )
+    
+    if audio is not None:
+        load_segment = lambda task: audio[task.start_ms:task.end_ms]
+    else:
+        # 没有解码整个文件时，每个片段只解码自己的时间范围
+        load_segment = lambda task: decode_range(file_path, task.start_ms, task.end_ms,
+                                                 envelope.frame_rate, envelope.channels)
+    
+    return export_ranges(file_path, output_dir, ranges, load_segment, workers, export_backend,
+                         min_segment_ms, max_segment_ms, envelope)
+
+def segment_audio_pydub(file_path, output_dir, min_silence_len, silence_thresh, workers=DEFAULT_WORKERS,
+                        export_backend='pydub', min_segment_ms=DEFAULT_MIN_SEGMENT_MS,
+                        max_segment_ms=DEFAULT_MAX_SEGMENT_MS, decode_jobs=DEFAULT_DECODE_JOBS):
+    """
+    按早期版本的方式分段：把整个文件按原格式解码，用pydub的 detect_nonsilent 逐毫秒滑动检测静默
+    
+    默认的检测按10ms分帧判断每帧是否静默，pydub则在最小静默长度的窗口内计算整体响度，
+    两者的片段边界可能略有不同；需要与以前生成的片段保持一致时使用。检测较慢，不使用分析缓存，也不支持自动阈值
+    """
     logger.info(f"正在加载音频文件: {file_path}")
     try:
-        audio = AudioSegment.from_mp3(file_path)
+        audio = load_audio(file_path, decode_jobs)
         logger.info(f"音频加载完成，长度: {len(audio)/1000:.2f}秒")
     except Exception as e:
         logger.error(f"加载音频失败: {str(e)}")
         return []
     
-    # 分割音频
-    logger.info(f"开始分割音频，最小静默长度: {min_silence_len}ms，静默阈值: {silence_thresh}dB")
-    segments = split_on_silence(
-        audio,
-        min_silence_len=min_silence_len,
-        silence_thresh=silence_thresh,
-        keep_silence=200  # 保留每个片段前后200ms的静默
+    logger.info(f"开始分割音频(pydub逐毫秒检测)，最小静默长度: {min_silence_len}ms，静默阈值: {silence_thresh}dB")
+    ranges = pad_ranges(
+        detect_nonsilent(audio, min_silence_len=min_silence_len, silence_thresh=silence_thresh),
+        DEFAULT_KEEP_SILENCE_MS,
+        len(audio)
     )
+    return export_ranges(file_path, output_dir, ranges, lambda task: audio[task.start_ms:task.end_ms], workers,
+                         export_backend, min_segment_ms, max_segment_ms)
+
+def export_ranges(file_path, output_dir, ranges, load_segment, workers=DEFAULT_WORKERS, export_backend='pydub',
+                  min_segment_ms=DEFAULT_MIN_SEGMENT_MS, max_segment_ms=DEFAULT_MAX_SEGMENT_MS, envelope=None):
+    """
+    合并太短的片段后导出各片段，并写入片段清单
     
-    logger.info(f"音频分割完成，共 {len(segments)} 个片段")
+    参数:
+    ranges (list): 片段区间 [(start_ms, end_ms), ...]
+    load_segment (callable): 根据 ExportTask 返回该片段的AudioSegment
+    envelope (AudioEnvelope): 源文件的响度曲线，用于在清单中记录电平，为None时不记录
+    其余参数同 segment_audio
+    
+    返回:
+    list: 分段后的音频文件路径列表
+    """
+    # 太短的片段并入相邻片段，只处理起止位置，不切分音频
+    merger = SegmentMerger(min_segment_ms, max_segment_ms)
+    ranges = merger.merge(ranges)
+    log_merged_segments(merger)
+    logger.info(f"音频分割完成，共 {len(ranges)} 个片段")
     
     # 保存分段后的音频
     file_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_files = []
+    tasks = [ExportTask(i+1, start, end, segment_output_path(output_dir, file_name, i+1))
+             for i, (start, end) in enumerate(ranges)]
     
-    for i, segment in enumerate(segments):
-        # 跳过太短的片段(小于1秒)
-        if len(segment) < 1000:
-            logger.warning(f"跳过太短的片段 {i+1}，长度: {len(segment)/1000:.2f}秒")
-            continue
-        
-        output_file = os.path.join(output_dir, f"{file_name}_segment_{i+1:03d}.mp3")
-        segment.export(output_file, format="mp3")
-        output_files.append(output_file)
-        logger.info(f"已保存片段 {i+1} 到: {output_file}")
+    exporter = create_exporter(export_backend, file_path, load_segment, workers)
+    output_files = exporter.export(tasks, progress_callback=log_saved_segment)
+    write_manifest(file_path, output_dir, tasks, output_files, envelope)
+    return output_files
+
+def segment_audio_streaming(file_path, output_dir, min_silence_len, silence_thresh, block_ms=DEFAULT_BLOCK_MS,
+                            workers=DEFAULT_WORKERS, export_backend='pydub', cache=None, adaptive_thresh=False,
+                            min_segment_ms=DEFAULT_MIN_SEGMENT_MS, max_segment_ms=DEFAULT_MAX_SEGMENT_MS):
+    """
+    流式分段：从ffmpeg管道按块读取PCM并增量检测静默，
+    每确认一个片段就只解码该片段并保存，峰值内存只与块大小和片段长度有关；
+    解码结束后把响度曲线写入分析缓存 cache(为None时不缓存)
+    """
+    try:
+        audio_info = probe_audio(file_path)
+    except Exception as e:
+        logger.error(f"读取音频信息失败: {str(e)}")
+        return []
+    
+    logger.info(f"开始流式分割音频，最小静默长度: {min_silence_len}ms，"
+                f"静默阈值: {describe_threshold(silence_thresh, adaptive_thresh)}，块大小: {block_ms}ms")
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    
+    # 解码结束后得到的响度曲线和提交过的任务，用于写入片段清单
+    envelopes = []
+    tasks = []
+    merger = SegmentMerger(min_segment_ms, max_segment_ms)
+    
+    def store_envelope(envelope):
+        envelopes.append(envelope)
+        if cache:
+            cache.store(file_path, envelope)
     
+    def iter_tasks():
+        ranges = stream_segment_ranges(file_path, min_silence_len, silence_thresh,
+                                       keep_silence=DEFAULT_KEEP_SILENCE_MS, block_ms=block_ms, audio_info=audio_info,
+                                       envelope_callback=store_envelope, adaptive_thresh=adaptive_thresh)
+        # 太短的片段并入相邻片段，遇到足够长的静默时就能确定之前的片段
+        for i, (start, end) in enumerate(merger.iter_merge(ranges)):
+            task = ExportTask(i+1, start, end, segment_output_path(output_dir, file_name, i+1))
+            tasks.append(task)
+            yield task
+    
+    # 检测到一个片段就提交导出，每个片段只解码自己的时间范围
+    # ffmpeg切分和无损复制方式需要先拿到全部片段，再一次性切分
+    exporter = create_exporter(
+        export_backend,
+        file_path,
+        lambda task: decode_range(file_path, task.start_ms, task.end_ms, audio_info['frame_rate'], audio_info['channels']),
+        workers
+    )
+    output_files = exporter.export(iter_tasks(), progress_callback=log_saved_segment)
+    log_merged_segments(merger)
+    write_manifest(file_path, output_dir, tasks, output_files, envelopes[0] if envelopes else None)
     return output_files
 
+def log_merged_segments(merger):
+    """记录短片段的合并和跳过数量"""
+    if merger.merged_count:
+        logger.info(f"合并了 {merger.merged_count} 个太短的片段")
+    if merger.dropped_count:
+        logger.warning(f"跳过 {merger.dropped_count} 个无法合并的太短片段(短于{merger.min_segment_ms/1000:.2f}秒)")
+
+def log_saved_segment(done, total, task):
+    """导出进度回调：记录已保存的片段"""
+    logger.info(f"已保存片段 {task.index} ({task.start_ms/1000:.2f}s - {task.end_ms/1000:.2f}s) 到: {task.output_file}")
+
+def is_glob_pattern(path):
+    """路径中是否含有通配符"""
+    return any(c in path for c in '*?[')
+
+def collect_input_files(inputs):
+    """
+    展开批量模式的输入：文件原样保留，目录递归查找其中的MP3文件，含通配符的路径按glob展开
+    
+    参数:
+    inputs (list): 文件、目录或通配符路径
+    
+    返回:
+    list: [(输入文件路径, 输出子目录的相对路径), ...]，同一文件只出现一次
+    """
+    jobs = []
+    seen_files = set()
+    used_dirs = set()
+    
+    def add(file_path, relative_dir):
+        key = os.path.normcase(os.path.abspath(file_path))
+        if key in seen_files:
+            return
+        seen_files.add(key)
+        # 子目录以文件名命名，不同目录下的同名文件依次加上编号
+        name = os.path.normpath(os.path.join(relative_dir, os.path.splitext(os.path.basename(file_path))[0]))
+        sub_dir, n = name, 2
+        while os.path.normcase(sub_dir) in used_dirs:
+            sub_dir, n = f"{name}_{n}", n + 1
+        used_dirs.add(os.path.normcase(sub_dir))
+        jobs.append((file_path, sub_dir))
+    
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        add(os.path.join(root, name), os.path.relpath(root, item))
+        elif is_glob_pattern(item):
+            matches = [path for path in sorted(glob.glob(item, recursive=True)) if os.path.isfile(path)]
+            if not matches:
+                logger.warning(f"没有匹配的文件: {item}")
+            for path in matches:
+                add(path, '')
+        else:
+            add(item, '')
+    return jobs
+
+def batch_stamp(file_path, params):
+    """输入文件的大小、修改时间和分段参数，任何一项变化都需要重新处理"""
+    stat = os.stat(file_path)
+    return {'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns, 'params': params}
+
+def is_up_to_date(file_path, output_dir, params):
+    """输出子目录中的记录与输入文件和参数一致，且记录的片段文件都还在"""
+    try:
+        with open(os.path.join(output_dir, BATCH_STAMP_FILE), 'r', encoding='utf-8') as f:
+            stamp = json.load(f)
+        expected = batch_stamp(file_path, params)
+        outputs = stamp.get('outputs', [])
+        return (all(stamp.get(key) == value for key, value in expected.items()) and bool(outputs) and
+                all(os.path.exists(os.path.join(output_dir, name)) for name in outputs))
+    except (OSError, ValueError):
+        return False
+
+def segment_batch_job(file_path, output_dir, params, streaming, block_ms, workers, cache_size_mb, analysis_jobs=1,
+                      decode_jobs=1):
+    """
+    在进程池中处理一个文件，成功后写入处理记录
+    
+    返回:
+    tuple: (片段数, 音频时长毫秒)，失败时片段数为0
+    """
+    output_files = segment_audio(file_path, output_dir, params['min_silence_len'], params['silence_thresh'],
+                                 streaming, block_ms, workers, params['export_backend'], cache_size_mb,
+                                 params['adaptive_thresh'], params['min_segment_ms'], params['max_segment_ms'],
+                                 analysis_jobs, decode_jobs, params['full_rate_analysis'],
+                                 params.get('pydub_silence', False))
+    if not output_files:
+        return 0, 0
+    
+    try:
+        duration_ms = probe_duration_ms(file_path)
+    except Exception as e:
+        logger.warning(f"读取音频时长失败: {str(e)}")
+        duration_ms = 0
+    
+    stamp = batch_stamp(file_path, params)
+    stamp['outputs'] = [os.path.basename(path) for path in output_files]
+    with open(os.path.join(output_dir, BATCH_STAMP_FILE), 'w', encoding='utf-8') as f:
+        json.dump(stamp, f, ensure_ascii=False, indent=2)
+    return len(output_files), duration_ms
+
+def segment_batch(inputs, output_dir, min_silence_len=1000, silence_thresh=-40, streaming=False, block_ms=DEFAULT_BLOCK_MS,
+                  workers=DEFAULT_WORKERS, export_backend='pydub', cache_size_mb=DEFAULT_CACHE_SIZE_MB,
+                  jobs=DEFAULT_JOBS, force=False, adaptive_thresh=False, min_segment_ms=DEFAULT_MIN_SEGMENT_MS,
+                  max_segment_ms=DEFAULT_MAX_SEGMENT_MS, analysis_jobs=1, decode_jobs=DEFAULT_DECODE_JOBS,
+                  full_rate_analysis=False, pydub_silence=False):
+    """
+    批量分段：用进程池同时处理多个文件，每个文件的片段保存在 output_dir 下以文件名命名的子目录中
+    
+    参数:
+    inputs (list): 文件、目录或通配符路径
+    output_dir (str): 输出目录
+    jobs (int): 同时处理的文件数，导出并发数 workers、分析进程数 analysis_jobs 和解码进程数 decode_jobs
+        在这些进程之间平分
+    force (bool): 为True时不跳过输出已是最新的文件
+    其余参数同 segment_audio
+    
+    返回:
+    dict: 处理统计，包括处理、跳过和失败的文件数，耗时(秒)，
+        每分钟处理的文件数和每分钟处理的音频小时数
+    """
+    params = {'min_silence_len': min_silence_len, 'silence_thresh': silence_thresh, 'export_backend': export_backend,
+              'adaptive_thresh': adaptive_thresh, 'min_segment_ms': min_segment_ms, 'max_segment_ms': max_segment_ms,
+              'full_rate_analysis': full_rate_analysis}
+    if pydub_silence:
+        # 只在开启时记录，以前的处理记录仍然有效
+        params['pydub_silence'] = True
+    
+    pending = []
+    skipped = 0
+    for file_path, sub_dir in collect_input_files(inputs):
+        file_output_dir = os.path.join(output_dir, sub_dir)
+        if not force and is_up_to_date(file_path, file_output_dir, params):
+            logger.info(f"输出已是最新，跳过: {file_path}")
+            skipped += 1
+            continue
+        pending.append((file_path, file_output_dir))
+    
+    jobs = max(1, min(int(jobs), len(pending) or 1))
+    job_workers = max(1, workers // jobs)
+    job_analysis_jobs = max(1, analysis_jobs // jobs)
+    job_decode_jobs = max(1, decode_jobs // jobs)
+    logger.info(f"批量处理 {len(pending)} 个文件，跳过 {skipped} 个，同时处理 {jobs} 个文件，每个文件导出并发数 {job_workers}")
+    
+    processed = failed = segments = 0
+    audio_ms = 0
+    start_time = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(segment_batch_job, file_path, file_output_dir, params, streaming, block_ms,
+                                job_workers, cache_size_mb, job_analysis_jobs, job_decode_jobs): file_path
+                for file_path, file_output_dir in pending
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    segment_count, duration_ms = future.result()
+                except Exception as e:
+                    logger.error(f"处理失败: {file_path}: {str(e)}")
+                    segment_count, duration_ms = 0, 0
+                
+                if segment_count:
+                    processed += 1
+                    segments += segment_count
+                    audio_ms += duration_ms
+                    logger.info(f"[{processed + failed}/{len(pending)}] 完成: {file_path}，{segment_count} 个片段")
+                else:
+                    failed += 1
+                    logger.error(f"[{processed + failed}/{len(pending)}] 处理失败: {file_path}")
+    elapsed = time.perf_counter() - start_time
+    
+    minutes = elapsed / 60
+    summary = {
+        'processed': processed,
+        'skipped': skipped,
+        'failed': failed,
+        'segments': segments,
+        'audio_hours': audio_ms / 3600000,
+        'elapsed': elapsed,
+        'files_per_min': processed / minutes if minutes else 0.0,
+        'audio_hours_per_min': audio_ms / 3600000 / minutes if minutes else 0.0,
+    }
+    logger.info(f"批量处理完成：处理 {processed} 个文件(共 {segments} 个片段)，跳过 {skipped} 个，失败 {failed} 个，"
+                f"耗时 {elapsed:.1f}秒")
+    logger.info(f"吞吐量：{summary['files_per_min']:.2f} 文件/分钟，{summary['audio_hours_per_min']:.3f} 音频小时/分钟"
+                f"(共 {summary['audio_hours']:.2f} 小时音频)")
+    return summary
+
 def main():
     parser = argparse.ArgumentParser(description='英语听力MP3对话分段工具')
-    parser.add_argument('input_file', help='输入MP3文件路径')
+    parser.add_argument('inputs', nargs='+', metavar='input',
+                        help='输入MP3文件路径；给出多个文件、目录或通配符(如 "lessons/*.mp3")时进入批量模式')
     parser.add_argument('-o', '--output_dir', default='segments', help='输出目录，默认为segments')
     parser.add_argument('-m', '--min_silence', type=int, default=1000, help='最小静默长度(毫秒)，默认为1000ms')
     parser.add_argument('-t', '--silence_threshold', type=int, default=-40, help='静默阈值(分贝)，默认为-40dB')
+    parser.add_argument('--auto_threshold', action='store_true',
+                        help='自动阈值：按背景噪声自动确定各处的静默阈值，忽略 -t 参数')
+    parser.add_argument('--min_segment', type=int, default=DEFAULT_MIN_SEGMENT_MS,
+                        help=f'最短片段时长(毫秒)，更短的片段并入相邻片段，默认为{DEFAULT_MIN_SEGMENT_MS}ms')
+    parser.add_argument('--max_segment', type=int, default=DEFAULT_MAX_SEGMENT_MS,
+                        help=f'合并短片段后的最长片段时长(毫秒)，默认为{DEFAULT_MAX_SEGMENT_MS}ms，0表示不限制')
+    parser.add_argument('--streaming', action='store_true', help='流式模式：按块解码并检测，不把整个文件载入内存')
+    parser.add_argument('--block_ms', type=int, default=DEFAULT_BLOCK_MS, help=f'流式模式每块的时长(毫秒)，默认为{DEFAULT_BLOCK_MS}ms')
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS, help=f'并发导出片段的数量，默认为CPU核数({DEFAULT_WORKERS})')
+    parser.add_argument('--cache_mb', type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f'分析缓存的容量上限(MB)，默认为{DEFAULT_CACHE_SIZE_MB}MB，0表示不使用缓存')
+    parser.add_argument('--export_backend', choices=list(EXPORT_BACKENDS), default='pydub',
+                        help='导出方式：pydub逐段编码(默认)；ffmpeg由ffmpeg直接从源文件一次切出所有片段；'
+                             'copy在MP3帧边界上无损切分，不重新编码')
+    parser.add_argument('--full_rate', action='store_true',
+                        help='按原采样率把整个文件解码到内存再分析(默认只解码8kHz单声道PCM用于检测)')
+    parser.add_argument('--analysis_jobs', type=int, default=1,
+                        help='--full_rate 时分析响度使用的进程数，大于1时把长音频分片并行分析，默认为1')
+    parser.add_argument('--decode_jobs', type=int, default=DEFAULT_DECODE_JOBS,
+                        help=f'--full_rate 时解码MP3使用的ffmpeg进程数，默认为CPU核数({DEFAULT_DECODE_JOBS})，1表示整体解码')
+    parser.add_argument('--pydub_silence', action='store_true',
+                        help='按早期版本的方式用pydub逐毫秒检测静默(较慢)，片段边界与以前的版本一致；'
+                             '默认按10ms分帧检测，边界可能与以前略有不同')
+    parser.add_argument('-J', '--jobs', type=int, default=DEFAULT_JOBS,
+                        help=f'批量模式同时处理的文件数，默认为CPU核数({DEFAULT_JOBS})')
+    parser.add_argument('--force', action='store_true', help='批量模式下重新处理输出已是最新的文件')
     
     args = parser.parse_args()
     
-    logger.info(f"开始处理音频文件: {args.input_file}")
+    # 多个输入、目录或通配符时批量处理，每个文件输出到各自的子目录
+    if len(args.inputs) > 1 or any(os.path.isdir(path) or is_glob_pattern(path) for path in args.inputs):
+        summary = segment_batch(
+            args.inputs,
+            args.output_dir,
+            args.min_silence,
+            args.silence_threshold,
+            args.streaming,
+            args.block_ms,
+            args.workers,
+            args.export_backend,
+            args.cache_mb,
+            args.jobs,
+            args.force,
+            args.auto_threshold,
+            args.min_segment,
+            args.max_segment,
+            args.analysis_jobs,
+            args.decode_jobs,
+            args.full_rate,
+            args.pydub_silence
+        )
+        if summary['failed']:
+            logger.error(f"{summary['failed']} 个文件处理失败")
+        return
+    
+    input_file = args.inputs[0]
+    logger.info(f"开始处理音频文件: {input_file}")
     output_files = segment_audio(
-        args.input_file,
+        input_file,
         args.output_dir,
         args.min_silence,
-        args.silence_threshold
+        args.silence_threshold,
+        args.streaming,
+        args.block_ms,
+        args.workers,
+        args.export_backend,
+        args.cache_mb,
+        args.auto_threshold,
+        args.min_segment,
+        args.max_segment,
+        args.analysis_jobs,
+        args.decode_jobs,
+        args.full_rate,
+        args.pydub_silence
     )
     
     if output_files:
@@ -97,5 +527,17 @@ if __name__ == '__main__':
 # 3. 可选参数:
 #    -m 最小静默长度(毫秒)，默认为1000ms
 #    -t 静默阈值(分贝)，默认为-40dB
+#    --streaming 流式模式，处理很长的录音时内存占用不随文件长度增长
+#    --block_ms 流式模式每块的时长(毫秒)，默认为10000ms
+#    -j 并发导出片段的数量，默认为CPU核数
+#    --export_backend ffmpeg 由ffmpeg一次切出所有片段，不再逐段解码和编码
+#    --export_backend copy 无损复制MP3帧，不重新编码，切点在静默中点附近的帧边界
+#    --cache_mb 分析缓存的容量上限(MB)，同一个文件换参数重新分段时不再解码，0表示不使用缓存
+#    --pydub_silence 用pydub逐毫秒检测静默，片段边界与早期版本一致(默认按10ms分帧检测，边界可能略有不同)
+#    -J 批量模式同时处理的文件数，默认为CPU核数
+#    --force 批量模式下不跳过输出已是最新的文件
+# 4. 批量模式: 输入多个文件、目录或通配符，每个文件的片段保存在输出目录下以文件名命名的子目录中，
+#    输入文件和参数都没变的文件会被跳过，结束时输出每分钟处理的文件数和音频小时数
 # 示例:
-# python audio_segmenter.py english_listening.mp3 -o segments -m 800 -t -35
\ No newline at end of file
+# python audio_segmenter.py english_listening.mp3 -o segments -m 800 -t -35
+# python audio_segmenter.py lessons/ "extra/*.mp3" -o segments -J 4
\ No newline at end of file
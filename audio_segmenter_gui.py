@@ -3,9 +3,13 @@ import sys
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 import threading
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
 import logging
+from analysis_cache import AnalysisCache, load_envelope
+from audio_analysis import (DEFAULT_KEEP_SILENCE_MS, SegmentMerger, compute_file_envelope, envelope_segment_ranges,
+                            stream_segment_ranges)
+from audio_decoder import decode_range, probe_audio
+from segment_exporter import ExportTask, SegmentExporter, segment_output_path
+from segment_manifest import write_manifest
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,7 +19,7 @@ class AudioSegmenterGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("英语听力MP3对话分段工具")
-        self.root.geometry("500x500")
+        self.root.geometry("500x690")
         self.root.resizable(True, True)
 
         # 设置中文字体
@@ -50,7 +54,7 @@ class AudioSegmenterGUI:
         silence_frame = ttk.Frame(self.main_frame)
         silence_frame.pack(fill=tk.X, pady=(0, 10))
         ttk.Scale(silence_frame, from_=200, to=3000, variable=self.min_silence, orient=tk.HORIZONTAL,
-                  command=lambda v: self.min_silence_label.config(text=f"{int(float(v))}ms")).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+                  command=self.update_min_silence).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         self.min_silence_label = ttk.Label(silence_frame, text=f"{self.min_silence.get()}ms")
         self.min_silence_label.pack(side=tk.RIGHT, width=60)
 
@@ -60,10 +64,32 @@ class AudioSegmenterGUI:
         threshold_frame = ttk.Frame(self.main_frame)
         threshold_frame.pack(fill=tk.X, pady=(0, 10))
         ttk.Scale(threshold_frame, from_=-60, to=-10, variable=self.silence_threshold, orient=tk.HORIZONTAL,
-                  command=lambda v: self.threshold_label.config(text=f"{int(float(v))}dB")).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
+                  command=self.update_threshold).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         self.threshold_label = ttk.Label(threshold_frame, text=f"{self.silence_threshold.get()}dB")
         self.threshold_label.pack(side=tk.RIGHT, width=60)
 
+        # 自动阈值：按背景噪声自动确定静默阈值，不必反复调整上面的阈值
+        self.adaptive_threshold = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.main_frame, text="自动阈值（按背景噪声自动确定，忽略上面的静默阈值）",
+                        variable=self.adaptive_threshold,
+                        command=self.update_preview).pack(fill=tk.X, pady=(0, 10))
+
+        # 分段预览：拖动滑块时用内存中的响度曲线实时重新分段，不需要重新解码
+        self.envelope = None  # 响度曲线，每个输入文件只计算一次
+        self.envelope_file = ""  # envelope 对应的输入文件
+        self.envelope_loading = ""  # 正在后台分析的文件
+        self.analysis_cache = AnalysisCache()  # 分析过的文件重新打开或重新处理时不必再解码
+        self.preview_label = ttk.Label(self.main_frame, text="", anchor='w')
+        self.preview_label.pack(fill=tk.X, pady=(0, 5))
+        self.preview_list = tk.Listbox(self.main_frame, height=5)
+        self.preview_list.pack(fill=tk.X, pady=(0, 10))
+        self.input_file.trace_add('write', lambda *args: self.update_preview())
+        self.update_preview()
+
+        # 流式处理开关
+        self.streaming = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.main_frame, text="流式处理（按块解码，适合超长录音）", variable=self.streaming).pack(fill=tk.X, pady=(0, 10))
+
         # 进度条
         ttk.Label(self.main_frame, text="处理进度:", anchor='w').pack(fill=tk.X, pady=(0, 5))
         self.progress = ttk.Progressbar(self.main_frame, orient=tk.HORIZONTAL, length=100, mode='determinate')
@@ -99,6 +125,70 @@ class AudioSegmenterGUI:
             input_dir = os.path.dirname(filename)
             self.output_dir.set(os.path.join(input_dir, "segments"))
 
+    def update_min_silence(self, value):
+        """拖动最小静默长度滑块"""
+        self.min_silence_label.config(text=f"{int(float(value))}ms")
+        self.update_preview()
+
+    def update_threshold(self, value):
+        """拖动静默阈值滑块"""
+        self.threshold_label.config(text=f"{int(float(value))}dB")
+        self.update_preview()
+
+    def request_envelope(self, input_file):
+        """在后台计算输入文件的响度曲线，已经计算过或正在计算时不重复计算"""
+        if input_file in (self.envelope_file, self.envelope_loading) or not os.path.isfile(input_file):
+            return
+        self.envelope_loading = input_file
+
+        def worker():
+            try:
+                envelope = load_envelope(input_file, self.analysis_cache)
+            except Exception as e:
+                logger.error(f"分析音频失败: {str(e)}")
+                envelope = None
+            self.root.after(0, lambda: self.set_envelope(input_file, envelope))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def set_envelope(self, input_file, envelope):
+        """保存计算好的响度曲线并刷新预览"""
+        if self.envelope_loading == input_file:
+            self.envelope_loading = ""
+        self.envelope_file = input_file
+        self.envelope = envelope
+        self.update_preview()
+
+    def update_preview(self):
+        """按当前参数重新分段，显示片段数量和边界"""
+        input_file = self.input_file.get().strip()
+        self.preview_list.delete(0, tk.END)
+
+        if not input_file:
+            self.preview_label.config(text="分段预览：选择音频文件后显示")
+            return
+        if input_file != self.envelope_file:
+            self.request_envelope(input_file)
+            if input_file == self.envelope_loading:
+                self.preview_label.config(text="分段预览：正在分析音频...")
+            else:
+                self.preview_label.config(text="分段预览：文件不存在")
+            return
+        if self.envelope is None:
+            self.preview_label.config(text="分段预览：无法分析该音频文件")
+            return
+
+        ranges = envelope_segment_ranges(self.envelope, self.min_silence.get(), self.silence_threshold.get(),
+                                         keep_silence=DEFAULT_KEEP_SILENCE_MS,
+                                         adaptive_thresh=self.adaptive_threshold.get())
+        # 太短的片段并入相邻片段
+        merger = SegmentMerger()
+        ranges = merger.merge(ranges)
+        for i, (start, end) in enumerate(ranges):
+            self.preview_list.insert(tk.END, f"片段 {i+1}: {start/1000:.2f}秒 - {end/1000:.2f}秒 ({(end - start)/1000:.2f}秒)")
+        self.preview_label.config(text=f"分段预览：共 {len(ranges)} 个片段，合并 {merger.merged_count} 个、"
+                                       f"跳过 {merger.dropped_count} 个太短的片段")
+
     def browse_output_dir(self):
         directory = filedialog.askdirectory(title="选择输出目录")
         if directory:
@@ -121,6 +211,9 @@ class AudioSegmenterGUI:
         output_dir = self.output_dir.get()
         min_silence = self.min_silence.get()
         silence_threshold = self.silence_threshold.get()
+        adaptive_threshold = self.adaptive_threshold.get()
+        threshold_text = "自动" if adaptive_threshold else f"{silence_threshold}dB"
+        streaming = self.streaming.get()
 
         # 检查输入文件
         if not os.path.exists(input_file):
@@ -131,61 +224,122 @@ class AudioSegmenterGUI:
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
 
-        try:
-            # 加载音频文件
-            self.root.after(0, lambda: self.update_status(f"正在加载音频文件: {input_file}"))
-            audio = AudioSegment.from_mp3(input_file)
-            audio_length = len(audio)
-            self.root.after(0, lambda: self.update_status(f"音频加载完成，长度: {audio_length/1000:.2f}秒"))
+        # 预览时已经算好的响度曲线可以直接使用，其次读取分析缓存，都没有时才需要解码
+        envelope = self.envelope if self.envelope_file == input_file else None
+        if envelope is None:
+            envelope = self.analysis_cache.load(input_file)
+        if envelope is None and streaming:
+            self.segment_audio_streaming(input_file, output_dir, min_silence, silence_threshold, adaptive_threshold)
+            return
 
+        try:
             # 分割音频
-            self.root.after(0, lambda: self.update_status(f"开始分割音频，最小静默长度: {min_silence}ms，静默阈值: {silence_threshold}dB"))
+            self.root.after(0, lambda: self.update_status(f"开始分割音频，最小静默长度: {min_silence}ms，静默阈值: {threshold_text}"))
             self.root.after(0, lambda: self.update_progress(10))
 
-            segments = split_on_silence(
-                audio,
-                min_silence_len=min_silence,
-                silence_thresh=silence_threshold,
-                keep_silence=200
-            )
-
-            self.root.after(0, lambda: self.update_status(f"音频分割完成，共 {len(segments)} 个片段"))
+            # 只解码低采样率的单声道PCM计算响度
+            if envelope is None:
+                envelope = compute_file_envelope(input_file)
+                self.analysis_cache.store(input_file, envelope)
+            ranges = envelope_segment_ranges(envelope, min_silence, silence_threshold,
+                                             keep_silence=DEFAULT_KEEP_SILENCE_MS, adaptive_thresh=adaptive_threshold)
+            # 太短的片段并入相邻片段，只处理起止位置，不切分音频
+            merger = SegmentMerger()
+            ranges = merger.merge(ranges)
+
+            self.root.after(0, lambda: self.update_status(f"音频分割完成，共 {len(ranges)} 个片段"))
             self.root.after(0, lambda: self.update_progress(30))
 
             # 保存分段后的音频
             file_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_files = []
-            skipped_count = 0
-
-            for i, segment in enumerate(segments):
-                if self.cancel_flag:
-                    self.root.after(0, lambda: self.update_status("处理已取消"))
-                    self.root.after(0, lambda: self.update_progress(0))
-                    return
-
-                # 跳过太短的片段
-                if len(segment) < 1000:
-                    skipped_count += 1
-                    continue
-
-                output_file = os.path.join(output_dir, f"{file_name}_segment_{i+1:03d}.mp3")
-                segment.export(output_file, format="mp3")
-                output_files.append(output_file)
-
-                # 更新进度
-                progress = 30 + (i+1) * 70 / len(segments)
-                self.root.after(0, lambda p=progress: self.update_progress(p))
-                self.root.after(0, lambda i=i+1, f=output_file: self.update_status(f"已保存片段 {i} 到: {f}"))
-
-            self.root.after(0, lambda: self.update_status(f"跳过 {skipped_count} 个太短的片段"))
-            self.root.after(0, lambda: self.update_status(f"处理完成，共生成 {len(output_files)} 个音频片段，保存在: {output_dir}"))
-            self.root.after(0, lambda: self.update_progress(100))
-            self.root.after(0, lambda: messagebox.showinfo("完成", f"处理完成，共生成 {len(output_files)} 个音频片段！"))
+            tasks = [ExportTask(i+1, start, end, segment_output_path(output_dir, file_name, i+1))
+                     for i, (start, end) in enumerate(ranges)]
+            self.root.after(0, lambda: self.update_status(
+                f"合并 {merger.merged_count} 个、跳过 {merger.dropped_count} 个太短的片段"))
+
+            self.export_segments(
+                tasks,
+                lambda task: decode_range(input_file, task.start_ms, task.end_ms,
+                                          envelope.frame_rate, envelope.channels),
+                lambda done, total, task: 30 + done * 70 / total,
+                input_file,
+                output_dir,
+                lambda: envelope
+            )
 
         except Exception as e:
-            self.root.after(0, lambda: self.update_status(f"处理错误: {str(e)}"))
+            error = str(e)
+            self.root.after(0, lambda: self.update_status(f"处理错误: {error}"))
             self.root.after(0, lambda: self.update_progress(0))
-            self.root.after(0, lambda: messagebox.showerror("错误", f"处理时发生错误: {str(e)}"))
+            self.root.after(0, lambda: messagebox.showerror("错误", f"处理时发生错误: {error}"))
+
+    def segment_audio_streaming(self, input_file, output_dir, min_silence, silence_threshold, adaptive_threshold=False):
+        """流式分段：按块解码并检测静默，每确认一个片段就立即提交导出"""
+        try:
+            audio_info = probe_audio(input_file)
+            duration_ms = audio_info['duration_ms']
+            threshold_text = "自动" if adaptive_threshold else f"{silence_threshold}dB"
+            self.root.after(0, lambda: self.update_status(f"开始流式分割音频，长度: {duration_ms/1000:.2f}秒，最小静默长度: {min_silence}ms，静默阈值: {threshold_text}"))
+
+            file_name = os.path.splitext(os.path.basename(input_file))[0]
+            envelopes = []  # 解码结束后得到的响度曲线
+
+            def store_envelope(envelope):
+                envelopes.append(envelope)
+                self.analysis_cache.store(input_file, envelope)
+
+            def iter_tasks():
+                ranges = stream_segment_ranges(input_file, min_silence, silence_threshold,
+                                               keep_silence=DEFAULT_KEEP_SILENCE_MS, audio_info=audio_info,
+                                               envelope_callback=store_envelope,
+                                               adaptive_thresh=adaptive_threshold)
+                # 太短的片段并入相邻片段
+                for i, (start, end) in enumerate(SegmentMerger().iter_merge(ranges)):
+                    yield ExportTask(i+1, start, end, segment_output_path(output_dir, file_name, i+1))
+
+            # 片段总数事先未知，按已处理到的位置更新进度
+            self.export_segments(
+                iter_tasks(),
+                lambda task: decode_range(input_file, task.start_ms, task.end_ms,
+                                          audio_info['frame_rate'], audio_info['channels']),
+                lambda done, total, task: min(100, task.end_ms * 100 / duration_ms) if duration_ms else 0,
+                input_file,
+                output_dir,
+                lambda: envelopes[0] if envelopes else None
+            )
+
+        except Exception as e:
+            error = str(e)
+            self.root.after(0, lambda: self.update_status(f"处理错误: {error}"))
+            self.root.after(0, lambda: self.update_progress(0))
+            self.root.after(0, lambda: messagebox.showerror("错误", f"处理时发生错误: {error}"))
+
+    def export_segments(self, tasks, load_segment, progress_of, input_file, output_dir, get_envelope):
+        """
+        并发导出片段并写入片段清单
+
+        progress_of 根据(已完成数, 总数, 任务)给出进度条数值，
+        get_envelope 在导出结束后返回源文件的响度曲线(流式处理时解码结束才能得到)
+        """
+        finished_tasks = []
+
+        def progress_callback(done, total, task):
+            finished_tasks.append(task)
+            self.root.after(0, lambda p=progress_of(done, total, task): self.update_progress(p))
+            self.root.after(0, lambda i=task.index, f=task.output_file: self.update_status(f"已保存片段 {i} 到: {f}"))
+
+        exporter = SegmentExporter(load_segment)
+        output_files = exporter.export(tasks, progress_callback, cancel_check=lambda: self.cancel_flag)
+
+        if self.cancel_flag:
+            self.root.after(0, lambda: self.update_status("处理已取消"))
+            self.root.after(0, lambda: self.update_progress(0))
+            return
+
+        write_manifest(input_file, output_dir, finished_tasks, output_files, get_envelope())
+        self.root.after(0, lambda: self.update_status(f"处理完成，共生成 {len(output_files)} 个音频片段，保存在: {output_dir}"))
+        self.root.after(0, lambda: self.update_progress(100))
+        self.root.after(0, lambda: messagebox.showinfo("完成", f"处理完成，共生成 {len(output_files)} 个音频片段！"))
 
     def start_processing(self):
         """开始处理音频"""
@@ -223,7 +377,8 @@ if __name__ == "__main__":
 # 3. 功能:
 #    - 选择输入的MP3文件
 #    - 选择输出目录
-#    - 调整最小静默长度和静默阈值
+#    - 调整最小静默长度和静默阈值，实时预览分段结果
+#    - 流式处理超长录音(内存占用不随文件长度增长)
 #    - 查看处理进度和状态
 #    - 取消正在进行的处理
 # 4. 注意事项:
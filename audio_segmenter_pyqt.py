@@ -2,17 +2,26 @@ import sys
 import os
 import logging
 import threading
-from pydub import AudioSegment
 from pydub.silence import split_on_silence
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, QLineEdit, 
                             QFileDialog, QSlider, QProgressBar, QTextEdit, QVBoxLayout, 
                             QHBoxLayout, QWidget, QMessageBox, QFrame, QGroupBox, QStyleFactory, 
-                            QDialog, QMenu, QAction, QMenuBar, QSizePolicy, QListWidget, QListWidgetItem)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
+                            QDialog, QMenu, QAction, QMenuBar, QSizePolicy, QListWidget, QListWidgetItem,
+                            QCheckBox, QSpinBox, QComboBox)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QTime
 from PyQt5.QtGui import QIntValidator, QColor, QPalette, QFont
 
 # 导入音频播放器组件
 from audio_player import AudioPlayer
+# 导入静默检测引擎
+from audio_analysis import (DEFAULT_KEEP_SILENCE_MS, DEFAULT_MAX_SEGMENT_MS, DEFAULT_MIN_SEGMENT_MS,
+                            REFERENCE_LEVEL_MS, PeakPyramid, SegmentMerger, envelope_segment_ranges,
+                            stream_segment_ranges)
+from analysis_cache import DEFAULT_CACHE_SIZE_MB, AnalysisCache, load_envelope
+from audio_decoder import decode_range, probe_audio
+# 导入片段导出器
+from segment_exporter import DEFAULT_WORKERS, EXPORT_BACKENDS, ExportTask, create_exporter, segment_output_path
+from segment_manifest import load_manifests, write_manifest
 
 # 设置应用程序样式
 QApplication.setStyle(QStyleFactory.create('Fusion'))
@@ -46,10 +55,26 @@ class SettingsDialog(QDialog):
             self.output_dir = self.main_window.output_dir
             self.min_silence = self.main_window.min_silence
             self.silence_threshold = self.main_window.silence_threshold
+            self.adaptive_threshold = self.main_window.adaptive_threshold
+            self.early_export = self.main_window.early_export
+            self.min_segment_ms = self.main_window.min_segment_ms
+            self.max_segment_ms = self.main_window.max_segment_ms
+            self.export_workers = self.main_window.export_workers
+            self.export_backend = self.main_window.export_backend
+            self.analysis_cache_mb = self.main_window.analysis_cache_mb
+            self.virtual_segments = self.main_window.virtual_segments
         else:
             self.output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "segments")
             self.min_silence = 1000
             self.silence_threshold = -40
+            self.adaptive_threshold = False
+            self.early_export = False
+            self.min_segment_ms = DEFAULT_MIN_SEGMENT_MS
+            self.max_segment_ms = DEFAULT_MAX_SEGMENT_MS
+            self.export_workers = DEFAULT_WORKERS
+            self.export_backend = 'pydub'
+            self.analysis_cache_mb = DEFAULT_CACHE_SIZE_MB
+            self.virtual_segments = False
 
         # 创建布局
         self.main_layout = QVBoxLayout(self)
@@ -62,6 +87,9 @@ class SettingsDialog(QDialog):
         # 创建分段参数设置
         self.create_params_group()
 
+        # 创建处理方式设置
+        self.create_processing_group()
+
         # 创建按钮
         self.create_buttons()
 
@@ -239,8 +267,143 @@ class SettingsDialog(QDialog):
         threshold_layout.addWidget(self.threshold_slider)
         threshold_layout.addWidget(self.threshold_value_label)
 
+        # 自动阈值：按背景噪声自动确定各处的静默阈值
+        self.adaptive_checkbox = QCheckBox("自动阈值（按背景噪声自动确定，无需手动调整静默阈值）")
+        self.adaptive_checkbox.setChecked(self.adaptive_threshold)
+        self.adaptive_checkbox.toggled.connect(self.update_adaptive_value)
+        self.threshold_slider.setEnabled(not self.adaptive_threshold)
+
+        # 快速开始：阈值只参考开头一分钟的响度，分析完开头就开始导出；默认参考整个文件的平均响度
+        self.early_export_checkbox = QCheckBox("快速开始（以开头一分钟的平均响度为阈值参考，边分析边导出）")
+        self.early_export_checkbox.setChecked(self.early_export)
+        self.early_export_checkbox.setToolTip("默认以整个文件的平均响度为参考，分析结束后才开始导出")
+        self.early_export_checkbox.toggled.connect(self.update_early_export_value)
+
+        # 片段时长：短于最短时长的片段并入相邻片段，合并后不超过最长时长
+        duration_layout = QHBoxLayout()
+        self.duration_label = QLabel("片段时长 (毫秒):")
+        self.duration_label.setFixedWidth(140)
+        self.min_segment_spinbox = QSpinBox()
+        self.min_segment_spinbox.setRange(0, 10000)
+        self.min_segment_spinbox.setSingleStep(100)
+        self.min_segment_spinbox.setValue(self.min_segment_ms)
+        self.min_segment_spinbox.setToolTip("短于该时长的片段并入间隔较近的相邻片段，无法合并时跳过")
+        self.min_segment_spinbox.valueChanged.connect(self.update_min_segment_value)
+        self.max_segment_spinbox = QSpinBox()
+        self.max_segment_spinbox.setRange(0, 600000)
+        self.max_segment_spinbox.setSingleStep(1000)
+        self.max_segment_spinbox.setValue(self.max_segment_ms)
+        self.max_segment_spinbox.setToolTip("合并短片段后片段不超过该时长；0表示不限制")
+        self.max_segment_spinbox.valueChanged.connect(self.update_max_segment_value)
+
+        duration_layout.addWidget(self.duration_label)
+        duration_layout.addWidget(self.min_segment_spinbox)
+        duration_layout.addWidget(QLabel("至"))
+        duration_layout.addWidget(self.max_segment_spinbox)
+        duration_layout.addStretch(1)
+
+        # 分段预览：拖动滑块时实时显示分段结果
+        self.preview_label = QLabel()
+        self.preview_label.setWordWrap(True)
+        self.preview_list = QListWidget()
+        self.preview_list.setFixedHeight(110)
+        self.preview_list.setStyleSheet(f"""
+            QListWidget {{
+                border: 1px solid {self.main_window.border_color.name()};
+                border-radius: 6px;
+                background-color: white;
+                color: {self.main_window.text_color.name()};
+                font-size: 9pt;
+                font-weight: normal;
+            }}
+        """)
+
         layout.addLayout(silence_layout)
         layout.addLayout(threshold_layout)
+        layout.addWidget(self.adaptive_checkbox)
+        layout.addWidget(self.early_export_checkbox)
+        layout.addLayout(duration_layout)
+        layout.addWidget(self.preview_label)
+        layout.addWidget(self.preview_list)
+        group.setLayout(layout)
+        self.main_layout.addWidget(group)
+
+    def create_processing_group(self):
+        """创建处理方式设置组"""
+        group = QGroupBox("处理方式")
+        group.setStyleSheet(f"""
+            QGroupBox {{
+                font-weight: bold;
+                font-size: 11pt;
+                color: {self.main_window.text_color.name()};
+                border: 1px solid {self.main_window.border_color.name()};
+                border-radius: 8px;
+                margin-top: 12px;
+                padding: 15px;
+                background-color: white;
+            }}
+            QGroupBox::title {{
+                subcontrol-origin: margin;
+                left: 15px;
+                padding: 0 5px 0 5px;
+            }}
+        """)
+
+        layout = QVBoxLayout()
+
+        # 虚拟片段
+        self.virtual_checkbox = QCheckBox("虚拟片段（只生成分段列表，直接在原文件中播放，需要时再导出文件）")
+        self.virtual_checkbox.setChecked(self.virtual_segments)
+        self.virtual_checkbox.toggled.connect(self.update_virtual_value)
+
+        # 并发导出数量
+        workers_layout = QHBoxLayout()
+        self.workers_label = QLabel("并发导出数量:")
+        self.workers_label.setFixedWidth(140)
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(32, DEFAULT_WORKERS))
+        self.workers_spinbox.setValue(self.export_workers)
+        self.workers_spinbox.setToolTip("同时编码的片段数，建议不超过CPU核数")
+        self.workers_spinbox.valueChanged.connect(self.update_workers_value)
+
+        workers_layout.addWidget(self.workers_label)
+        workers_layout.addWidget(self.workers_spinbox)
+        workers_layout.addStretch(1)
+
+        # 导出方式
+        backend_layout = QHBoxLayout()
+        self.backend_label = QLabel("导出方式:")
+        self.backend_label.setFixedWidth(140)
+        self.backend_combo = QComboBox()
+        for backend, description in EXPORT_BACKENDS.items():
+            self.backend_combo.addItem(description, backend)
+        self.backend_combo.setCurrentIndex(max(0, self.backend_combo.findData(self.export_backend)))
+        self.backend_combo.setToolTip("单次ffmpeg切分：由ffmpeg直接从源文件切出所有片段，片段很多时明显更快\n"
+                                      "无损复制：直接复制MP3帧，不重新编码，没有音质损失")
+        self.backend_combo.currentIndexChanged.connect(self.update_backend_value)
+
+        backend_layout.addWidget(self.backend_label)
+        backend_layout.addWidget(self.backend_combo)
+        backend_layout.addStretch(1)
+
+        # 分析缓存上限
+        cache_layout = QHBoxLayout()
+        self.cache_label = QLabel("分析缓存上限(MB):")
+        self.cache_label.setFixedWidth(140)
+        self.cache_spinbox = QSpinBox()
+        self.cache_spinbox.setRange(0, 10000)
+        self.cache_spinbox.setValue(self.analysis_cache_mb)
+        self.cache_spinbox.setToolTip("缓存分析过的文件的响度曲线，调整参数后重新分段不必再解码；0表示不使用缓存")
+        self.cache_spinbox.valueChanged.connect(self.update_cache_value)
+
+        cache_layout.addWidget(self.cache_label)
+        cache_layout.addWidget(self.cache_spinbox)
+        cache_layout.addStretch(1)
+
+        layout.addWidget(self.virtual_checkbox)
+        layout.addLayout(workers_layout)
+        layout.addLayout(backend_layout)
+        layout.addLayout(cache_layout)
         group.setLayout(layout)
         self.main_layout.addWidget(group)
 
@@ -249,12 +412,105 @@ class SettingsDialog(QDialog):
         value = self.silence_slider.value()
         self.silence_value_label.setText(f"{value}ms")
         self.min_silence = value
+        self.update_preview()
 
     def update_threshold_value(self):
         """更新静默阈值"""
         value = self.threshold_slider.value()
         self.threshold_value_label.setText(f"{value}dB")
         self.silence_threshold = value
+        self.update_preview()
+
+    def update_adaptive_value(self, checked):
+        """更新自动阈值开关，开启时静默阈值滑块不起作用"""
+        self.adaptive_threshold = checked
+        self.threshold_slider.setEnabled(not checked)
+        self.update_preview()
+
+    def update_early_export_value(self, checked):
+        """更新快速开始开关，阈值的参考响度改变，需要重新预览"""
+        self.early_export = checked
+        self.update_preview()
+
+    def update_min_segment_value(self, value):
+        """更新最短片段时长"""
+        self.min_segment_ms = value
+        self.update_preview()
+
+    def update_max_segment_value(self, value):
+        """更新最长片段时长"""
+        self.max_segment_ms = value
+        self.update_preview()
+
+    def preview_file(self):
+        """预览使用的输入文件：主窗口输入框中的路径"""
+        return self.main_window.input_lineedit.text().strip() or self.main_window.input_file
+
+    def showEvent(self, event):
+        """显示对话框时开始计算响度曲线，计算完成后刷新预览"""
+        super().showEvent(event)
+        if not getattr(self, 'preview_connected', False):
+            self.main_window.envelope_ready.connect(self.update_preview)
+            self.preview_connected = True
+        self.main_window.request_envelope(self.preview_file())
+        self.update_preview()
+
+    def done(self, result):
+        """关闭对话框时断开预览信号"""
+        if getattr(self, 'preview_connected', False):
+            self.main_window.envelope_ready.disconnect(self.update_preview)
+            self.preview_connected = False
+        super().done(result)
+
+    def update_preview(self):
+        """用内存中的响度曲线按当前参数重新分段，显示片段数量和边界，不需要重新解码"""
+        if not hasattr(self, 'preview_list'):
+            return
+
+        input_file = self.preview_file()
+        envelope = self.main_window.envelope if self.main_window.envelope_file == input_file else None
+        self.preview_list.clear()
+
+        if not input_file:
+            self.preview_label.setText("选择音频文件后，这里会实时预览分段结果")
+            return
+        if envelope is None:
+            if self.main_window.envelope_file == input_file:
+                self.preview_label.setText("无法分析该音频文件，预览不可用")
+            else:
+                self.preview_label.setText("正在分析音频，完成后显示分段预览...")
+            return
+
+        ranges = ProcessingThread.plan_segments(envelope, self.min_silence, self.silence_threshold,
+                                                self.adaptive_threshold,
+                                                reference_ms=REFERENCE_LEVEL_MS if self.early_export else None)
+        merger = SegmentMerger(self.min_segment_ms, self.max_segment_ms)
+        ranges = merger.merge(ranges)
+        items = []
+        for i, (start, end) in enumerate(ranges):
+            start_text = QTime(0, 0).addMSecs(start).toString("mm:ss.zzz")
+            end_text = QTime(0, 0).addMSecs(end).toString("mm:ss.zzz")
+            items.append(f"片段 {i+1}: {start_text} - {end_text} ({(end - start)/1000:.2f}秒)")
+
+        self.preview_label.setText(f"预览：共 {len(items)} 个片段，合并 {merger.merged_count} 个、"
+                                   f"跳过 {merger.dropped_count} 个太短的片段")
+        self.preview_list.addItems(items)
+
+    def update_virtual_value(self, checked):
+        """更新虚拟片段开关"""
+        self.virtual_segments = checked
+
+    def update_workers_value(self, value):
+        """更新并发导出数量"""
+        self.export_workers = value
+
+    def update_backend_value(self, index):
+        """更新导出方式"""
+        self.export_backend = self.backend_combo.itemData(index)
+
+    def update_cache_value(self, value):
+        """更新分析缓存上限"""
+        self.analysis_cache_mb = value
 
     def browse_output_dir(self):
         """浏览输出目录"""
@@ -366,11 +622,27 @@ class SettingsDialog(QDialog):
             default_output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "segments")
             default_min_silence = 1000
             default_silence_threshold = -40
+            default_adaptive_threshold = False
+            default_early_export = False
+            default_min_segment_ms = DEFAULT_MIN_SEGMENT_MS
+            default_max_segment_ms = DEFAULT_MAX_SEGMENT_MS
+            default_export_workers = DEFAULT_WORKERS
+            default_export_backend = 'pydub'
+            default_analysis_cache_mb = DEFAULT_CACHE_SIZE_MB
+            default_virtual_segments = False
 
             # 恢复默认设置
             self.output_dir = default_output_dir
             self.min_silence = default_min_silence
             self.silence_threshold = default_silence_threshold
+            self.adaptive_threshold = default_adaptive_threshold
+            self.early_export = default_early_export
+            self.min_segment_ms = default_min_segment_ms
+            self.max_segment_ms = default_max_segment_ms
+            self.export_workers = default_export_workers
+            self.export_backend = default_export_backend
+            self.analysis_cache_mb = default_analysis_cache_mb
+            self.virtual_segments = default_virtual_segments
 
             # 更新界面
             self.output_lineedit.setText(self.output_dir)
@@ -378,12 +650,28 @@ class SettingsDialog(QDialog):
             self.silence_value_label.setText(f"{self.min_silence}ms")
             self.threshold_slider.setValue(self.silence_threshold)
             self.threshold_value_label.setText(f"{self.silence_threshold}dB")
+            self.adaptive_checkbox.setChecked(self.adaptive_threshold)
+            self.early_export_checkbox.setChecked(self.early_export)
+            self.min_segment_spinbox.setValue(self.min_segment_ms)
+            self.max_segment_spinbox.setValue(self.max_segment_ms)
+            self.workers_spinbox.setValue(self.export_workers)
+            self.backend_combo.setCurrentIndex(self.backend_combo.findData(self.export_backend))
+            self.cache_spinbox.setValue(self.analysis_cache_mb)
+            self.virtual_checkbox.setChecked(self.virtual_segments)
 
             # 通知主窗口更新设置，但不自动保存
             if self.main_window:
                 self.main_window.output_dir = self.output_dir
                 self.main_window.min_silence = self.min_silence
                 self.main_window.silence_threshold = self.silence_threshold
+                self.main_window.adaptive_threshold = self.adaptive_threshold
+                self.main_window.early_export = self.early_export
+                self.main_window.min_segment_ms = self.min_segment_ms
+                self.main_window.max_segment_ms = self.max_segment_ms
+                self.main_window.export_workers = self.export_workers
+                self.main_window.export_backend = self.export_backend
+                self.main_window.analysis_cache_mb = self.analysis_cache_mb
+                self.main_window.virtual_segments = self.virtual_segments
                 logger.info(f"恢复默认设置: output_dir={self.output_dir}, min_silence={self.min_silence}, silence_threshold={self.silence_threshold}")
 
     def save_settings(self):
@@ -411,6 +699,14 @@ class SettingsDialog(QDialog):
             self.main_window.output_dir = self.output_dir
             self.main_window.min_silence = self.min_silence
             self.main_window.silence_threshold = self.silence_threshold
+            self.main_window.adaptive_threshold = self.adaptive_threshold
+            self.main_window.early_export = self.early_export
+            self.main_window.min_segment_ms = self.min_segment_ms
+            self.main_window.max_segment_ms = self.max_segment_ms
+            self.main_window.export_workers = self.export_workers
+            self.main_window.export_backend = self.export_backend
+            self.main_window.analysis_cache_mb = self.analysis_cache_mb
+            self.main_window.virtual_segments = self.virtual_segments
             self.main_window.output_lineedit.setText(self.output_dir)
             self.main_window.save_config()
 
@@ -421,188 +717,311 @@ class ProcessingThread(QThread):
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
     processing_finished = pyqtSignal(bool, str, list)  # 添加文件列表参数
-
-    def __init__(self, input_file, output_dir, min_silence, silence_threshold):
+    envelope_ready = pyqtSignal(str, object)  # 输入文件的响度曲线，供设置对话框预览
+    segments_planned = pyqtSignal(list)  # 虚拟片段模式下的片段列表(ExportTask)
+    segment_ready = pyqtSignal(object)  # 按序号顺序发出已经导出的片段(ExportTask)，列表边处理边显示
+
+    def __init__(self, input_file, output_dir, min_silence, silence_threshold,
+                 workers=DEFAULT_WORKERS, export_backend='pydub', cache_size_mb=DEFAULT_CACHE_SIZE_MB,
+                 virtual_segments=False, planned_tasks=None, adaptive_threshold=False,
+                 min_segment_ms=DEFAULT_MIN_SEGMENT_MS, max_segment_ms=DEFAULT_MAX_SEGMENT_MS, early_export=False):
+        """
+        virtual_segments 为True时只求出片段列表，不写入片段文件；
+        planned_tasks 不为None时不再分析，直接导出这些已经确定的片段；
+        adaptive_threshold 为True时忽略 silence_threshold，按背景噪声自动确定阈值；
+        短于 min_segment_ms 的片段并入相邻片段，合并后不超过 max_segment_ms；
+        early_export 为True时阈值相对开头 REFERENCE_LEVEL_MS 毫秒的平均响度，分析完这一段就开始导出，
+        否则相对整个文件的平均响度，分析结束后再导出
+        """
         super().__init__()
         self.input_file = input_file
         self.output_dir = output_dir
         self.min_silence = min_silence
         self.silence_threshold = silence_threshold
+        self.adaptive_threshold = adaptive_threshold
+        self.early_export = early_export
+        self.min_segment_ms = min_segment_ms
+        self.max_segment_ms = max_segment_ms
+        self.workers = workers
+        self.export_backend = export_backend
+        self.cache_size_mb = cache_size_mb
+        self.virtual_segments = virtual_segments
+        self.planned_tasks = planned_tasks
         self.cancel_flag = False
+        self.envelope = None  # 输入文件的响度曲线，用于在片段清单中记录电平
+        self.progress = 0  # 分析和导出汇报过的最大进度
+
+    def report_progress(self, progress):
+        """汇报进度；边分析边导出时两者都在汇报，进度条不后退"""
+        if progress > self.progress:
+            self.progress = progress
+            self.progress_updated.emit(progress)
+
+    def publish_envelope(self, envelope):
+        """记录响度曲线，并通知主窗口(设置对话框的预览使用)"""
+        self.envelope = envelope
+        self.envelope_ready.emit(self.input_file, envelope)
 
     def run(self):
         try:
             # 检查输入文件
             if not os.path.exists(self.input_file):
                 self.status_updated.emit(f"错误: 文件不存在: {self.input_file}")
-                self.processing_finished.emit(False, "文件不存在")
+                self.processing_finished.emit(False, "文件不存在", [])
                 return
 
-            # 创建输出目录
-            os.makedirs(self.output_dir, exist_ok=True)
-
-            # 加载音频文件
-            self.status_updated.emit(f"正在加载音频文件: {self.input_file}")
-            audio = AudioSegment.from_mp3(self.input_file)
-            audio_length = len(audio)
-            self.status_updated.emit(f"音频加载完成，长度: {audio_length/1000:.2f}秒")
-
-            # 分割音频
-            self.status_updated.emit(f"开始分割音频，最小静默长度: {self.min_silence}ms，静默阈值: {self.silence_threshold}dB")
-            self.progress_updated.emit(10)
+            # 创建输出目录，虚拟片段模式不写入文件
+            if not self.virtual_segments:
+                os.makedirs(self.output_dir, exist_ok=True)
 
-            # 为split_on_silence添加进度更新和取消检查
-            self.status_updated.emit("正在分析音频波形...")
-            
-            # 分割音频时更新进度的替代方案
-            # 先获取总长度
-            audio_length = len(audio)
-            
-            # 创建一个临时的进度更新函数
-            def progress_callback(progress):
-                # 将0-1的进度映射到10-30%的UI进度
-                ui_progress = 10 + int(progress * 20)
-                self.progress_updated.emit(ui_progress)
-                
-                # 检查是否取消
-                if self.cancel_flag:
-                    raise Exception("处理已取消")
-            
-            try:
-                # 使用带进度的分割函数
-                segments = ProcessingThread.split_on_silence_with_progress(
-                    audio,
-                    min_silence_len=self.min_silence,
-                    silence_thresh=self.silence_threshold,
-                    keep_silence=200,
-                    progress_callback=progress_callback
-                )
-            except Exception as e:
-                if str(e) == "处理已取消":
-                    self.status_updated.emit("处理已取消")
-                    self.progress_updated.emit(0)
-                    self.processing_finished.emit(False, "处理已取消")
-                    return
-                else:
-                    raise e
-            
-            self.status_updated.emit(f"音频分割完成，共 {len(segments)} 个片段")
-            self.progress_updated.emit(30)
-
-            # 保存分段后的音频
-            file_name = os.path.splitext(os.path.basename(self.input_file))[0]
-            output_files = []
-            skipped_count = 0
-
-            for i, segment in enumerate(segments):
-                if self.cancel_flag:
-                    self.status_updated.emit("处理已取消")
-                    self.progress_updated.emit(0)
-                    self.processing_finished.emit(False, "处理已取消")
-                    return
-
-                # 跳过太短的片段
-                if len(segment) < 1000:
-                    skipped_count += 1
-                    continue
-
-                # 记录片段时长
-                segment_duration = len(segment)
-                self.status_updated.emit(f"片段 {i+1} 时长: {segment_duration/1000:.2f}秒")
-
-                output_file = os.path.join(self.output_dir, f"{file_name}_segment_{i+1:03d}.mp3")
-                segment.export(output_file, format="mp3")
-                output_files.append(output_file)
-
-                # 更新进度
-                progress = 30 + (i+1) * 70 / len(segments)
-                self.progress_updated.emit(int(progress))
-                self.status_updated.emit(f"已保存片段 {i+1} 到: {output_file}")
-
-            self.status_updated.emit(f"跳过 {skipped_count} 个太短的片段")
-            self.status_updated.emit(f"处理完成，共生成 {len(output_files)} 个音频片段，保存在: {self.output_dir}")
-            self.progress_updated.emit(100)
-            self.processing_finished.emit(True, "处理完成，共生成 {} 个音频片段！".format(len(output_files)), output_files)
+            # 同一个文件分析过就直接用缓存的响度曲线，不再解码
+            cache = AnalysisCache(max_size_mb=self.cache_size_mb) if self.cache_size_mb > 0 else None
+            envelope = cache.load(self.input_file) if cache else None
+            if self.planned_tasks is not None:
+                self.run_planned(envelope)
+                return
+            if envelope is not None:
+                self.publish_envelope(envelope)
+                self.run_cached(envelope)
+                return
 
+            # 没有缓存时边分析边导出
+            self.run_pipeline(cache)
         except Exception as e:
             self.status_updated.emit(f"处理错误: {str(e)}")
             self.progress_updated.emit(0)
             self.processing_finished.emit(False, f"处理时发生错误: {str(e)}", [])
  
+    def run_planned(self, envelope=None):
+        """导出虚拟片段模式下已经确定的片段，不再重新分析"""
+        if envelope is not None:
+            self.publish_envelope(envelope)
+            frame_rate, channels = envelope.frame_rate, envelope.channels
+        else:
+            audio_info = probe_audio(self.input_file)
+            frame_rate, channels = audio_info['frame_rate'], audio_info['channels']
+        self.progress_updated.emit(30)
+        self.export_tasks(
+            self.planned_tasks,
+            lambda task: decode_range(self.input_file, task.start_ms, task.end_ms, frame_rate, channels)
+        )
+
+    def run_cached(self, envelope):
+        """命中分析缓存：只按当前参数重新分段，不再解码整个文件"""
+        self.status_updated.emit(f"使用缓存的分析结果，音频长度: {envelope.duration_ms/1000:.2f}秒，"
+                                 f"最小静默长度: {self.min_silence}ms，静默阈值: {self.threshold_text()}")
+        ranges = ProcessingThread.plan_segments(envelope, self.min_silence, self.silence_threshold,
+                                                self.adaptive_threshold, reference_ms=self.reference_ms())
+        self.status_updated.emit(f"音频分割完成，共 {len(ranges)} 个片段")
+        self.progress_updated.emit(30)
+
+        # 每个片段只解码自己的时间范围
+        self.export_segments(
+            ranges,
+            lambda task: decode_range(self.input_file, task.start_ms, task.end_ms,
+                                      envelope.frame_rate, envelope.channels)
+        )
+
+    def run_pipeline(self, cache=None):
+        """
+        分析与导出流水线：按块解码低采样率的PCM并检测静默，每确认一个片段就交给导出线程池，
+        检测继续进行，不把整个文件载入内存
+        """
+        self.status_updated.emit(f"正在读取音频信息: {self.input_file}")
+        audio_info = probe_audio(self.input_file)
+        self.status_updated.emit(f"音频长度: {audio_info['duration_ms']/1000:.2f}秒，开始分析，"
+                                 f"最小静默长度: {self.min_silence}ms，静默阈值: {self.threshold_text()}")
+        self.report_progress(10)
+
+        def store_envelope(envelope):
+            if cache:
+                cache.store(self.input_file, envelope)
+            self.publish_envelope(envelope)
+
+        def progress_callback(progress):
+            # 将0-1的进度映射到10-30%的UI进度
+            self.report_progress(10 + int(progress * 20))
+
+            # 检查是否取消
+            if self.cancel_flag:
+                raise Exception("处理已取消")
+
+        # 检测是生产者，导出线程池是消费者。快速开始时阈值相对开头一分钟的平均响度，读完这一段就能确定，
+        # 之后的片段边检测边导出；默认阈值相对整个文件的平均响度，自动阈值要用到前后的背景噪声，
+        # 这两种情况下片段在分析结束时一起产出
+        ranges = stream_segment_ranges(
+            self.input_file,
+            self.min_silence,
+            self.silence_threshold,
+            relative_thresh=True,
+            keep_silence=DEFAULT_KEEP_SILENCE_MS,
+            audio_info=audio_info,
+            progress_callback=progress_callback,
+            envelope_callback=store_envelope,
+            adaptive_thresh=self.adaptive_threshold,
+            reference_ms=self.reference_ms()
+        )
+        load_segment = lambda task: decode_range(self.input_file, task.start_ms, task.end_ms,
+                                                 audio_info['frame_rate'], audio_info['channels'])
+
+        try:
+            if not self.virtual_segments:
+                self.export_tasks(self.iter_tasks(ranges), load_segment, audio_info['duration_ms'])
+                return
+            ranges = list(ranges)
+        except Exception as e:
+            if str(e) == "处理已取消":
+                self.status_updated.emit("处理已取消")
+                self.progress_updated.emit(0)
+                self.processing_finished.emit(False, "处理已取消", [])
+                return
+            else:
+                raise e
+
+        self.status_updated.emit(f"音频分割完成，共 {len(ranges)} 个片段")
+        self.progress_updated.emit(30)
+
+        # 每个片段只解码自己的时间范围
+        self.export_segments(ranges, load_segment)
+
+    def iter_tasks(self, ranges):
+        """把逐个确认的片段区间合并太短的片段后依次产出导出任务"""
+        merger = SegmentMerger(self.min_segment_ms, self.max_segment_ms)
+        file_name = os.path.splitext(os.path.basename(self.input_file))[0]
+        for i, (start, end) in enumerate(merger.iter_merge(ranges)):
+            yield ExportTask(i+1, start, end, segment_output_path(self.output_dir, file_name, i+1))
+        self.report_progress(30)
+        self.status_updated.emit(f"音频分割完成，合并 {merger.merged_count} 个、跳过 {merger.dropped_count} 个太短的片段")
+
+    def export_segments(self, ranges, load_segment):
+        """由片段区间生成导出任务并导出；虚拟片段模式下只发出片段列表，不写入文件"""
+        # 太短的片段并入相邻片段，只处理起止位置，不切分音频
+        merger = SegmentMerger(self.min_segment_ms, self.max_segment_ms)
+        ranges = merger.merge(ranges)
+        file_name = os.path.splitext(os.path.basename(self.input_file))[0]
+        tasks = [ExportTask(i+1, start, end, segment_output_path(self.output_dir, file_name, i+1))
+                 for i, (start, end) in enumerate(ranges)]
+        self.status_updated.emit(f"合并 {merger.merged_count} 个、跳过 {merger.dropped_count} 个太短的片段")
+
+        if self.virtual_segments:
+            self.segments_planned.emit(tasks)
+            self.status_updated.emit(f"已生成 {len(tasks)} 个片段的列表，没有写入文件，需要时可点击「导出片段」")
+            self.progress_updated.emit(100)
+            self.processing_finished.emit(True, "已生成 {} 个虚拟片段！".format(len(tasks)), [])
+            return
+
+        self.export_tasks(tasks, load_segment)
+
+    def export_tasks(self, tasks, load_segment, duration_ms=None):
+        """
+        并发导出片段并汇报进度，可通过cancel()中止
+
+        tasks 可以是逐个产出任务的生成器，导出与检测同时进行；总数未知时按片段结束位置
+        占音频时长 duration_ms 的比例汇报进度。导出完成的片段按序号顺序通过 segment_ready
+        发出，前面的片段不必等全部导出完就可以播放。
+        """
+        submitted = []  # 已经交给导出线程池的任务，用于写入片段清单
+        finished = {}  # 已导出但前面还有片段没导出完的任务，序号 -> ExportTask
+        next_index = min((task.index for task in tasks), default=1) if isinstance(tasks, list) else 1
+
+        def publish_finished(flush=False):
+            nonlocal next_index
+            while finished and (flush or next_index in finished):
+                next_index = next_index if next_index in finished else min(finished)
+                self.segment_ready.emit(finished.pop(next_index))
+                next_index += 1
+
+        def progress_callback(done, total, task):
+            # 将导出进度映射到30-100%的UI进度
+            if total:
+                progress = done / total
+            else:
+                progress = min(1.0, task.end_ms / duration_ms) if duration_ms else 0.0
+            self.report_progress(int(30 + progress * 70))
+            self.status_updated.emit(f"已保存片段 {task.index} ({(task.end_ms - task.start_ms)/1000:.2f}秒) 到: {task.output_file}")
+            finished[task.index] = task
+            publish_finished()
+
+        def iter_submitted():
+            for task in tasks:
+                submitted.append(task)
+                yield task
+
+        if isinstance(tasks, list):
+            submitted = tasks
+            self.status_updated.emit(f"正在导出 {len(tasks)} 个片段，并发数: {self.workers}")
+        else:
+            self.status_updated.emit(f"检测到片段后立即导出，并发数: {self.workers}")
+        exporter = create_exporter(self.export_backend, self.input_file, load_segment, self.workers)
+        output_files = exporter.export(tasks if isinstance(tasks, list) else iter_submitted(), progress_callback,
+                                       cancel_check=lambda: self.cancel_flag)
+        # 被跳过的片段(例如超出音频末尾)之后的片段也要发出
+        publish_finished(flush=True)
+        tasks = submitted
+
+        if self.cancel_flag:
+            self.status_updated.emit("处理已取消")
+            self.progress_updated.emit(0)
+            self.processing_finished.emit(False, "处理已取消", [])
+            return
+
+        # 记录每个片段的时长等信息，播放器直接读取，不必再逐个读取文件
+        write_manifest(self.input_file, self.output_dir, tasks, output_files, self.envelope)
+
+        self.status_updated.emit(f"处理完成，共生成 {len(output_files)} 个音频片段，保存在: {self.output_dir}")
+        self.progress_updated.emit(100)
+        self.processing_finished.emit(True, "处理完成，共生成 {} 个音频片段！".format(len(output_files)), output_files)
+
     def cancel(self):
         """取消处理"""
         self.cancel_flag = True
         
+    def threshold_text(self):
+        """状态信息中显示的静默阈值"""
+        return "自动(按背景噪声)" if self.adaptive_threshold else f"{self.silence_threshold}dB"
+
+    def reference_ms(self):
+        """相对阈值参考开头多少毫秒的平均响度，None表示参考整个文件"""
+        return REFERENCE_LEVEL_MS if self.early_export else None
+
     @staticmethod
-    def split_on_silence_with_progress(audio, min_silence_len, silence_thresh, keep_silence, progress_callback):
-        """带进度更新的split_on_silence实现"""
-        # 基于pydub的split_on_silence实现，但添加了进度更新
-        
-        # 转换为dBFS
-        silence_thresh = audio.dBFS + silence_thresh
-        
-        # 找出所有静默部分
-        silent_ranges = []
-        
-        # 音频帧数据
-        frame_length = 10
-        audio_frame = list(audio[::frame_length])  # 确保转换为列表
-        
-        # 总帧数
-        total_frames = len(audio_frame)
-        
-        # 当前是否在静默中
-        in_silence = False
-        silence_start = 0
-        
-        for i, frame in enumerate(audio_frame):
-            # 更新进度
-            if i % 100 == 0:  # 每100帧更新一次进度
-                progress = i / total_frames
-                progress_callback(progress)
-                
-            # 检查是否在静默中
-            if frame.dBFS <= silence_thresh:
-                if not in_silence:
-                    in_silence = True
-                    silence_start = i * frame_length
-            else:
-                if in_silence:
-                    in_silence = False
-                    silence_end = i * frame_length
-                    
-                    # 检查静默长度是否足够
-                    if silence_end - silence_start >= min_silence_len:
-                        silent_ranges.append((silence_start, silence_end))
-        
-        # 处理结尾的静默
-        if in_silence:
-            silence_end = len(audio)
-            if silence_end - silence_start >= min_silence_len:
-                silent_ranges.append((silence_start, silence_end))
-        
-        # 根据静默范围分割音频
-        segments = []
-        last_end = 0
-        
-        for start, end in silent_ranges:
-            # 添加静默前的音频段
-            if start - last_end > 0:
-                segments.append(audio[last_end:start])
-            
-            last_end = end
-        
-        # 添加最后一段
-        if last_end < len(audio):
-            segments.append(audio[last_end:])
-        
-        return segments
+    def plan_segments(envelope, min_silence_len, silence_thresh, adaptive_thresh=False,
+                      keep_silence=DEFAULT_KEEP_SILENCE_MS, reference_ms=None):
+        """
+        根据响度曲线求出片段区间 [(start_ms, end_ms), ...]，阈值是相对整个文件平均响度的偏移；
+        reference_ms 不为None时相对开头 reference_ms 毫秒的平均响度，与快速开始时边分析边导出的结果相同；
+        adaptive_thresh 为True时按背景噪声自动确定阈值。
+        片段前后保留 keep_silence 毫秒的静默，只调整区间的边界，不复制音频数据
+        """
+        return envelope_segment_ranges(envelope, min_silence_len, silence_thresh, relative_thresh=True,
+                                       keep_silence=keep_silence, adaptive_thresh=adaptive_thresh,
+                                       reference_ms=reference_ms)
+
+class EnvelopeThread(QThread):
+    """后台计算输入文件响度曲线的线程，用于设置对话框中的实时预览"""
+    envelope_ready = pyqtSignal(str, object)  # 计算失败时响度曲线为None
+
+    def __init__(self, input_file, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+        super().__init__()
+        self.input_file = input_file
+        self.cache_size_mb = cache_size_mb
+
+    def run(self):
+        try:
+            cache = AnalysisCache(max_size_mb=self.cache_size_mb) if self.cache_size_mb > 0 else None
+            envelope = load_envelope(self.input_file, cache)
+        except Exception as e:
+            logger.error(f"分析音频失败: {str(e)}")
+            envelope = None
+        self.envelope_ready.emit(self.input_file, envelope)
 
 import json
 import os
 
 class AudioSegmenterPyQt(QMainWindow):
     """PyQt版本的音频分段工具"""
+    envelope_ready = pyqtSignal()  # 当前输入文件的响度曲线已更新
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("英语听力分段工具")
@@ -634,8 +1053,23 @@ class AudioSegmenterPyQt(QMainWindow):
         self.output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "segments")
         self.min_silence = 1000
         self.silence_threshold = -40
+        self.export_workers = DEFAULT_WORKERS  # 并发导出数量
+        self.export_backend = 'pydub'  # 导出方式
+        self.analysis_cache_mb = DEFAULT_CACHE_SIZE_MB  # 分析缓存上限(MB)
         self.segment_files = []  # 存储分割后的音频文件列表
+        self.segment_info = {}  # 片段清单中的信息，文件路径 -> SegmentInfo
+        self.adaptive_threshold = False  # 按背景噪声自动确定静默阈值
+        self.early_export = False  # 快速开始：阈值参考开头一分钟的响度，分析完开头就开始导出
+        self.min_segment_ms = DEFAULT_MIN_SEGMENT_MS  # 最短片段时长，更短的片段并入相邻片段
+        self.max_segment_ms = DEFAULT_MAX_SEGMENT_MS  # 合并后的最长片段时长，0表示不限制
+        self.virtual_segments = False  # 虚拟片段模式：只生成片段列表，在源文件中播放
+        self.virtual_tasks = []  # 当前的虚拟片段(ExportTask)
+        self.virtual_source = ""  # 虚拟片段所在的源文件
         self.current_playing_file = ""  # 当前播放的文件
+        self.envelope = None  # 响度曲线，每个输入文件只计算一次，用于实时预览分段结果
+        self.envelope_file = ""  # envelope 对应的输入文件
+        self.envelope_thread = None
+        self.pending_envelope_file = ""  # 上一个计算完成后再计算的文件
 
         # 加载配置（会覆盖上面的默认值）
         self.load_config()
@@ -705,6 +1139,28 @@ class AudioSegmenterPyQt(QMainWindow):
                     # 加载静默阈值
                     if 'silence_threshold' in config:
                         self.silence_threshold = config['silence_threshold']
+                    if 'adaptive_threshold' in config:
+                        self.adaptive_threshold = config['adaptive_threshold']
+                    # 加载片段时长限制
+                    if 'min_segment_ms' in config:
+                        self.min_segment_ms = config['min_segment_ms']
+                    if 'max_segment_ms' in config:
+                        self.max_segment_ms = config['max_segment_ms']
+                    # 加载快速开始开关
+                    if 'early_export' in config:
+                        self.early_export = config['early_export']
+                    # 加载并发导出数量
+                    if 'export_workers' in config:
+                        self.export_workers = config['export_workers']
+                    # 加载导出方式
+                    if config.get('export_backend') in EXPORT_BACKENDS:
+                        self.export_backend = config['export_backend']
+                    # 加载分析缓存上限
+                    if 'analysis_cache_mb' in config:
+                        self.analysis_cache_mb = config['analysis_cache_mb']
+                    # 加载虚拟片段开关
+                    if 'virtual_segments' in config:
+                        self.virtual_segments = config['virtual_segments']
             except Exception as e:
                 logger.error(f"加载配置文件失败: {str(e)}")
 
@@ -714,7 +1170,15 @@ class AudioSegmenterPyQt(QMainWindow):
             'last_input_file': self.input_file,
             'output_dir': self.output_dir,
             'min_silence': self.min_silence,
-            'silence_threshold': self.silence_threshold
+            'silence_threshold': self.silence_threshold,
+            'adaptive_threshold': self.adaptive_threshold,
+            'early_export': self.early_export,
+            'min_segment_ms': self.min_segment_ms,
+            'max_segment_ms': self.max_segment_ms,
+            'export_workers': self.export_workers,
+            'export_backend': self.export_backend,
+            'analysis_cache_mb': self.analysis_cache_mb,
+            'virtual_segments': self.virtual_segments
         }
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -765,6 +1229,27 @@ class AudioSegmenterPyQt(QMainWindow):
         dialog = SettingsDialog(self)
         dialog.exec_()
 
+    def request_envelope(self, input_file):
+        """在后台计算输入文件的响度曲线，已经计算过或正在计算时不重复计算"""
+        if not input_file or not os.path.exists(input_file) or input_file == self.envelope_file:
+            return
+        if self.envelope_thread and self.envelope_thread.isRunning():
+            if self.envelope_thread.input_file != input_file:
+                self.pending_envelope_file = input_file
+            return
+
+        self.pending_envelope_file = ""
+        self.envelope_thread = EnvelopeThread(input_file, self.analysis_cache_mb)
+        self.envelope_thread.envelope_ready.connect(self.set_envelope)
+        self.envelope_thread.finished.connect(lambda: self.request_envelope(self.pending_envelope_file))
+        self.envelope_thread.start()
+
+    def set_envelope(self, input_file, envelope):
+        """保存计算好的响度曲线，通知设置对话框刷新预览"""
+        self.envelope_file = input_file
+        self.envelope = envelope
+        self.envelope_ready.emit()
+
     def create_output_display(self):
         """创建输出目录显示"""
         group = QGroupBox("输出信息")
@@ -886,8 +1371,32 @@ class AudioSegmenterPyQt(QMainWindow):
         # 添加触屏支持
         self.file_list.setMouseTracking(True)
         
+        # 虚拟片段模式下按需导出片段文件
+        self.export_btn = QPushButton("导出片段")
+        self.export_btn.setToolTip("把当前的虚拟片段导出为音频文件")
+        self.export_btn.setEnabled(False)
+        self.export_btn.clicked.connect(self.export_virtual_segments)
+        self.export_btn.setStyleSheet(f"""
+            QPushButton {{
+                background-color: {self.primary_color.name()};
+                color: white;
+                border: none;
+                border-radius: 6px;
+                padding: 4px 8px;
+                font-size: 9pt;
+            }}
+            QPushButton:hover {{
+                background-color: {QColor(52, 152, 219).name()};
+            }}
+            QPushButton:disabled {{
+                background-color: #AAAAAA;
+                color: #EEEEEE;
+            }}
+        """)
+
         list_layout.addWidget(list_label)
         list_layout.addWidget(self.file_list)
+        list_layout.addWidget(self.export_btn)
         
         # 创建音频播放器
         self.audio_player = AudioPlayer(self)
@@ -897,6 +1406,7 @@ class AudioSegmenterPyQt(QMainWindow):
         # 连接音频播放器的信号
         self.audio_player.nextTrackRequested.connect(self.play_next_file)
         self.audio_player.prevTrackRequested.connect(self.play_prev_file)
+        self.audio_player.trackChanged.connect(self.track_changed)
         
         # 添加到布局
         audio_layout.addLayout(list_layout, 1)  # 列表占1份空间
@@ -907,15 +1417,28 @@ class AudioSegmenterPyQt(QMainWindow):
         
     def play_selected_file(self, item):
         """播放选中的文件"""
+        if self.virtual_tasks:
+            # 虚拟片段：在源文件中播放片段的时间范围
+            self.audio_player.set_current_track(self.file_list.row(item))
+            return
+
         file_path = item.data(Qt.UserRole)  # 获取存储的文件路径
         if file_path and os.path.exists(file_path):
             self.current_playing_file = file_path
             # 获取当前选中项的索引
             current_index = self.file_list.row(item)
             # 加载文件并传递段落编号
-            self.audio_player.load_file(file_path, current_index + 1)  # +1 因为用户习惯从1开始计数
+            self.audio_player.load_file(file_path, current_index + 1,  # +1 因为用户习惯从1开始计数
+                                        self.segment_duration(file_path))
             #self.audio_player.play_pause()  # 自动开始播放
             
+    def track_changed(self, index):
+        """播放器自己切换片段(连续播放、上一个/下一个)时同步列表的选中项"""
+        item = self.file_list.item(index)
+        if item is not None:
+            self.file_list.setCurrentRow(index)
+            self.current_playing_file = item.data(Qt.UserRole)
+
     def play_next_file(self):
         """播放下一个文件"""
         # 如果没有文件，直接返回
@@ -1370,6 +1893,8 @@ class AudioSegmenterPyQt(QMainWindow):
         if filename:
             self.input_lineedit.setText(filename)
             self.input_file = filename
+            # 提前在后台分析，调整参数时可以实时预览
+            self.request_envelope(filename)
             # 自动设置输出目录
             input_dir = os.path.dirname(filename)
             self.output_lineedit.setText(os.path.join(input_dir, "segments"))
@@ -1414,6 +1939,9 @@ class AudioSegmenterPyQt(QMainWindow):
             self.settings_dialog = SettingsDialog(self)
         self.min_silence = self.settings_dialog.min_silence
         self.silence_threshold = self.settings_dialog.silence_threshold
+        self.adaptive_threshold = self.settings_dialog.adaptive_threshold
+        self.min_segment_ms = self.settings_dialog.min_segment_ms
+        self.max_segment_ms = self.settings_dialog.max_segment_ms
 
         # 验证输入
         if not self.input_file:
@@ -1431,14 +1959,25 @@ class AudioSegmenterPyQt(QMainWindow):
         self.cancel_btn.setEnabled(True)
         self.audio_player.setEnabled(False)  # 禁用音频播放器
         self.file_list.clear()  # 清空文件列表
+        self.segment_files = []
+        self.segment_info = {}
+        self.audio_player.set_track_list([])  # 释放播放器预先加载的片段文件
+        self.virtual_tasks = []
+        self.export_btn.setEnabled(False)
 
         # 启动处理线程
         self.processing_thread = ProcessingThread(
-            self.input_file, self.output_dir, self.min_silence, self.silence_threshold
+            self.input_file, self.output_dir, self.min_silence, self.silence_threshold,
+            self.export_workers, self.export_backend, self.analysis_cache_mb, self.virtual_segments,
+            adaptive_threshold=self.adaptive_threshold, min_segment_ms=self.min_segment_ms,
+            max_segment_ms=self.max_segment_ms, early_export=self.early_export
         )
+        self.processing_thread.segments_planned.connect(self.set_virtual_segments)
+        self.processing_thread.segment_ready.connect(self.add_segment)
         self.processing_thread.progress_updated.connect(self.update_progress)
         self.processing_thread.status_updated.connect(self.update_status)
         self.processing_thread.processing_finished.connect(self.processing_completed)
+        self.processing_thread.envelope_ready.connect(self.set_envelope)
         self.processing_thread.start()
 
     def cancel_processing(self):
@@ -1458,32 +1997,156 @@ class AudioSegmenterPyQt(QMainWindow):
             # 不显示完成弹窗
             logger.info(f"处理完成: {message}")
             # 更新文件列表
-            if file_list and len(file_list) > 0:
+            if self.virtual_tasks:
+                self.show_virtual_segments()
+            elif self.segment_files and file_list:
+                # 片段在导出过程中已经逐个加入列表，可能正在播放，不再重建列表
+                self.update_segment_durations()
+            elif file_list and len(file_list) > 0:
                 self.update_file_list(file_list)
             else:
                 self.update_file_list()
+            self.update_waveform(self.processing_thread.input_file, file_list)
             # 启用音频播放器
             self.audio_player.setEnabled(True)
             
-            # 自动选择并播放第一个音频片段
-            if self.file_list.count() > 0:
+            # 自动选择并播放第一个音频片段(导出过程中已经选择过时保持不变)
+            if self.file_list.count() > 0 and self.audio_player.get_current_track_index() < 0:
                 self.file_list.setCurrentRow(0)
                 first_item = self.file_list.item(0)
-                file_path = first_item.data(Qt.UserRole)
-                self.current_playing_file = file_path
-                self.audio_player.load_file(file_path, 1)  # 1表示第一个段落
+                self.current_playing_file = first_item.data(Qt.UserRole)
+                self.play_selected_file(first_item)
                 #self.audio_player.play_pause()  # 自动播放第一个片段
         else:
             QMessageBox.critical(self, "错误", message)
             
+    def set_virtual_segments(self, tasks):
+        """保存处理线程生成的虚拟片段"""
+        self.virtual_tasks = tasks
+        self.virtual_source = self.processing_thread.input_file
+
+    def show_virtual_segments(self):
+        """在列表中显示虚拟片段，播放器直接在源文件中播放各片段"""
+        self.file_list.clear()
+        self.segment_files = []
+        self.segment_info = {}
+        for i, task in enumerate(self.virtual_tasks):
+            start_text = QTime(0, 0).addMSecs(task.start_ms).toString("mm:ss.zzz")
+            end_text = QTime(0, 0).addMSecs(task.end_ms).toString("mm:ss.zzz")
+            item = QListWidgetItem(f"{i+1}. {start_text} - {end_text} ({(task.end_ms - task.start_ms)/1000:.1f}秒)")
+            item.setData(Qt.UserRole, self.virtual_source)
+            self.file_list.addItem(item)
+        self.audio_player.set_segment_windows(self.virtual_source,
+                                              [(task.start_ms, task.end_ms) for task in self.virtual_tasks])
+        self.export_btn.setEnabled(bool(self.virtual_tasks))
+
+    def export_virtual_segments(self):
+        """把当前的虚拟片段导出为文件，不再重新分析"""
+        if not self.virtual_tasks:
+            return
+        if self.processing_thread and self.processing_thread.isRunning():
+            QMessageBox.warning(self, "警告", "正在处理中，请等待完成或取消当前任务。")
+            return
+
+        self.output_dir = self.output_lineedit.text().strip()
+        if not self.output_dir:
+            QMessageBox.warning(self, "警告", "请指定输出目录。")
+            return
+
+        # 按当前的输出目录生成文件路径
+        file_name = os.path.splitext(os.path.basename(self.virtual_source))[0]
+        tasks = [task._replace(output_file=segment_output_path(self.output_dir, file_name, task.index))
+                 for task in self.virtual_tasks]
+
+        self.status_text.clear()
+        self.progress_bar.setValue(0)
+        self.start_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.export_btn.setEnabled(False)
+        self.audio_player.stop()
+        self.audio_player.setEnabled(False)
+        self.virtual_tasks = []
+        # 导出的片段文件逐个替换列表中的虚拟片段
+        self.file_list.clear()
+        self.segment_files = []
+        self.segment_info = {}
+        self.audio_player.set_track_list([])
+
+        self.processing_thread = ProcessingThread(
+            self.virtual_source, self.output_dir, self.min_silence, self.silence_threshold,
+            self.export_workers, self.export_backend, self.analysis_cache_mb, planned_tasks=tasks
+        )
+        self.processing_thread.segment_ready.connect(self.add_segment)
+        self.processing_thread.progress_updated.connect(self.update_progress)
+        self.processing_thread.status_updated.connect(self.update_status)
+        self.processing_thread.processing_finished.connect(self.processing_completed)
+        self.processing_thread.envelope_ready.connect(self.set_envelope)
+        self.processing_thread.start()
+
+    def add_segment(self, task):
+        """处理线程导出一个片段后立即把它加入列表，第一个片段导出后就可以开始播放"""
+        file_path = task.output_file
+        self.segment_files.append(file_path)
+        item = QListWidgetItem(f"{len(self.segment_files)}. {os.path.basename(file_path)}")
+        item.setData(Qt.UserRole, file_path)
+        self.file_list.addItem(item)
+        self.audio_player.add_track(file_path)
+
+        if len(self.segment_files) == 1:
+            self.audio_player.setEnabled(True)
+            self.file_list.setCurrentRow(0)
+            self.play_selected_file(item)
+
+    def update_segment_durations(self):
+        """全部导出后读取片段清单，在逐个加入的列表项后补上时长，播放器切换片段时也不必再读取文件"""
+        segments = load_manifests(self.output_dir) if self.output_dir else None
+        self.segment_info = {segment.file_path: segment for segment in segments or []}
+        durations = {}
+        for i, file_path in enumerate(self.segment_files):
+            duration_ms = self.segment_duration(file_path)
+            if duration_ms is not None:
+                self.file_list.item(i).setText(f"{i+1}. {os.path.basename(file_path)} ({duration_ms/1000:.1f}秒)")
+                durations[file_path] = duration_ms
+        self.audio_player.set_track_durations(durations)
+
+    def update_waveform(self, source_file, file_list=None):
+        """
+        在播放器中显示源文件的波形和各片段的位置
+
+        参数:
+        source_file (str): 刚处理完的源文件
+        file_list (list): 这次导出的片段文件，只有它们在源文件中的位置是已知的
+        """
+        pyramid = PeakPyramid.from_envelope(self.envelope) if self.envelope_file == source_file else None
+        if self.virtual_tasks:
+            self.audio_player.set_waveform(pyramid)
+            return
+        exported = set(file_list or [])
+        ranges = []
+        for file_path in self.segment_files:
+            info = self.segment_info.get(file_path)
+            ranges.append((info.start_ms, info.end_ms) if info and file_path in exported else None)
+        self.audio_player.set_waveform(pyramid, ranges)
+
+    def segment_duration(self, file_path):
+        """片段清单中记录的时长(毫秒)，没有记录时返回None"""
+        info = self.segment_info.get(file_path)
+        return info.duration_ms if info else None
+
     def update_file_list(self, file_list=None):
-        """更新文件列表"""
+        """更新文件列表，输出目录中有片段清单时直接读取清单"""
         self.file_list.clear()
         self.segment_files = []
         
+        # 片段清单记录了每个片段的时长，切换片段时不必再读取文件
+        segments = load_manifests(self.output_dir) if self.output_dir else None
+        self.segment_info = {segment.file_path: segment for segment in segments or []}
+        
         # 如果提供了文件列表，直接使用
         if file_list and len(file_list) > 0:
             self.segment_files = file_list
+        elif segments:
+            self.segment_files = [segment.file_path for segment in segments]
         else:
             # 检查输出目录是否存在
             if not os.path.exists(self.output_dir):
@@ -1501,12 +2164,20 @@ class AudioSegmenterPyQt(QMainWindow):
         # 添加到列表
         for i, file_path in enumerate(self.segment_files):
             file_name = os.path.basename(file_path)
-            # 在文件名前添加序号
+            # 在文件名前添加序号，有记录时在后面显示时长
             display_name = f"{i+1}. {file_name}"
+            duration_ms = self.segment_duration(file_path)
+            if duration_ms is not None:
+                display_name += f" ({duration_ms/1000:.1f}秒)"
             item = QListWidgetItem(display_name)
             item.setData(Qt.UserRole, file_path)  # 存储完整路径
             self.file_list.addItem(item)
 
+        # 把片段列表交给播放器，播放时在后台准备相邻的片段
+        durations = {path: self.segment_duration(path) for path in self.segment_files}
+        self.audio_player.set_track_list(self.segment_files,
+                                         {path: ms for path, ms in durations.items() if ms is not None})
+
 if __name__ == "__main__":
     # 检查PyQt5是否安装
     try:
@@ -1528,7 +2199,7 @@ if __name__ == "__main__":
     sys.exit(app.exec_())
 
 # 使用说明:
-# 1. 安装依赖: pip install PyQt5 pydub
+# 1. 安装依赖: pip install PyQt5 pydub numpy
 # 2. 运行程序: python audio_segmenter_pyqt.py
 # 3. 功能:
 #    - 选择输入的MP3文件
@@ -1540,175 +2211,3 @@ if __name__ == "__main__":
 #    - 需要安装FFmpeg并确保其在系统PATH中以处理MP3文件
 #    - 处理大文件时可能需要较长时间
 #    - 处理过程中不要关闭窗口
-
-
-
-    self.settings_dialog = None  # 强制重新创建设置对话框以应用新样式
-
-    def restore_default_settings(self):
-        """恢复默认设置"""
-        # 询问用户是否确定要恢复默认设置
-        reply = QMessageBox.question(self, "确认", "确定要恢复默认设置吗？", 
-                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        
-        if reply == QMessageBox.Yes:
-            # 默认值
-            default_output_dir = os.path.join(os.path.expanduser("~"), "Downloads", "segments")
-            default_min_silence = 1000
-            default_silence_threshold = -40
-
-            # 恢复默认设置
-            self.output_dir = default_output_dir
-            self.min_silence = default_min_silence
-            self.silence_threshold = default_silence_threshold
-
-            # 更新界面
-            self.output_lineedit.setText(self.output_dir)
-            self.silence_slider.setValue(self.min_silence)
-            self.silence_value_label.setText(f"{self.min_silence}ms")
-            self.threshold_slider.setValue(self.silence_threshold)
-            self.threshold_value_label.setText(f"{self.silence_threshold}dB")
-
-            # 通知父窗口更新设置，但不自动保存
-            if self.parent:
-                self.parent.output_dir = self.output_dir
-                self.parent.min_silence = self.min_silence
-                self.parent.silence_threshold = self.silence_threshold
-                logger.info(f"恢复默认设置: output_dir={self.output_dir}, min_silence={self.min_silence}, silence_threshold={self.silence_threshold}")
-
-    def save_settings(self):
-        """保存设置"""
-        # 获取输出目录
-        self.output_dir = self.output_lineedit.text()
-        
-        # 处理特殊路径语法
-        if hasattr(self.parent, 'input_file') and self.parent.input_file and '<文件>' in self.output_dir:
-            input_dir = os.path.dirname(self.parent.input_file)
-            self.output_dir = self.output_dir.replace('<文件>', input_dir)
-            # 更新输入框显示实际路径
-            self.output_lineedit.setText(self.output_dir)
-
-        # 确保输出目录存在
-        if not os.path.exists(self.output_dir):
-            try:
-                os.makedirs(self.output_dir)
-            except Exception as e:
-                QMessageBox.critical(self, "错误", f"创建输出目录失败: {str(e)}")
-                return
-
-        # 保存设置到父窗口
-        if self.parent:
-            self.parent.output_dir = self.output_dir
-            self.parent.min_silence = self.min_silence
-            self.parent.silence_threshold = self.silence_threshold
-            self.parent.output_lineedit.setText(self.output_dir)
-            self.parent.save_config()
-
-        self.accept()
-
-class ProcessingThread(QThread):
-    """处理线程类"""
-    progress_updated = pyqtSignal(int)
-    status_updated = pyqtSignal(str)
-    processing_finished = pyqtSignal(bool, str, list)  # 添加文件列表参数
-
-    def __init__(self, input_file, output_dir, min_silence, silence_threshold):
-        super().__init__()
-        self.input_file = input_file
-        self.output_dir = output_dir
-        self.min_silence = min_silence
-        self.silence_threshold = silence_threshold
-        self.cancel_flag = False
-
-    def run(self):
-        try:
-            # 检查输入文件
-            if not os.path.exists(self.input_file):
-                self.status_updated.emit(f"错误: 文件不存在: {self.input_file}")
-                self.processing_finished.emit(False, "文件不存在")
-                return
-
-            # 创建输出目录
-            os.makedirs(self.output_dir, exist_ok=True)
-
-            # 加载音频文件
-            self.status_updated.emit(f"正在加载音频文件: {self.input_file}")
-            audio = AudioSegment.from_mp3(self.input_file)
-            audio_length = len(audio)
-            self.status_updated.emit(f"音频加载完成，长度: {audio_length/1000:.2f}秒")
-
-            # 分割音频
-            self.status_updated.emit(f"开始分割音频，最小静默长度: {self.min_silence}ms，静默阈值: {self.silence_threshold}dB")
-            self.progress_updated.emit(10)
-
-            # 为split_on_silence添加进度更新和取消检查
-            self.status_updated.emit("正在分析音频波形...")
-            
-            # 分割音频时更新进度的替代方案
-            # 先获取总长度
-            audio_length = len(audio)
-            
-            # 创建一个临时的进度更新函数
-            def progress_callback(progress):
-                # 将0-1的进度映射到10-30%的UI进度
-                ui_progress = 10 + int(progress * 20)
-                self.progress_updated.emit(ui_progress)
-                
-                # 检查是否取消
-                if self.cancel_flag:
-                    raise Exception("处理已取消")
-            
-            try:
-                # 使用带进度的分割函数
-                segments = ProcessingThread.split_on_silence_with_progress(
-                    audio,
-                    min_silence_len=self.min_silence,
-                    silence_thresh=self.silence_threshold,
-                    keep_silence=200,
-                    progress_callback=progress_callback
-                )
-            except Exception as e:
-                if str(e) == "处理已取消":
-                    self.status_updated.emit("处理已取消")
-                    self.progress_updated.emit(0)
-                    self.processing_finished.emit(False, "处理已取消")
-                    return
-                else:
-                    raise e
-            
-            self.status_updated.emit(f"音频分割完成，共 {len(segments)} 个片段")
-            self.progress_updated.emit(30)
-
-            # 保存分段后的音频
-            file_name = os.path.splitext(os.path.basename(self.input_file))[0]
-            output_files = []
-            skipped_count = 0
-
-            for i, segment in enumerate(segments):
-                if self.cancel_flag:
-                    self.status_updated.emit("处理已取消")
-                    self.progress_updated.emit(0)
-                    self.processing_finished.emit(False, "处理已取消")
-                    return
-
-                # 跳过太短的片段
-                if len(segment) < 1000:
-                    skipped_count += 1
-                    continue
-
-                output_file = os.path.join(self.output_dir, f"{file_name}_segment_{i+1:03d}.mp3")
-                segment.export(output_file, format="mp3")
-                output_files.append(output_file)
-
-                # 更新进度
-                progress = 30 + (i+1) * 70 / len(segments)
-                self.progress_updated.emit(int(progress))
-                self.status_updated.emit(f"已保存片段 {i+1} 到: {output_file}")
-
-            self.status_updated.emit(f"跳过 {skipped_count} 个太短的片段")
-            self.status_updated.emit("处理完成，共生成 {} 个音频片段，保存在: {}".format(len(output_files), self.output_dir))
-            self.processing_finished.emit(True, "处理完成", output_files)
-        except Exception as e:
-            self.status_updated.emit(f"处理出错: {str(e)}")
-            self.progress_updated.emit(0)
-            self.processing_finished.emit(False, f"处理出错: {str(e)}")
\ No newline at end of file
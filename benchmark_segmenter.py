@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pydub import AudioSegment
+
+from audio_analysis import DEFAULT_KEEP_SILENCE_MS, SegmentMerger, compute_file_envelope, envelope_segment_ranges
+from audio_decoder import decode_range, load_audio
+from segment_exporter import DEFAULT_WORKERS, EXPORT_BACKENDS, ExportTask, create_exporter, segment_output_path
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 合成音频放在脚本目录下，生成一次后重复使用
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_fixtures')
+
+# 合成算法改变时加一，旧的音频文件不再使用
+FIXTURE_VERSION = 1
+
+FIXTURE_RATE = 44100
+FIXTURE_BITRATE = '128k'
+
+# 默认生成的音频时长(分钟)
+DEFAULT_DURATIONS = [1, 10, 60]
+
+# 检测参数，与合成音频中句子间的停顿相匹配
+MIN_SILENCE_MS = 500
+SILENCE_THRESH = -40
+
+RESULT_VERSION = 1
+
+# 与之前的结果比较时，耗时增加超过这一比例算作变慢
+DEFAULT_TOLERANCE = 0.2
+
+
+def synth_utterance(rng, seconds, rate=FIXTURE_RATE):
+    """
+    合成一句类似说话的声音：带音高滑动的谐波，按音节起伏，夹杂少量噪声(模拟清辅音)
+
+    返回:
+    np.ndarray: float64 单声道采样，幅度在-1到1之间
+    """
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    f0 = rng.uniform(100, 240) * (1 + 0.15 * np.sin(2 * np.pi * rng.uniform(0.2, 0.8) * t + rng.uniform(0, 2 * np.pi)))
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 9))
+
+    syllable_rate = rng.uniform(3, 6)
+    syllables = np.abs(np.sin(np.pi * syllable_rate * t + rng.uniform(0, np.pi))) ** 0.6
+    noise = rng.standard_normal(n) * (syllables < 0.3)
+    signal = voiced * syllables + 0.3 * noise
+
+    # 句子开头和结尾渐入渐出，避免突变
+    fade = min(n // 2, int(0.03 * rate))
+    if fade:
+        ramp = np.linspace(0, 1, fade)
+        signal[:fade] *= ramp
+        signal[-fade:] *= ramp[::-1]
+
+    level_db = rng.uniform(-26, -12)
+    rms = np.sqrt(np.mean(signal ** 2)) or 1.0
+    return signal * (10 ** (level_db / 20) / rms)
+
+
+def synth_pause(rng, seconds, rate=FIXTURE_RATE):
+    """合成句子之间的停顿：约-65dBFS的底噪"""
+    return rng.standard_normal(int(seconds * rate)) * 10 ** (-65 / 20)
+
+
+def synth_speech(minutes, rate=FIXTURE_RATE):
+    """
+    依次生成合成语音中交替出现的句子和停顿，相同的时长每次生成的PCM完全相同
+
+    一次只生成一句或一段停顿，60分钟的音频也只占用几秒采样的内存。
+
+    返回:
+    generator: 依次产生 (int16单声道采样, 是否是句子)
+    """
+    rng = np.random.default_rng(20240000 + minutes)
+    total = int(minutes * 60 * rate)
+    written = 0
+    speaking = False
+    while written < total:
+        if speaking:
+            block = synth_utterance(rng, rng.uniform(0.4, 3.5), rate)
+        else:
+            block = synth_pause(rng, rng.uniform(0.25, 1.5), rate)
+        block = block[:total - written]
+        yield np.clip(np.round(block * 32767), -32768, 32767).astype('<i2'), speaking
+        written += len(block)
+        speaking = not speaking
+
+
+def fixture_path(minutes):
+    return os.path.join(FIXTURE_DIR, f"speech_{minutes}min_v{FIXTURE_VERSION}.mp3")
+
+
+def generate_fixture(minutes):
+    """
+    生成指定时长的合成音频，句子和停顿边生成边写入ffmpeg编码为MP3
+
+    返回:
+    str: MP3文件路径
+    """
+    path = fixture_path(minutes)
+    if os.path.exists(path):
+        return path
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    logger.info(f"正在生成 {minutes} 分钟的合成音频: {path}")
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    command = [AudioSegment.converter, '-nostdin', '-v', 'error', '-y', '-f', 's16le', '-ar', str(FIXTURE_RATE),
+               '-ac', '1', '-i', 'pipe:0', '-ac', '2', '-b:a', FIXTURE_BITRATE, '-f', 'mp3', temp_path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for block, _ in synth_speech(minutes):
+            process.stdin.write(block.tobytes())
+        _, stderr = process.communicate()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    if process.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"ffmpeg编码失败: {stderr.decode('utf-8', 'ignore').strip()}")
+    os.replace(temp_path, path)
+    return path
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存(MB)，不含ffmpeg等子进程；无法获取时返回None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux以KB为单位，macOS以字节为单位
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+    return None
+
+
+def run_stage(stage, file_path, backend=None, detected=None, workers=DEFAULT_WORKERS):
+    """
+    在独立的子进程中执行一个阶段，峰值内存只反映这一阶段
+
+    参数:
+    stage (str): 'decode' 按原格式把整个文件解码到内存；'detect' 低采样率分析并检测片段；
+        'export' 用 backend 导出 detected 中的片段
+    file_path (str): 合成音频路径
+    backend (str): 导出方式，EXPORT_BACKENDS 中的名称
+    detected (dict): 'export' 阶段使用的 'detect' 阶段结果
+    workers (int): 导出并发数
+
+    返回:
+    dict: 耗时(秒)、峰值内存(MB)以及该阶段的结果
+    """
+    result = {}
+    start_time = time.perf_counter()
+    if stage == 'decode':
+        audio = load_audio(file_path)
+        result['duration_ms'] = len(audio)
+    elif stage == 'detect':
+        envelope = compute_file_envelope(file_path)
+        ranges = envelope_segment_ranges(envelope, MIN_SILENCE_MS, SILENCE_THRESH, keep_silence=DEFAULT_KEEP_SILENCE_MS)
+        result['ranges'] = SegmentMerger().merge(ranges)
+        result['format'] = (envelope.frame_rate, envelope.channels)
+    elif stage == 'export':
+        frame_rate, channels = detected['format']
+        with tempfile.TemporaryDirectory() as output_dir:
+            tasks = [ExportTask(i + 1, start, end, segment_output_path(output_dir, 'bench', i + 1))
+                     for i, (start, end) in enumerate(detected['ranges'])]
+            exporter = create_exporter(backend, file_path,
+                                       lambda task: decode_range(file_path, task.start_ms, task.end_ms,
+                                                                 frame_rate, channels),
+                                       workers)
+            output_files = exporter.export(tasks)
+            result['files'] = len(output_files)
+            result['bytes'] = sum(os.path.getsize(path) for path in output_files)
+    else:
+        raise ValueError(f"未知的阶段: {stage}")
+    result['seconds'] = time.perf_counter() - start_time
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_isolated(*args):
+    """在一个新启动的进程中执行 run_stage，避免前一阶段的内存占用影响峰值"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(run_stage, *args).result()
+
+
+def stage_name(entry):
+    """日志中显示的阶段名称，例如 10min export (ffmpeg)"""
+    name = f"{entry['fixture']} {entry['stage']}"
+    return f"{name} ({entry['backend']})" if entry['backend'] else name
+
+
+def benchmark_fixture(minutes, backends, workers):
+    """对一个合成音频依次测量解码、检测和各种导出方式，返回结果记录列表"""
+    file_path = generate_fixture(minutes)
+    fixture = f"{minutes}min"
+    records = []
+
+    def record(stage, result, backend=None, **extra):
+        entry = {'fixture': fixture, 'stage': stage, 'backend': backend,
+                 'seconds': round(result['seconds'], 4),
+                 'peak_rss_mb': None if result['peak_rss_mb'] is None else round(result['peak_rss_mb'], 1)}
+        entry.update(extra)
+        records.append(entry)
+        logger.info(f"{stage_name(entry)}: {entry['seconds']:.2f}秒，峰值内存 {entry['peak_rss_mb']}MB")
+
+    decoded = run_isolated('decode', file_path)
+    record('decode', decoded, duration_ms=decoded['duration_ms'])
+
+    detected = run_isolated('detect', file_path)
+    record('detect', detected, segments=len(detected['ranges']))
+
+    for backend in backends:
+        exported = run_isolated('export', file_path, backend, detected, workers)
+        record('export', exported, backend, files=exported['files'], bytes=exported['bytes'])
+    return records
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """与之前的结果逐项比较耗时，返回耗时增加超过 tolerance 的项数"""
+    previous = {(r['fixture'], r['stage'], r['backend']): r for r in baseline.get('results', [])}
+    regressions = 0
+    for entry in results:
+        old = previous.get((entry['fixture'], entry['stage'], entry['backend']))
+        if not old or not old['seconds']:
+            continue
+        change = entry['seconds'] / old['seconds'] - 1
+        slower = change > tolerance
+        regressions += slower
+        logger.log(logging.WARNING if slower else logging.INFO,
+                   f"{stage_name(entry)}: {old['seconds']:.2f}秒 -> {entry['seconds']:.2f}秒 ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分段流程的基准测试：用合成音频分别测量解码、检测和导出的耗时与峰值内存')
+    parser.add_argument('--durations', type=int, nargs='+', default=DEFAULT_DURATIONS,
+                        help=f'合成音频的时长(分钟)，默认为{" ".join(map(str, DEFAULT_DURATIONS))}')
+    parser.add_argument('--backends', nargs='+', choices=list(EXPORT_BACKENDS), default=list(EXPORT_BACKENDS),
+                        help='要测量的导出方式，默认全部')
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'导出并发数，默认为CPU核数({DEFAULT_WORKERS})')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='结果文件，默认为benchmark_results.json')
+    parser.add_argument('--baseline', help='之前的结果文件，给出时逐项比较耗时，有变慢的项时以状态码1退出')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'耗时增加超过这一比例算作变慢，默认为{DEFAULT_TOLERANCE}')
+    args = parser.parse_args()
+
+    results = []
+    for minutes in args.durations:
+        results += benchmark_fixture(minutes, args.backends, args.workers)
+
+    report = {
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'workers': args.workers,
+        'fixture_version': FIXTURE_VERSION,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"结果已保存到: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            logger.warning(f"{regressions} 项比之前慢了{args.tolerance:.0%}以上")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+# 使用说明:
+# 1. 运行全部基准: python benchmark_segmenter.py
+# 2. 只测短音频: python benchmark_segmenter.py --durations 1 --backends ffmpeg copy
+# 3. 与上次的结果比较: python benchmark_segmenter.py -o new.json --baseline benchmark_results.json
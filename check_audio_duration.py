@@ -1,6 +1,7 @@
 import os
 import logging
-from pydub import AudioSegment
+from audio_decoder import load_audio
+from mp3_frames import probe_duration_ms
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,9 +13,11 @@ def check_audio_duration(file_path):
         return None
     
     try:
-        # 使用pydub加载音频文件
-        audio = AudioSegment.from_mp3(file_path)
-        duration_ms = len(audio)
+        # 读取MP3帧头得到时长，不需要解码；帧头无法确定时长时解码音频文件
+        try:
+            duration_ms = probe_duration_ms(file_path)
+        except ValueError:
+            duration_ms = len(load_audio(file_path))
         duration_sec = duration_ms / 1000
         logging.info(f"文件 {os.path.basename(file_path)} 的实际时长: {duration_ms}毫秒 ({duration_sec:.2f}秒)")
         return duration_ms
@@ -0,0 +1,315 @@
+import struct
+import logging
+from collections import namedtuple
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# MPEG音频帧头，只支持Layer III(MP3)
+FrameHeader = namedtuple('FrameHeader', ['version', 'bitrate', 'sample_rate', 'padding',
+                                         'channel_mode', 'frame_size', 'samples_per_frame', 'side_info_size'])
+
+# Layer III的码率表(kbps)，下标为帧头中的码率序号
+MPEG1_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# 采样率表，MPEG2和MPEG2.5分别是MPEG1的1/2和1/4
+MPEG1_SAMPLE_RATES = [44100, 48000, 32000]
+
+# 版本位对应的版本号：0 = MPEG2.5，2 = MPEG2，3 = MPEG1，1保留
+VERSIONS = {0: 2.5, 2: 2, 3: 1}
+
+# 解码器固有的延迟(采样数)，带LAME标签的文件会在编码器延迟之外再跳过这么多采样
+DECODER_DELAY = 529
+
+# LAME标签的长度(字节)
+LAME_TAG_SIZE = 36
+
+# 只读取标签帧时，在ID3v2标签之后读取的字节数，足够容纳第一个帧和其后的帧头
+PROBE_SIZE = 16 * 1024
+
+
+def parse_frame_header(data, pos):
+    """
+    解析 pos 处的MP3帧头
+
+    返回:
+    FrameHeader: 不是有效的Layer III帧头时返回None
+    """
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = VERSIONS.get((b1 >> 3) & 0x03)
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x03
+    # 不支持自由码率(序号0)
+    if version is None or layer_bits != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    padding = (b2 >> 1) & 0x01
+    channel_mode = b3 >> 6
+    mono = channel_mode == 3
+    if version == 1:
+        bitrate = MPEG1_BITRATES[bitrate_index]
+        sample_rate = MPEG1_SAMPLE_RATES[sample_rate_index]
+        frame_size = 144000 * bitrate // sample_rate + padding
+        samples_per_frame = 1152
+        side_info_size = 17 if mono else 32
+    else:
+        bitrate = MPEG2_BITRATES[bitrate_index]
+        sample_rate = MPEG1_SAMPLE_RATES[sample_rate_index] // (2 if version == 2 else 4)
+        frame_size = 72000 * bitrate // sample_rate + padding
+        samples_per_frame = 576
+        side_info_size = 9 if mono else 17
+
+    return FrameHeader(version, bitrate, sample_rate, padding, channel_mode,
+                       frame_size, samples_per_frame, side_info_size)
+
+
+def id3v2_size(data):
+    """文件开头ID3v2标签的长度，没有时返回0"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def crc16(data, crc=0):
+    """LAME标签使用的CRC-16(多项式0x8005，低位在前)"""
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+class MP3File:
+    """
+    MP3帧索引
+
+    扫描整个文件，记录每个音频帧的位置，用于在帧边界上无损切分。
+    文件开头的Xing/Info帧不算音频帧，其中LAME标签记录的编码器延迟和
+    填充用于换算时间。
+    """
+
+    def __init__(self, file_path, scan_frames=True):
+        """
+        参数:
+        file_path (str): MP3文件路径
+        scan_frames (bool): 为False时只读取文件开头，解析到第一个音频帧为止，
+            offsets 只包含第一个帧，用于从标签帧快速读取时长
+        """
+        with open(file_path, 'rb') as f:
+            if scan_frames:
+                self.data = f.read()
+            else:
+                head = f.read(10)
+                f.seek(0)
+                self.data = f.read(id3v2_size(head) + PROBE_SIZE)
+
+        self.offsets = []
+        self.sizes = []
+        self.bitrates = set()
+        self.header = None
+        self.lame_tag = None
+        self.tag_frames = None  # Xing/Info或VBRI标签中记录的音频帧数
+        self.encoder_delay = 0
+        self.encoder_padding = 0
+        self._scan(first_only=not scan_frames)
+
+        if not self.offsets:
+            raise ValueError(f"未找到MP3音频帧: {file_path}")
+
+        self.sample_rate = self.header.sample_rate
+        self.samples_per_frame = self.header.samples_per_frame
+        # 解码时开头跳过的采样数，与ffmpeg一致：有LAME标签时为编码器延迟加解码器延迟
+        self.start_skip = self.encoder_delay + DECODER_DELAY if self.lame_tag else 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _matches(self, header):
+        """帧头与第一个音频帧的版本和采样率一致"""
+        return (self.header is None or
+                (header.version == self.header.version and header.sample_rate == self.header.sample_rate))
+
+    def _is_frame(self, pos):
+        """pos 处是否为有效帧：帧头有效，且其后紧跟下一个帧头或文件结尾"""
+        header = parse_frame_header(self.data, pos)
+        if header is None or not self._matches(header):
+            return None
+        next_pos = pos + header.frame_size
+        if next_pos > len(self.data):
+            return None
+        if next_pos + 4 <= len(self.data):
+            next_header = parse_frame_header(self.data, next_pos)
+            if next_header is None and self.data[next_pos:next_pos + 3] not in (b'TAG', b'APE'):
+                return None
+        return header
+
+    def _scan(self, first_only=False):
+        """顺序扫描音频帧，遇到无效数据时重新搜索同步字；first_only 为True时找到第一个音频帧就停止"""
+        data = self.data
+        pos = id3v2_size(data)
+        while pos + 4 <= len(data):
+            header = parse_frame_header(data, pos)
+            if header is None or not self._matches(header) or pos + header.frame_size > len(data):
+                header = None
+            if header is None or not self.offsets:
+                # 第一个帧以及失去同步之后，需要同时确认下一个帧头，避免把标签里的数据当成帧
+                header = self._is_frame(pos)
+            if header is None:
+                pos = data.find(b'\xff', pos + 1)
+                if pos < 0:
+                    break
+                continue
+
+            if self.header is None:
+                self.header = header
+                if self._parse_info_frame(pos, header):
+                    pos += header.frame_size
+                    continue
+
+            self.offsets.append(pos)
+            self.sizes.append(header.frame_size)
+            self.bitrates.add(header.bitrate)
+            if first_only:
+                break
+            pos += header.frame_size
+
+    def _parse_info_frame(self, pos, header):
+        """解析Xing/Info帧，是标签帧时返回True"""
+        offset = pos + 4 + header.side_info_size
+        tag = self.data[offset:offset + 4]
+        if tag not in (b'Xing', b'Info'):
+            # VBRI标签固定在帧头后32字节处，帧数在标签开头后14字节处
+            if self.data[pos + 36:pos + 40] != b'VBRI':
+                return False
+            self.tag_frames = struct.unpack('>I', self.data[pos + 50:pos + 54])[0]
+            return True
+
+        flags = struct.unpack('>I', self.data[offset + 4:offset + 8])[0]
+        p = offset + 8
+        if flags & 0x01:
+            self.tag_frames = struct.unpack('>I', self.data[p:p + 4])[0]
+            p += 4
+        p += 4 if flags & 0x02 else 0
+        p += 100 if flags & 0x04 else 0
+        p += 4 if flags & 0x08 else 0
+
+        lame_tag = self.data[p:p + LAME_TAG_SIZE]
+        if len(lame_tag) == LAME_TAG_SIZE and lame_tag[:4] in (b'LAME', b'Lavf', b'Lavc'):
+            self.lame_tag = lame_tag
+            self.encoder_delay = (lame_tag[21] << 4) | (lame_tag[22] >> 4)
+            self.encoder_padding = ((lame_tag[22] & 0x0F) << 8) | lame_tag[23]
+        return True
+
+    def frame_at_ms(self, ms):
+        """离给定时间(毫秒，与解码后的时间轴一致)最近的帧边界序号"""
+        sample = ms * self.sample_rate / 1000
+        index = round((sample + self.start_skip - DECODER_DELAY) / self.samples_per_frame)
+        return min(max(index, 0), len(self.offsets))
+
+    def frame_to_ms(self, index):
+        """帧边界序号对应的时间(毫秒)"""
+        sample = index * self.samples_per_frame - self.start_skip + DECODER_DELAY
+        return max(0, sample) * 1000 / self.sample_rate
+
+    def duration_ms(self):
+        """
+        解码后的时长(毫秒)，与ffmpeg/pydub完整解码得到的 len(audio) 一致
+
+        有标签帧时使用其中记录的帧数，否则使用扫描到的帧数；
+        有LAME标签时按ffmpeg的无缝播放处理去掉开头的 start_skip 个采样，
+        结尾去掉的是填充再加回解码器延迟，但不能超出实际的数据，所以至少去掉解码器延迟。
+        """
+        frames = self.tag_frames if self.tag_frames else len(self.offsets)
+        samples = frames * self.samples_per_frame
+        if self.lame_tag:
+            samples -= self.encoder_delay + max(self.encoder_padding, DECODER_DELAY)
+        return round(max(0, samples) * 1000 / self.sample_rate)
+
+    def build_info_frame(self, first, last, audio_size):
+        """
+        为 [first, last) 这些帧构建Info(固定码率)或Xing(可变码率)标签帧
+
+        标签帧包含帧数、字节数、100项的查找表和LAME标签，
+        编码器延迟和填充只在片段包含原文件的开头或结尾时保留。
+        音频数据的CRC写0(解码器不校验)，标签自身的CRC按LAME的规则计算。
+        """
+        header = self.header
+        bitrates = MPEG1_BITRATES if header.version == 1 else MPEG2_BITRATES
+        needed = 4 + header.side_info_size + 120 + LAME_TAG_SIZE
+        for bitrate_index in range(1, len(bitrates)):
+            probe = parse_frame_header(self._header_bytes(bitrate_index), 0)
+            if probe.frame_size >= needed:
+                break
+        frame = bytearray(probe.frame_size)
+        frame[:4] = self._header_bytes(bitrate_index)
+
+        frame_count = last - first
+        start = self.offsets[first]
+        total_size = len(frame) + audio_size
+        p = 4 + header.side_info_size
+
+        frame[p:p + 4] = b'Info' if len(self.bitrates) == 1 else b'Xing'
+        toc = bytes(min(255, (len(frame) + self.offsets[first + frame_count * i // 100] - start) * 256 // total_size)
+                    for i in range(100))
+        frame[p + 4:p + 120] = struct.pack('>III', 0x0F, frame_count, total_size) + toc + struct.pack('>I', 0)
+        p += 120
+
+        lame = bytearray(self.lame_tag or b'LAME3.100'.ljust(LAME_TAG_SIZE, b'\x00'))
+        if self.lame_tag is None:
+            # 1表示固定码率，0表示未知
+            lame[9] = 1 if len(self.bitrates) == 1 else 0
+        delay = self.encoder_delay if first == 0 else 0
+        padding = self.encoder_padding if last == len(self.offsets) else 0
+        lame[21:24] = bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF])
+        lame[28:36] = struct.pack('>IHH', total_size, 0, 0)
+        frame[p:p + LAME_TAG_SIZE] = lame
+        crc_pos = p + LAME_TAG_SIZE - 2
+        frame[crc_pos:crc_pos + 2] = struct.pack('>H', crc16(frame[:crc_pos]))
+        return bytes(frame)
+
+    def _header_bytes(self, bitrate_index):
+        """按第一个音频帧的参数生成指定码率、无CRC、无填充的帧头"""
+        source = self.data[self.offsets[0]:self.offsets[0] + 4]
+        return bytes([0xFF,
+                      source[1] | 0x01,
+                      (bitrate_index << 4) | (source[2] & 0x0C),
+                      source[3] & 0xCF])
+
+    def write_segment(self, output_file, first, last):
+        """把 [first, last) 这些帧连同新的标签帧原样写入文件，返回写入的字节数"""
+        start = self.offsets[first]
+        end = self.offsets[last - 1] + self.sizes[last - 1]
+        audio = memoryview(self.data)[start:end]
+        info_frame = self.build_info_frame(first, last, len(audio))
+        with open(output_file, 'wb') as f:
+            f.write(info_frame)
+            f.write(audio)
+        return len(info_frame) + len(audio)
+
+
+def probe_duration_ms(file_path):
+    """
+    不解码PCM，快速获取MP3文件的时长(毫秒)
+
+    优先读取文件开头Xing/Info/VBRI标签帧中的帧数，只需要读取几KB；
+    没有记录帧数的标签时扫描全部帧头计数。结果与完整解码后的 len(audio) 相同。
+
+    参数:
+    file_path (str): MP3文件路径
+
+    返回:
+    int: 时长(毫秒)，不是有效的MP3文件时抛出ValueError
+    """
+    mp3 = MP3File(file_path, scan_frames=False)
+    if not mp3.tag_frames:
+        mp3 = MP3File(file_path)
+    return mp3.duration_ms()
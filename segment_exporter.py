@@ -0,0 +1,277 @@
+import os
+import logging
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pydub import AudioSegment
+from mp3_frames import MP3File
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 默认并发数：每个导出任务都是一个独立的ffmpeg编码进程
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# 一个待导出的片段：序号(从1开始)、在源音频中的起止位置(毫秒)和输出文件路径
+ExportTask = namedtuple('ExportTask', ['index', 'start_ms', 'end_ms', 'output_file'])
+
+
+def segment_output_path(output_dir, file_name, index, extension="mp3"):
+    """生成片段的输出路径，序号固定为三位，保证文件名可按顺序排序"""
+    return os.path.join(output_dir, f"{file_name}_segment_{index:03d}.{extension}")
+
+
+class SegmentExporter:
+    """
+    片段导出器
+
+    用线程池并发导出片段。编码工作在各自的ffmpeg子进程中完成，
+    线程只负责切片和等待进程，因此线程池就能用满多核，
+    也不需要把音频数据复制到其他Python进程。
+    """
+
+    def __init__(self, load_segment, workers=DEFAULT_WORKERS, format="mp3"):
+        """
+        参数:
+        load_segment (callable): 根据ExportTask返回要导出的AudioSegment
+        workers (int): 并发导出的数量，1表示逐个导出
+        format (str): 输出格式
+        """
+        self.load_segment = load_segment
+        self.workers = max(1, int(workers))
+        self.format = format
+
+    def export_one(self, task):
+        """导出单个片段"""
+        segment = self.load_segment(task)
+        segment.export(task.output_file, format=self.format)
+        return task
+
+    def export_batch(self, batch, cancel_check=None):
+        """导出一批片段，返回已完成的任务"""
+        return [self.export_one(task) for task in batch]
+
+    def export(self, tasks, progress_callback=None, cancel_check=None):
+        """
+        导出所有片段
+
+        tasks 可以是列表，也可以是逐个产出任务的生成器(例如流式检测)；
+        同时在途的任务数有上限，已解码的片段不会在内存中堆积。
+
+        参数:
+        tasks (iterable): ExportTask序列
+        progress_callback (callable): 每完成一个片段调用一次，参数为(已完成数, 总数, 任务)，
+            总数未知时为None
+        cancel_check (callable): 返回True时停止提交新任务，并放弃尚未开始的任务
+
+        返回:
+        list: 已导出的文件路径，按片段序号排序
+        """
+        total = len(tasks) if hasattr(tasks, '__len__') else None
+        return self.run_batches(([task] for task in tasks), total, progress_callback, cancel_check)
+
+    def run_batches(self, batches, total, progress_callback=None, cancel_check=None):
+        """在线程池中执行 export_batch，参数同 export"""
+        finished_tasks = []
+        max_pending = self.workers * 2
+
+        def collect(futures):
+            for future in futures:
+                for task in future.result():
+                    finished_tasks.append(task)
+                    if progress_callback:
+                        progress_callback(len(finished_tasks), total, task)
+
+        def cancelled():
+            return cancel_check is not None and cancel_check()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            try:
+                for batch in batches:
+                    if cancelled():
+                        break
+                    pending.add(executor.submit(self.export_batch, batch, cancel_check))
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+                while pending and not cancelled():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            finally:
+                # 取消或出错时放弃还没开始的任务，正在编码的任务会自然结束
+                for future in pending:
+                    future.cancel()
+
+        return [task.output_file for task in sorted(finished_tasks, key=lambda t: t.index)]
+
+
+class FFmpegCutExporter(SegmentExporter):
+    """
+    单次ffmpeg切分导出
+
+    直接从源文件切出片段：一次ffmpeg调用只解码一遍源文件，
+    用多组输出端的 -ss/-to 同时写出多个片段，
+    省去了每个片段启动一个ffmpeg进程以及在Python中复制PCM的开销。
+    片段按并发数分成若干批，每批一次调用；命令行过长时再拆分。
+    """
+
+    # Windows命令行长度上限为32767个字符，留出余量
+    MAX_COMMAND_LENGTH = 30000
+
+    def __init__(self, source_file, workers=DEFAULT_WORKERS, format="mp3"):
+        """
+        参数:
+        source_file (str): 源音频文件路径
+        workers (int): 同时运行的ffmpeg进程数
+        format (str): 输出格式
+        """
+        super().__init__(None, workers, format)
+        self.source_file = source_file
+
+    def build_command(self, batch):
+        """构建一次写出整批片段的ffmpeg命令"""
+        # 输入端先快速定位到这批片段的开头，只解码需要的部分
+        batch_start = batch[0].start_ms
+        command = [AudioSegment.converter, '-nostdin', '-v', 'error', '-y',
+                   '-ss', f"{batch_start / 1000:.3f}", '-i', self.source_file]
+        for task in batch:
+            command += ['-map', '0:a',
+                        '-ss', f"{(task.start_ms - batch_start) / 1000:.3f}",
+                        '-to', f"{(task.end_ms - batch_start) / 1000:.3f}",
+                        '-f', self.format, task.output_file]
+        return command
+
+    def plan_batches(self, tasks):
+        """把片段按并发数平均分批，命令行过长的批次再拆开"""
+        tasks = sorted(tasks, key=lambda t: t.start_ms)
+        batch_size = max(1, -(-len(tasks) // self.workers))
+        batches = []
+        for i in range(0, len(tasks), batch_size):
+            batch = []
+            for task in tasks[i:i + batch_size]:
+                if batch and len(subprocess.list2cmdline(self.build_command(batch + [task]))) > self.MAX_COMMAND_LENGTH:
+                    batches.append(batch)
+                    batch = []
+                batch.append(task)
+            batches.append(batch)
+        return batches
+
+    def export_batch(self, batch, cancel_check=None):
+        """运行ffmpeg写出一批片段，取消时终止进程"""
+        process = subprocess.Popen(self.build_command(batch), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        while True:
+            try:
+                _, stderr = process.communicate(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel_check is not None and cancel_check():
+                    process.kill()
+                    process.communicate()
+                    return []
+
+        if process.returncode != 0:
+            error = stderr.decode('utf-8', 'ignore').strip()
+            raise RuntimeError(f"ffmpeg切分失败: {error}")
+        return batch
+
+    def export(self, tasks, progress_callback=None, cancel_check=None):
+        """导出所有片段，参数同 SegmentExporter.export；需要事先知道全部片段"""
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        return self.run_batches(self.plan_batches(tasks), len(tasks), progress_callback, cancel_check)
+
+
+class FrameCopyExporter(SegmentExporter):
+    """
+    无损复制导出
+
+    不解码也不重新编码：在MP3帧边界上切分源文件，把原始帧直接写入输出文件，
+    并为每个片段写入新的Xing/Info标签帧，速度只受磁盘读写限制，也没有二次编码的音质损失。
+    相邻片段之间在静默中点附近的帧边界处切开，切点最多偏离一帧(约26毫秒)。
+    """
+
+    def __init__(self, source_file, workers=DEFAULT_WORKERS, format="mp3"):
+        """
+        参数:
+        source_file (str): 源MP3文件路径
+        workers (int): 同时写入的片段数
+        format (str): 输出格式，只支持mp3
+        """
+        if format != "mp3":
+            raise ValueError(f"无损复制只支持mp3格式: {format}")
+        super().__init__(None, workers, format)
+        self.source_file = source_file
+
+    def plan_frames(self, mp3, tasks):
+        """
+        计算每个片段的帧范围
+
+        相邻片段(序号连续)在两者之间静默的中点切开；
+        前后没有相邻片段的一侧就在片段自身的边界处切开。
+        """
+        tasks = sorted(tasks, key=lambda t: t.start_ms)
+        plans = []
+        for i, task in enumerate(tasks):
+            start_ms, end_ms = task.start_ms, task.end_ms
+            if i > 0 and tasks[i - 1].index + 1 == task.index:
+                start_ms = (tasks[i - 1].end_ms + task.start_ms) / 2
+            if i + 1 < len(tasks) and tasks[i + 1].index == task.index + 1:
+                end_ms = (task.end_ms + tasks[i + 1].start_ms) / 2
+
+            first = mp3.frame_at_ms(start_ms)
+            last = max(mp3.frame_at_ms(end_ms), first + 1)
+            if first >= len(mp3):
+                logger.warning(f"片段 {task.index} 超出音频末尾，已跳过")
+                continue
+            plans.append((task, first, min(last, len(mp3))))
+        return plans
+
+    def export_batch(self, batch, cancel_check=None):
+        """写出一批片段，batch 中每项为 (任务, 起始帧, 结束帧)"""
+        mp3 = self.mp3
+        for task, first, last in batch:
+            mp3.write_segment(task.output_file, first, last)
+        return [task for task, _, _ in batch]
+
+    def export(self, tasks, progress_callback=None, cancel_check=None):
+        """导出所有片段，参数同 SegmentExporter.export；需要事先知道全部片段"""
+        tasks = list(tasks)
+        if not tasks:
+            return []
+        self.mp3 = MP3File(self.source_file)
+        try:
+            batches = ([plan] for plan in self.plan_frames(self.mp3, tasks))
+            return self.run_batches(batches, len(tasks), progress_callback, cancel_check)
+        finally:
+            self.mp3 = None
+
+
+# 可选的导出方式
+EXPORT_BACKENDS = {
+    'pydub': "逐段编码(pydub)",
+    'ffmpeg': "单次ffmpeg切分",
+    'copy': "无损复制(不重新编码)",
+}
+
+
+def create_exporter(backend, source_file, load_segment, workers=DEFAULT_WORKERS, format="mp3"):
+    """
+    按名称创建导出器
+
+    参数:
+    backend (str): EXPORT_BACKENDS 中的名称
+    source_file (str): 源音频文件路径
+    load_segment (callable): pydub方式下根据ExportTask返回AudioSegment
+    workers (int): 并发数
+    format (str): 输出格式
+    """
+    if backend == 'ffmpeg':
+        return FFmpegCutExporter(source_file, workers, format)
+    if backend == 'copy':
+        return FrameCopyExporter(source_file, workers, format)
+    if backend == 'pydub':
+        return SegmentExporter(load_segment, workers, format)
+    raise ValueError(f"未知的导出方式: {backend}")
@@ -0,0 +1,132 @@
+import os
+import json
+import logging
+import math
+from collections import namedtuple
+
+from audio_analysis import envelope_levels
+from mp3_frames import probe_duration_ms
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 片段清单文件名的后缀，与片段文件放在同一目录下，例如 lesson1_segments.json
+MANIFEST_SUFFIX = "_segments.json"
+
+MANIFEST_VERSION = 1
+
+# 清单中的一个片段：序号、文件路径、在源音频中的起止位置(毫秒)、时长(毫秒)、
+# 峰值和平均电平(dBFS，无声时为None)以及文件大小(字节)
+SegmentInfo = namedtuple('SegmentInfo', ['index', 'file_path', 'start_ms', 'end_ms', 'duration_ms',
+                                         'peak_dbfs', 'rms_dbfs', 'size'])
+
+
+def manifest_path(output_dir, file_name):
+    """源文件名(不含扩展名)对应的片段清单路径"""
+    return os.path.join(output_dir, f"{file_name}{MANIFEST_SUFFIX}")
+
+
+def _level(value):
+    """电平保留两位小数，无声(-inf)或未知时记为None"""
+    return round(value, 2) if value is not None and math.isfinite(value) else None
+
+
+def write_manifest(source_file, output_dir, tasks, output_files, envelope=None):
+    """
+    把导出的片段信息写入清单，播放器加载片段列表时直接读取，不必再扫描目录或读取每个文件
+
+    参数:
+    source_file (str): 源音频文件路径
+    output_dir (str): 片段所在目录
+    tasks (iterable): ExportTask，只记录输出文件在 output_files 中的任务
+    output_files (list): 已导出的文件路径
+    envelope (AudioEnvelope): 源文件的响度曲线，为None时不记录电平
+
+    返回:
+    str: 清单路径，写入失败时返回None
+    """
+    exported = set(output_files)
+    segments = []
+    for task in sorted(tasks, key=lambda t: t.index):
+        if task.output_file not in exported:
+            continue
+        try:
+            duration_ms = probe_duration_ms(task.output_file)
+        except ValueError:
+            duration_ms = task.end_ms - task.start_ms
+        levels = envelope_levels(envelope, task.start_ms, task.end_ms) if envelope else (None, None)
+        segments.append({
+            'index': task.index,
+            'file': os.path.basename(task.output_file),
+            'start_ms': task.start_ms,
+            'end_ms': task.end_ms,
+            'duration_ms': duration_ms,
+            'peak_dbfs': _level(levels[0]),
+            'rms_dbfs': _level(levels[1]),
+            'size': os.path.getsize(task.output_file),
+        })
+
+    file_name = os.path.splitext(os.path.basename(source_file))[0]
+    path = manifest_path(output_dir, file_name)
+    manifest = {'version': MANIFEST_VERSION, 'source': os.path.abspath(source_file), 'segments': segments}
+    try:
+        # 先写临时文件再替换，读取方不会看到写了一半的清单
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"写入片段清单失败: {str(e)}")
+        return None
+    return path
+
+
+def load_manifest(path):
+    """
+    读取一个片段清单
+
+    只返回文件仍然存在的片段；文件大小与清单不符(被替换过)时时长记为None，由调用方重新获取。
+
+    返回:
+    list: SegmentInfo列表，按序号排序；清单无效时返回None
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        output_dir = os.path.dirname(path)
+        segments = []
+        for entry in manifest['segments']:
+            file_path = os.path.join(output_dir, entry['file'])
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                continue
+            duration_ms = entry['duration_ms'] if size == entry['size'] else None
+            segments.append(SegmentInfo(entry['index'], file_path, entry['start_ms'], entry['end_ms'], duration_ms,
+                                        entry['peak_dbfs'], entry['rms_dbfs'], size))
+        return sorted(segments, key=lambda s: s.index)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"读取片段清单失败: {path}: {str(e)}")
+        return None
+
+
+def load_manifests(output_dir):
+    """
+    读取目录中所有的片段清单
+
+    返回:
+    list: 所有清单中的SegmentInfo，按文件名排序；目录中没有有效的清单时返回None
+    """
+    if not os.path.isdir(output_dir):
+        return None
+    segments = None
+    for name in sorted(os.listdir(output_dir)):
+        if name.endswith(MANIFEST_SUFFIX):
+            entries = load_manifest(os.path.join(output_dir, name))
+            if entries is not None:
+                segments = (segments or []) + entries
+    if segments is not None:
+        segments.sort(key=lambda s: s.file_path)
+    return segments
@@ -116,6 +116,14 @@ DEPENDENCIES = {
         'submodules': ['AudioSegment'],  # 修正子模块列表
         'module_functions': {'silence': ['split_on_silence']}  # 添加模块函数检查
     },
+    'numpy': {
+        'module': 'numpy',
+        'install_command': 'numpy',
+        'version_requirement': '>=1.20.0',
+        'description': '用于向量化的静默检测',
+        'critical': True,
+        'submodules': ['einsum']
+    },
     'ffmpeg': {
         'type': 'external',
         'command': 'ffmpeg',
@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pydub')
+
+from analysis_cache import AnalysisCache
+from audio_analysis import FRAME_LENGTH_MS, AudioEnvelope
+
+
+def envelope(frame_rate, channels):
+    frame_dbfs = np.linspace(-60.0, -10.0, 50)
+    return AudioEnvelope(frame_dbfs, len(frame_dbfs) * FRAME_LENGTH_MS, -20.0, frame_rate, channels, FRAME_LENGTH_MS)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'input.mp3'
+    path.write_bytes(b'ID3' + bytes(1024))
+    return str(path)
+
+
+def test_low_rate_and_full_rate_entries_are_separate(tmp_path, source):
+    cache = AnalysisCache(cache_dir=str(tmp_path / 'cache'))
+    cache.store(source, envelope(44100, 2))
+    assert cache.load(source) is not None
+    # 低采样率的结果不能当作按原格式分析的结果使用，反之亦然
+    assert cache.load(source, full_rate=True) is None
+    cache.store(source, envelope(44100, 2)._replace(frame_dbfs=np.full(50, -30.0)), full_rate=True)
+    np.testing.assert_array_equal(cache.load(source, full_rate=True).frame_dbfs, np.full(50, -30.0))
+    np.testing.assert_array_equal(cache.load(source).frame_dbfs, envelope(44100, 2).frame_dbfs)
+
+
+def test_entry_without_analysis_format_is_a_miss(tmp_path, source):
+    cache = AnalysisCache(cache_dir=str(tmp_path / 'cache'))
+    cache.store(source, envelope(44100, 2))
+    # 模拟早期没有记录分析格式的缓存项
+    path = cache._entry_path(cache.key_for(source))
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files if not name.startswith('analysis_')}
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    assert cache.load(source) is None
@@ -0,0 +1,420 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pydub = pytest.importorskip('pydub')
+
+import audio_analysis
+from audio_analysis import (ANALYSIS_FRAME_RATE, FRAME_LENGTH_MS, PEAK_PYRAMID_FACTOR, SILENCE_FLOOR_DBFS,
+                            AudioEnvelope, PeakPyramid, SegmentMerger, adaptive_silence_thresholds, compute_file_envelope, compute_frame_dbfs,
+                            detect_silent_ranges, envelope_segment_ranges, reference_level, stream_segment_ranges)
+
+
+def make_audio(duration_ms, frame_rate, channels, sample_width, seed=0):
+    """
+    生成确定的类语音测试音频：随机长度的噪声突发(音节)之间夹着长短不一的静默
+
+    突发的响度各不相同，静默中带有很低的底噪，阈值附近的帧也能覆盖到。
+    """
+    rng = np.random.RandomState(seed)
+    total = int(duration_ms * frame_rate / 1000)
+    max_amplitude = 2 ** (sample_width * 8 - 1) - 1
+    samples = rng.normal(0, max_amplitude * 0.0005, size=(total, channels))
+    pos = int(rng.randint(0, frame_rate // 2))
+    while pos < total:
+        length = int(rng.randint(frame_rate // 20, frame_rate // 2))
+        level = max_amplitude * rng.uniform(0.05, 0.5)
+        samples[pos:pos + length] += rng.normal(0, level, size=samples[pos:pos + length].shape)
+        pos += length + int(rng.randint(frame_rate // 50, frame_rate))
+    samples = np.clip(np.round(samples), -max_amplitude, max_amplitude).astype(f'<i{sample_width}')
+    return pydub.AudioSegment(data=samples.tobytes(), sample_width=sample_width, frame_rate=frame_rate,
+                              channels=channels)
+
+
+def reference_frame_dbfs(audio, frame_length=FRAME_LENGTH_MS):
+    """原先的逐帧实现：把音频切成一个个AudioSegment再取dBFS"""
+    return np.array([frame.dBFS for frame in audio[::frame_length]])
+
+
+def reference_silent_ranges(audio, min_silence_len, silence_thresh, frame_length=FRAME_LENGTH_MS):
+    """原先 split_on_silence_with_progress 中的逐帧静默检测，阈值是相对平均响度的偏移"""
+    silence_thresh = audio.dBFS + silence_thresh
+    silent_ranges = []
+    in_silence = False
+    silence_start = 0
+    for i, frame in enumerate(audio[::frame_length]):
+        if frame.dBFS <= silence_thresh:
+            if not in_silence:
+                in_silence = True
+                silence_start = i * frame_length
+        elif in_silence:
+            in_silence = False
+            if i * frame_length - silence_start >= min_silence_len:
+                silent_ranges.append((silence_start, i * frame_length))
+    if in_silence and len(audio) - silence_start >= min_silence_len:
+        silent_ranges.append((silence_start, len(audio)))
+    return silent_ranges
+
+
+# (采样率, 声道数, 采样宽度)：包括每帧采样数不是整数(11025Hz、22050Hz)和8位、32位PCM
+FORMATS = [
+    (8000, 1, 2),
+    (11025, 1, 2),
+    (22050, 2, 2),
+    (44100, 2, 2),
+    (48000, 1, 1),
+    (16000, 2, 4),
+]
+
+
+@pytest.mark.parametrize('frame_rate, channels, sample_width', FORMATS)
+def test_frame_dbfs_matches_per_frame_loop(frame_rate, channels, sample_width):
+    audio = make_audio(3007, frame_rate, channels, sample_width)
+    expected = reference_frame_dbfs(audio)
+    actual = compute_frame_dbfs(audio)
+    assert actual.shape == expected.shape
+    # RMS取整后完全相同，向量化的log10与math.log10只有最后一位的舍入差别
+    np.testing.assert_array_equal(np.isneginf(actual), np.isneginf(expected))
+    finite = np.isfinite(expected)
+    np.testing.assert_allclose(actual[finite], expected[finite], rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize('frame_rate, channels, sample_width', FORMATS)
+@pytest.mark.parametrize('min_silence_len, silence_thresh', [(100, -16), (300, -10), (50, -30)])
+def test_silent_ranges_match_per_frame_loop(frame_rate, channels, sample_width, min_silence_len, silence_thresh):
+    audio = make_audio(4003, frame_rate, channels, sample_width, seed=frame_rate)
+    expected = reference_silent_ranges(audio, min_silence_len, silence_thresh)
+    actual = detect_silent_ranges(compute_frame_dbfs(audio), audio.dBFS + silence_thresh, min_silence_len,
+                                  len(audio))
+    assert expected, "测试音频中应当有静默"
+    assert actual == expected
+
+
+def test_digital_silence_is_minus_inf():
+    audio = pydub.AudioSegment.silent(duration=95, frame_rate=8000)
+    frame_dbfs = compute_frame_dbfs(audio)
+    assert len(frame_dbfs) == 10
+    assert np.all(np.isneginf(frame_dbfs))
+    assert detect_silent_ranges(frame_dbfs, -50, 50, len(audio)) == [(0, 95)]
+
+
+def test_progress_callback_reaches_one():
+    audio = make_audio(1000, 8000, 1, 2)
+    progress = []
+    compute_frame_dbfs(audio, progress_callback=progress.append)
+    assert progress and progress[-1] == 1.0
+
+
+def fake_pcm_source(monkeypatch, samples, block_frames):
+    """让 iter_pcm_blocks 按块返回给定的低采样率PCM，不需要ffmpeg"""
+    def iter_pcm_blocks(file_path, frame_rate, channels, block_ms):
+        for start in range(0, len(samples), block_frames):
+            yield samples[start:start + block_frames]
+    monkeypatch.setattr(audio_analysis, 'iter_pcm_blocks', iter_pcm_blocks)
+    return {'frame_rate': 44100, 'channels': 2, 'duration_ms': len(samples) * 1000 // ANALYSIS_FRAME_RATE}
+
+
+def random_speech(rng, keep_silence):
+    """交替的有声和静默部分(8kHz单声道)，开头和结尾的静默长度在 keep_silence 上下变化，也可能没有"""
+    parts = [int(rng.choice([0, rng.randint(1, 3 * keep_silence + 2)]))]
+    for _ in range(rng.randint(1, 6)):
+        parts += [int(rng.randint(50, 2000)), int(rng.randint(10, 1500))]
+    parts[-1] = int(rng.choice([0, rng.randint(1, 3 * keep_silence + 2)]))
+    pieces = [rng.normal(0, 8000 if i % 2 else 20, size=(length * ANALYSIS_FRAME_RATE // 1000, 1))
+              for i, length in enumerate(parts)]
+    return np.clip(np.round(np.concatenate(pieces)), -32767, 32767).astype(np.int16)
+
+
+def test_streaming_ranges_match_full_file(monkeypatch):
+    """流式检测与整文件检测的片段边界一致，包括文件开头和结尾的静默"""
+    rng = np.random.RandomState(2)
+    for case in range(300):
+        keep_silence = int(rng.choice([0, 100, 200, 500]))
+        samples = random_speech(rng, keep_silence)
+        audio_info = fake_pcm_source(monkeypatch, samples, int(rng.randint(100, 20000)))
+        envelope = compute_file_envelope('fake.mp3', audio_info)
+        min_silence_len = int(rng.choice([10, 100, 300]))
+        # 奇数号用相对阈值(要读完整个文件才能检测)，偶数号用绝对阈值(边解码边检测)
+        relative_thresh = bool(case % 2)
+        silence_thresh = -16 if relative_thresh else -40
+        expected = envelope_segment_ranges(envelope, min_silence_len, silence_thresh, relative_thresh,
+                                           keep_silence=keep_silence)
+        actual = list(stream_segment_ranges('fake.mp3', min_silence_len, silence_thresh, relative_thresh,
+                                            keep_silence=keep_silence, audio_info=audio_info))
+        assert actual == expected, f"case {case}: keep_silence={keep_silence}"
+
+
+def test_reference_level():
+    frame_dbfs = np.array([-20.0, -20.0, -30.0, float('-inf'), -10.0])
+    assert reference_level(frame_dbfs, -15.0) == -15.0
+    # 音频不长于参考段时用整段音频的响度
+    assert reference_level(frame_dbfs, -15.0, 5 * FRAME_LENGTH_MS) == -15.0
+    assert reference_level(frame_dbfs, -15.0, 2 * FRAME_LENGTH_MS) == pytest.approx(-20.0)
+    # 按功率平均，完全静音的帧计为0
+    expected = 10 * np.log10((2 * 10 ** -2 + 10 ** -3 + 0) / 4)
+    assert reference_level(frame_dbfs, -15.0, 4 * FRAME_LENGTH_MS) == pytest.approx(expected)
+    assert reference_level(np.full(10, float('-inf')), -15.0, 5 * FRAME_LENGTH_MS) == float('-inf')
+
+
+def test_streaming_reference_level_matches_full_file(monkeypatch):
+    """以开头的响度为参考时，流式检测与整文件检测一致，并且读完参考段后就开始产出片段"""
+    rng = np.random.RandomState(11)
+    for case in range(300):
+        keep_silence = int(rng.choice([0, 100, 200, 500]))
+        samples = random_speech(rng, keep_silence)
+        block_frames = int(rng.randint(100, 20000))
+        audio_info = fake_pcm_source(monkeypatch, samples, block_frames)
+        envelope = compute_file_envelope('fake.mp3', audio_info)
+        min_silence_len = int(rng.choice([10, 100, 300]))
+        # 参考段有时比整个文件长，这时与相对整段音频的结果相同
+        reference_ms = int(rng.choice([FRAME_LENGTH_MS, rng.randint(1, 3000), 60000]))
+        expected = envelope_segment_ranges(envelope, min_silence_len, -16, True, keep_silence=keep_silence,
+                                           reference_ms=reference_ms)
+        if reference_ms >= envelope.duration_ms:
+            assert expected == envelope_segment_ranges(envelope, min_silence_len, -16, True,
+                                                       keep_silence=keep_silence)
+
+        decoded = []
+        source = audio_analysis.iter_pcm_blocks
+
+        def counting_source(*args):
+            for block in source(*args):
+                decoded.append(len(block))
+                yield block
+        monkeypatch.setattr(audio_analysis, 'iter_pcm_blocks', counting_source)
+
+        actual = []
+        for segment in stream_segment_ranges('fake.mp3', min_silence_len, -16, True, keep_silence=keep_silence,
+                                             audio_info=audio_info, reference_ms=reference_ms):
+            # 片段之后隔着一段已经确认的静默，最多再读一块就能确认
+            decoded_ms = sum(decoded) * 1000 // ANALYSIS_FRAME_RATE
+            if decoded_ms < envelope.duration_ms:
+                assert decoded_ms > reference_ms
+                assert segment[1] + min_silence_len <= decoded_ms + keep_silence
+            actual.append(segment)
+        assert actual == expected, f"case {case}: reference_ms={reference_ms}"
+
+
+def speech_envelope(floors, rng, speech_ms=2000, pause_ms=500, speech_db=-15.0):
+    """
+    合成响度曲线：每个元素是一段60秒录音的背景噪声(dBFS)，其中语音和停顿交替出现
+
+    返回:
+    tuple: (每帧的dBFS, 每个停顿的中点(毫秒))
+    """
+    frames, pauses = [], []
+    position = 0
+    for floor in floors:
+        for _ in range(60000 // (speech_ms + pause_ms)):
+            frames.append(rng.normal(speech_db, 3, speech_ms // FRAME_LENGTH_MS))
+            frames.append(rng.normal(floor, 1.5, pause_ms // FRAME_LENGTH_MS))
+            pauses.append(position + speech_ms + pause_ms // 2)
+            position += speech_ms + pause_ms
+    return np.concatenate(frames), pauses
+
+
+def test_adaptive_threshold_follows_noise_floor():
+    """背景噪声中途变大时，前后两部分的停顿都能识别；固定阈值只能照顾一边"""
+    rng = np.random.RandomState(3)
+    frame_dbfs, pauses = speech_envelope([-60.0, -35.0], rng)
+    duration_ms = len(frame_dbfs) * FRAME_LENGTH_MS
+    thresholds = adaptive_silence_thresholds(frame_dbfs)
+    assert thresholds.shape == frame_dbfs.shape
+
+    # 阈值在噪声底之上、语音之下
+    quiet, noisy = thresholds[:5000], thresholds[-5000:]
+    assert np.all((quiet > -60) & (quiet < -15))
+    assert np.all((noisy > -35) & (noisy < -15))
+
+    silences = detect_silent_ranges(frame_dbfs, thresholds, 300, duration_ms)
+    found = [any(start <= pause < end for start, end in silences) for pause in pauses]
+    assert all(found)
+    assert len(silences) == len(pauses)
+
+    fixed = detect_silent_ranges(frame_dbfs, -50, 300, duration_ms)
+    assert len(fixed) < len(pauses)
+
+
+def test_adaptive_threshold_handles_digital_silence():
+    rng = np.random.RandomState(4)
+    frame_dbfs, pauses = speech_envelope([-np.inf], rng)
+    thresholds = adaptive_silence_thresholds(frame_dbfs)
+    assert np.all(np.isfinite(thresholds))
+    assert np.all(thresholds > SILENCE_FLOOR_DBFS)
+    silences = detect_silent_ranges(frame_dbfs, thresholds, 300, len(frame_dbfs) * FRAME_LENGTH_MS)
+    assert len(silences) == len(pauses)
+
+
+def test_adaptive_threshold_short_and_empty_input():
+    assert len(adaptive_silence_thresholds(np.zeros(0))) == 0
+    # 比一个窗口还短时整段只用一个窗口
+    short = np.array([-20.0, -60.0, -20.0, -60.0, -20.0])
+    thresholds = adaptive_silence_thresholds(short)
+    assert len(thresholds) == 5 and np.ptp(thresholds) == 0
+    assert -60 < thresholds[0] < -20
+
+
+def test_adaptive_threshold_ignores_manual_threshold():
+    rng = np.random.RandomState(5)
+    frame_dbfs, pauses = speech_envelope([-50.0], rng)
+    envelope = AudioEnvelope(frame_dbfs, len(frame_dbfs) * FRAME_LENGTH_MS, -20.0, 8000, 1, FRAME_LENGTH_MS)
+    ranges = [envelope_segment_ranges(envelope, 300, thresh, adaptive_thresh=True) for thresh in (-60, -10)]
+    assert ranges[0] == ranges[1]
+    # 每段语音后面都有停顿(包括结尾)，片段数等于停顿数
+    assert len(ranges[0]) == len(pauses)
+
+
+def test_merger_keeps_long_segments():
+    merger = SegmentMerger(1000, 30000)
+    ranges = [(0, 1500), (2000, 4000), (6000, 9000)]
+    assert merger.merge(ranges) == ranges
+    assert (merger.merged_count, merger.dropped_count) == (0, 0)
+
+
+def test_merger_prefers_the_closer_neighbour():
+    merger = SegmentMerger(1000, 30000, max_gap_ms=1000)
+    # 短片段离后一段(100ms)比离前一段(800ms)近
+    assert merger.merge([(0, 2000), (2800, 3200), (3300, 5000)]) == [(0, 2000), (2800, 5000)]
+    assert merger.merged_count == 1
+
+
+def test_merger_repeats_until_long_enough():
+    merger = SegmentMerger(1000, 30000)
+    assert merger.merge([(0, 300), (400, 700), (800, 1100), (5000, 7000)]) == [(0, 1100), (5000, 7000)]
+    assert (merger.merged_count, merger.dropped_count) == (2, 0)
+
+
+def test_merger_drops_isolated_short_segments():
+    merger = SegmentMerger(1000, 30000, max_gap_ms=1000)
+    assert merger.merge([(0, 2000), (4000, 4500), (7000, 9000)]) == [(0, 2000), (7000, 9000)]
+    assert (merger.merged_count, merger.dropped_count) == (0, 1)
+
+
+def test_merger_respects_max_segment():
+    ranges = [(0, 9500), (9600, 9900), (10000, 20000)]
+    assert SegmentMerger(1000, 10000).merge(ranges) == [(0, 9900), (10000, 20000)]
+    # 两侧合并后都会超过最长时长时丢弃，0表示不限制
+    assert SegmentMerger(1000, 9800).merge(ranges) == [(0, 9500), (10000, 20000)]
+    assert SegmentMerger(1000, 0).merge(ranges) == [(0, 9900), (10000, 20000)]
+
+
+def test_merger_empty_and_single():
+    assert SegmentMerger().merge([]) == []
+    assert list(SegmentMerger().iter_merge([])) == []
+    assert SegmentMerger().merge([(0, 500)]) == []
+
+
+def test_iter_merge_matches_merge():
+    """逐个产出的结果与一次性合并相同，计数也相同"""
+    rng = np.random.RandomState(6)
+    for _ in range(500):
+        ranges, position = [], 0
+        for _ in range(rng.randint(0, 30)):
+            position += int(rng.randint(0, 2500))
+            length = int(rng.randint(1, 3000))
+            ranges.append((position, position + length))
+            position += length
+        max_segment_ms = int(rng.choice([0, 3000, 30000]))
+        merger, streaming = SegmentMerger(1000, max_segment_ms), SegmentMerger(1000, max_segment_ms)
+        expected = merger.merge(ranges)
+        consumed = []
+
+        def source():
+            for segment in ranges:
+                consumed.append(segment)
+                yield segment
+
+        actual = []
+        for segment in streaming.iter_merge(source()):
+            # 读到间隔超过 max_gap_ms 的下一个片段时就产出之前的片段，不必等到全部读完
+            assert len(consumed) == len(ranges) or consumed[-1][0] - segment[1] > streaming.max_gap_ms
+            actual.append(segment)
+        assert actual == expected
+        assert (streaming.merged_count, streaming.dropped_count) == (merger.merged_count, merger.dropped_count)
+        for start, end in actual:
+            assert end - start >= 1000
+
+
+def random_peaks(rng, frame_count):
+    """随机的每帧 (最小值, 最大值)，最小值不大于最大值"""
+    values = np.sort(rng.randint(-32768, 32768, size=(frame_count, 2)), axis=1)
+    return values.astype(np.int16)
+
+
+def reference_range_peaks(peaks, start_ms, end_ms, columns, frame_length=FRAME_LENGTH_MS):
+    """
+    直接在每帧的峰值上求每列的峰值
+
+    选用每列至少包含 PEAK_PYRAMID_FACTOR 的整数次幂帧中最大的一个作为分组，
+    列的边界对齐到分组的边界，与金字塔中相应层的结果相同。
+    """
+    column_ms = (end_ms - start_ms) / columns
+    group = 1
+    while group * PEAK_PYRAMID_FACTOR < len(peaks) and group * PEAK_PYRAMID_FACTOR * frame_length <= column_ms:
+        group *= PEAK_PYRAMID_FACTOR
+    group_count = -(-len(peaks) // group)
+    edges = np.floor(np.linspace(start_ms, end_ms, columns + 1) / (group * frame_length)).astype(np.int64)
+    result = np.zeros((columns, 2), dtype=np.float32)
+    for k in range(columns):
+        first = edges[k]
+        if first < 0 or first >= group_count:
+            continue
+        last = min(max(edges[k + 1], first + 1), group_count)
+        frames = peaks[first * group:last * group]
+        result[k] = frames[:, 0].min() / 32768.0, frames[:, 1].max() / 32768.0
+    return result
+
+
+def test_peak_pyramid_levels():
+    peaks = random_peaks(np.random.RandomState(7), 1000)
+    pyramid = PeakPyramid(peaks)
+    assert pyramid.duration_ms == 1000 * FRAME_LENGTH_MS
+    np.testing.assert_array_equal(pyramid.levels[0], peaks)
+    for level, data in enumerate(pyramid.levels[1:], 1):
+        group = PEAK_PYRAMID_FACTOR ** level
+        assert len(data) == -(-len(peaks) // group)
+        # 每一项是对应的一组帧的最小值和最大值，末尾不足一组的也一样
+        for index in (0, len(data) // 2, len(data) - 1):
+            frames = peaks[index * group:(index + 1) * group]
+            assert tuple(data[index]) == (frames[:, 0].min(), frames[:, 1].max())
+    assert len(pyramid.levels[-1]) <= PEAK_PYRAMID_FACTOR
+
+
+def test_peak_pyramid_range_peaks_matches_reference():
+    rng = np.random.RandomState(8)
+    for _ in range(300):
+        peaks = random_peaks(rng, int(rng.randint(1, 5000)))
+        pyramid = PeakPyramid(peaks)
+        duration_ms = pyramid.duration_ms
+        # 覆盖放大到一帧以下、整个文件的概览以及超出文件两端的范围
+        span = int(rng.choice([rng.randint(1, 200), rng.randint(1, duration_ms + 1), duration_ms * 2]))
+        start = int(rng.randint(-span // 2, duration_ms))
+        columns = int(rng.randint(1, 800))
+        np.testing.assert_array_equal(pyramid.range_peaks(start, start + span, columns),
+                                      reference_range_peaks(peaks, start, start + span, columns))
+
+
+def test_peak_pyramid_overview_keeps_extremes():
+    peaks = random_peaks(np.random.RandomState(9), 100000)
+    result = PeakPyramid(peaks).range_peaks(0, 100000 * FRAME_LENGTH_MS, 640)
+    assert result.shape == (640, 2)
+    assert result[:, 0].min() == peaks[:, 0].min() / 32768.0
+    assert result[:, 1].max() == peaks[:, 1].max() / 32768.0
+
+
+def test_peak_pyramid_columns_outside_audio_are_zero():
+    pyramid = PeakPyramid(np.full((100, 2), [-1000, 2000], dtype=np.int16))
+    result = pyramid.range_peaks(-1000, 2000, 30)
+    # 每列100毫秒：前10列在开头之前，后10列在结尾之后
+    assert not result[:10].any() and not result[20:].any()
+    np.testing.assert_array_equal(result[10:20], np.tile([-1000 / 32768.0, 2000 / 32768.0], (10, 1)))
+
+
+def test_peak_pyramid_from_envelope():
+    frame_dbfs = np.zeros(10)
+    assert PeakPyramid.from_envelope(None) is None
+    assert PeakPyramid.from_envelope(AudioEnvelope(frame_dbfs, 100, 0.0, 8000, 1, FRAME_LENGTH_MS)) is None
+    empty = np.zeros((0, 2), dtype=np.int16)
+    assert PeakPyramid.from_envelope(AudioEnvelope(frame_dbfs, 100, 0.0, 8000, 1, FRAME_LENGTH_MS, empty)) is None
+    peaks = random_peaks(np.random.RandomState(10), 10)
+    pyramid = PeakPyramid.from_envelope(AudioEnvelope(frame_dbfs, 100, 0.0, 8000, 1, 20, peaks))
+    assert (pyramid.frame_length, pyramid.duration_ms) == (20, 200)
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pydub = pytest.importorskip('pydub')
+
+from audio_analysis import FRAME_LENGTH_MS, compute_frame_dbfs, detect_silent_ranges
+from benchmark_segmenter import FIXTURE_RATE, MIN_SILENCE_MS, SILENCE_THRESH, synth_speech
+
+# 冒烟基准的音频时长(分钟)，与 benchmark_segmenter.py 中最短的合成音频相同
+SMOKE_MINUTES = 1
+
+# 1分钟音频的检测耗时上限(秒)。正常只需几毫秒，上限留得很宽，
+# 只用来发现退回逐帧切片这样数量级的变慢，不受CI机器快慢的影响
+MAX_DETECT_SECONDS = 10.0
+
+# 合成的句子首尾各有30ms渐变，静默边界可以延伸进渐变部分
+BOUNDARY_TOLERANCE_MS = 3 * FRAME_LENGTH_MS
+
+
+@pytest.fixture(scope='module')
+def speech():
+    """不经过ffmpeg，直接把合成语音的PCM包装成AudioSegment，同时返回真实的停顿区间"""
+    blocks = []
+    pauses = []
+    position = 0
+    for block, speaking in synth_speech(SMOKE_MINUTES):
+        if not speaking:
+            pauses.append((position, position + len(block)))
+        blocks.append(block)
+        position += len(block)
+    audio = pydub.AudioSegment(data=np.concatenate(blocks).tobytes(), sample_width=2, frame_rate=FIXTURE_RATE,
+                               channels=1)
+    to_ms = 1000.0 / FIXTURE_RATE
+    return audio, [(start * to_ms, end * to_ms) for start, end in pauses]
+
+
+def test_detect_smoke_benchmark(speech):
+    audio, pauses = speech
+    start_time = time.perf_counter()
+    frame_dbfs = compute_frame_dbfs(audio)
+    silent_ranges = detect_silent_ranges(frame_dbfs, SILENCE_THRESH, MIN_SILENCE_MS, len(audio))
+    seconds = time.perf_counter() - start_time
+    assert seconds < MAX_DETECT_SECONDS
+
+    # 检测到的静默都落在真实的停顿内，足够长的停顿都被检测到
+    for start, end in silent_ranges:
+        assert any(pause_start - BOUNDARY_TOLERANCE_MS <= start and end <= pause_end + BOUNDARY_TOLERANCE_MS
+                   for pause_start, pause_end in pauses)
+    long_pauses = [pause for pause in pauses if pause[1] - pause[0] >= MIN_SILENCE_MS + BOUNDARY_TOLERANCE_MS]
+    assert long_pauses
+    for pause_start, pause_end in long_pauses:
+        assert any(start < pause_end and pause_start < end for start, end in silent_ranges)
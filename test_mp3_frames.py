@@ -0,0 +1,172 @@
+import struct
+
+import pytest
+
+from mp3_frames import (DECODER_DELAY, LAME_TAG_SIZE, MP3File, crc16, id3v2_size, parse_frame_header,
+                        probe_duration_ms)
+
+
+def header_bytes(bitrate_index=9, sample_rate_index=0, padding=0, mono=False, mpeg1=True):
+    """Layer III、无CRC的帧头；默认为MPEG1 128kbps 44.1kHz立体声"""
+    return bytes([0xFF, 0xFB if mpeg1 else 0xF3,
+                  (bitrate_index << 4) | (sample_rate_index << 2) | (padding << 1),
+                  0xC0 if mono else 0x00])
+
+
+def audio_frame(**kwargs):
+    """帧头加上全零的帧数据，长度与帧头一致"""
+    header = header_bytes(**kwargs)
+    return header + bytes(parse_frame_header(header, 0).frame_size - 4)
+
+
+def info_frame(frame_count, delay=576, padding=1000, tag=b'Info', lame=True):
+    """带帧数和LAME标签(编码器延迟和填充)的Info/Xing标签帧"""
+    header = header_bytes()
+    frame = bytearray(parse_frame_header(header, 0).frame_size)
+    frame[:4] = header
+    p = 4 + 32
+    frame[p:p + 4] = tag
+    frame[p + 4:p + 120] = struct.pack('>III', 0x0F, frame_count, 0) + bytes(100) + struct.pack('>I', 0)
+    p += 120
+    if lame:
+        lame_tag = bytearray(b'LAME3.100'.ljust(LAME_TAG_SIZE, b'\x00'))
+        lame_tag[21:24] = bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF])
+        frame[p:p + LAME_TAG_SIZE] = lame_tag
+    return bytes(frame)
+
+
+def id3_tag(body_size, footer=False):
+    """ID3v2标签，长度按同步安全整数编码"""
+    size = bytes([(body_size >> 21) & 0x7F, (body_size >> 14) & 0x7F, (body_size >> 7) & 0x7F, body_size & 0x7F])
+    return b'ID3\x04\x00' + bytes([0x10 if footer else 0]) + size + bytes(body_size) + (bytes(10) if footer else b'')
+
+
+@pytest.fixture
+def write_mp3(tmp_path):
+    def write(data, name='test.mp3'):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+def test_parse_mpeg1_header():
+    header = parse_frame_header(header_bytes(), 0)
+    assert header.version == 1
+    assert (header.bitrate, header.sample_rate) == (128, 44100)
+    assert header.frame_size == 417
+    assert (header.samples_per_frame, header.side_info_size) == (1152, 32)
+    assert parse_frame_header(header_bytes(padding=1), 0).frame_size == 418
+    assert parse_frame_header(header_bytes(mono=True), 0).side_info_size == 17
+
+
+def test_parse_mpeg2_header():
+    header = parse_frame_header(header_bytes(bitrate_index=8, mono=True, mpeg1=False), 0)
+    assert header.version == 2
+    assert (header.bitrate, header.sample_rate) == (64, 22050)
+    assert header.frame_size == 72000 * 64 // 22050
+    assert (header.samples_per_frame, header.side_info_size) == (576, 9)
+
+
+@pytest.mark.parametrize('data', [
+    b'\xff\xfb\x90',  # 不足4字节
+    b'\xfe\xfb\x90\x00',  # 同步字错误
+    b'\xff\xfd\x90\x00',  # Layer II
+    b'\xff\xfb\x00\x00',  # 自由码率
+    b'\xff\xfb\xf0\x00',  # 无效码率
+    b'\xff\xfb\x9c\x00',  # 无效采样率
+    b'\xff\xeb\x90\x00',  # 保留的版本号
+])
+def test_parse_invalid_header(data):
+    assert parse_frame_header(data, 0) is None
+
+
+def test_id3v2_size():
+    assert id3v2_size(b'') == 0
+    assert id3v2_size(audio_frame()) == 0
+    assert id3v2_size(id3_tag(300)) == 310
+    assert id3v2_size(id3_tag(300, footer=True)) == 320
+
+
+def test_crc16_matches_crc16_arc():
+    assert crc16(b'123456789') == 0xBB3D
+    assert crc16(b'') == 0
+
+
+def test_scan_cbr_without_tag(write_mp3):
+    path = write_mp3(id3_tag(1000) + audio_frame() * 50)
+    mp3 = MP3File(path)
+    assert len(mp3) == 50
+    assert mp3.offsets[0] == 1010
+    assert mp3.tag_frames is None and mp3.lame_tag is None
+    assert mp3.start_skip == 0
+    assert mp3.duration_ms() == round(50 * 1152 * 1000 / 44100)
+
+
+def test_scan_resyncs_after_garbage(write_mp3):
+    # 帧之间混入包含0xFF的无效数据，扫描时跳过它们重新同步
+    frames = [audio_frame(padding=i % 2) for i in range(20)]
+    data = b''.join(frames[:10]) + b'\xff\x00\xff\xfd\x12\xff' + b''.join(frames[10:]) + b'TAG' + bytes(125)
+    mp3 = MP3File(write_mp3(data))
+    assert len(mp3) == 20
+    assert mp3.sizes == [len(frame) for frame in frames]
+
+
+def test_info_frame_with_lame_tag(write_mp3):
+    path = write_mp3(info_frame(40, delay=576, padding=1000) + audio_frame() * 40)
+    mp3 = MP3File(path)
+    # 标签帧不算音频帧
+    assert len(mp3) == 40
+    assert mp3.tag_frames == 40
+    assert (mp3.encoder_delay, mp3.encoder_padding) == (576, 1000)
+    assert mp3.start_skip == 576 + DECODER_DELAY
+    assert mp3.duration_ms() == round((40 * 1152 - 576 - 1000) * 1000 / 44100)
+
+
+def test_padding_shorter_than_decoder_delay(write_mp3):
+    mp3 = MP3File(write_mp3(info_frame(10, delay=576, padding=100) + audio_frame() * 10))
+    assert mp3.duration_ms() == round((10 * 1152 - 576 - DECODER_DELAY) * 1000 / 44100)
+
+
+def test_xing_without_lame_tag(write_mp3):
+    mp3 = MP3File(write_mp3(info_frame(30, tag=b'Xing', lame=False) + audio_frame() * 30))
+    assert mp3.tag_frames == 30
+    assert mp3.lame_tag is None and mp3.start_skip == 0
+    assert mp3.duration_ms() == round(30 * 1152 * 1000 / 44100)
+
+
+def test_probe_duration_reads_only_the_tag(write_mp3):
+    # 标签中的帧数优先于实际的帧数，说明没有扫描整个文件
+    path = write_mp3(info_frame(1000) + audio_frame() * 200)
+    assert probe_duration_ms(path) == round((1000 * 1152 - 576 - 1000) * 1000 / 44100)
+    # 没有标签帧时扫描全部帧头计数
+    assert probe_duration_ms(write_mp3(audio_frame() * 200, 'plain.mp3')) == round(200 * 1152 * 1000 / 44100)
+
+
+def test_probe_duration_rejects_non_mp3(write_mp3):
+    with pytest.raises(ValueError):
+        probe_duration_ms(write_mp3(b'RIFF' + bytes(4000), 'not_mp3.wav'))
+
+
+def test_frame_time_round_trip(write_mp3):
+    mp3 = MP3File(write_mp3(info_frame(100) + audio_frame() * 100))
+    for index in (0, 1, 37, 100):
+        assert mp3.frame_at_ms(mp3.frame_to_ms(index)) == index
+
+
+@pytest.mark.parametrize('first, last', [(0, 10), (10, 30), (25, 40)])
+def test_write_segment_round_trip(write_mp3, tmp_path, first, last):
+    source = MP3File(write_mp3(info_frame(40, delay=576, padding=1000) + audio_frame() * 40))
+    output = str(tmp_path / 'segment.mp3')
+    size = source.write_segment(output, first, last)
+
+    segment = MP3File(output)
+    assert len(segment) == last - first
+    assert segment.tag_frames == last - first
+    # 编码器延迟只在包含原文件开头时保留，填充只在包含结尾时保留
+    assert segment.encoder_delay == (576 if first == 0 else 0)
+    assert segment.encoder_padding == (1000 if last == len(source) else 0)
+    # 标签帧在文件开头，LAME标签的最后两字节是它之前全部数据的CRC
+    tag_end = 4 + 32 + 120 + LAME_TAG_SIZE
+    assert struct.unpack('>H', segment.data[tag_end - 2:tag_end])[0] == crc16(segment.data[:tag_end - 2])
+    assert size == len(segment.data)
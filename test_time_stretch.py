@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pydub = pytest.importorskip('pydub')
+
+from time_stretch import StretchKey, TimeStretchCache, stretch_audio, wsola
+
+FRAME_RATE = 16000
+
+
+def tone(seconds, channels=1, frequency=220.0, frame_rate=FRAME_RATE):
+    """幅度为0.3满幅的正弦波，多声道时各声道相位不同"""
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    return np.stack([0.3 * 32767 * np.sin(2 * np.pi * frequency * t + c) for c in range(channels)], axis=1)
+
+
+@pytest.mark.parametrize('rate', [0.5, 0.75, 1.25, 1.5, 2.0])
+@pytest.mark.parametrize('channels', [1, 2])
+def test_wsola_output_length(rate, channels):
+    samples = tone(1.3, channels)
+    output = wsola(samples, rate, FRAME_RATE)
+    assert output.dtype == np.float32
+    assert output.shape == (int(round(len(samples) / rate)), channels)
+
+
+def test_wsola_keeps_pitch_and_level():
+    samples = tone(2.0)
+    output = wsola(samples, 0.5, FRAME_RATE)[:, 0]
+    # 去掉两端的半个窗，中间的波形仍是同一频率、同一幅度的正弦波
+    middle = output[FRAME_RATE // 10:-FRAME_RATE // 10]
+    spectrum = np.abs(np.fft.rfft(middle * np.hanning(len(middle))))
+    peak_hz = np.argmax(spectrum) * FRAME_RATE / len(middle)
+    assert abs(peak_hz - 220.0) < 2.0
+    assert np.sqrt(np.mean(middle ** 2)) == pytest.approx(0.3 * 32767 / np.sqrt(2), rel=0.05)
+
+
+def test_wsola_rate_one_returns_copy():
+    samples = tone(0.5, 2)
+    output = wsola(samples, 1.0, FRAME_RATE)
+    np.testing.assert_array_equal(output, samples.astype(np.float32))
+    assert output is not samples
+
+
+def test_wsola_one_dimensional_input():
+    output = wsola(tone(0.5)[:, 0], 2.0, FRAME_RATE)
+    assert output.shape == (FRAME_RATE // 4, 1)
+
+
+@pytest.mark.parametrize('rate', [0.5, 2.0])
+def test_wsola_shorter_than_one_frame(rate):
+    # 不足一帧(40ms)时只补零或截断到目标长度
+    samples = tone(0.01)
+    output = wsola(samples, rate, FRAME_RATE)
+    assert len(output) == int(round(len(samples) / rate))
+    kept = min(len(samples), len(output))
+    np.testing.assert_array_equal(output[:kept], samples[:kept].astype(np.float32))
+
+
+def test_stretch_audio_keeps_format():
+    samples = np.round(tone(1.0, 2)).astype('<i2')
+    audio = pydub.AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=FRAME_RATE, channels=2)
+    stretched = stretch_audio(audio, 0.8)
+    assert (stretched.frame_rate, stretched.channels, stretched.sample_width) == (FRAME_RATE, 2, 2)
+    assert int(stretched.frame_count()) == int(round(len(samples) / 0.8))
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TimeStretchCache(max_size_mb=1)
+    keys = [StretchKey('a.mp3', i * 1000, (i + 1) * 1000, 0.5) for i in range(3)]
+    for key in keys:
+        cache.store(key, bytes(400 * 1024))
+        # 取用一次，第一项成为最近使用的，下一次加入时淘汰的是第二项
+        cache.file_for(keys[0])
+    assert keys[0] in cache and keys[2] in cache
+    assert keys[1] not in cache
+
+
+def test_cache_keeps_oversized_newest_entry():
+    cache = TimeStretchCache(max_size_mb=1)
+    key = StretchKey('a.mp3', 0, None, 0.5)
+    cache.store(key, bytes(2 * 1024 * 1024))
+    assert key in cache
+
+
+def test_cache_file_for_writes_once():
+    cache = TimeStretchCache()
+    key = StretchKey('a.mp3', 0, None, 0.75)
+    assert cache.file_for(key) is None
+    cache.store(key, b'RIFF....')
+    path = cache.file_for(key)
+    assert cache.file_for(key) == path
+    with open(path, 'rb') as f:
+        assert f.read() == b'RIFF....'
+    cache.clear()
+
+
+def test_cache_clear_removes_files():
+    cache = TimeStretchCache()
+    key = StretchKey('a.mp3', 0, None, 0.75)
+    cache.store(key, b'RIFF....')
+    path = cache.file_for(key)
+    cache.clear()
+    assert key not in cache
+    assert not os.path.exists(path)
+
+
+def test_cache_drops_render_started_before_clear():
+    cache = TimeStretchCache()
+    key = StretchKey('a.mp3', 0, None, 0.75)
+    samples = np.round(tone(0.2)).astype('<i2')
+
+    def load_segment(_):
+        # 渲染过程中片段列表改变，这次的结果基于旧的片段文件
+        cache.clear()
+        return pydub.AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=FRAME_RATE, channels=1)
+
+    assert cache.render(key, load_segment) is None
+    assert key not in cache
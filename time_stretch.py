@@ -0,0 +1,232 @@
+import io
+import os
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+import numpy as np
+from pydub import AudioSegment
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# WSOLA的分析帧长度(毫秒)，约为语音基音周期的几倍；相邻帧重叠一半
+DEFAULT_FRAME_MS = 40
+
+# 每帧在标称位置前后搜索最相似波形的范围(毫秒)
+SEARCH_MS = 10
+
+# 粗搜索时对单声道信号的抽取倍数，找到大致位置后再在原采样率下细调
+SEARCH_DECIMATION = 4
+
+# 变速结果缓存的内存上限(MB)，44.1kHz立体声每分钟约10MB
+DEFAULT_STRETCH_CACHE_MB = 200
+
+# 一个变速结果：源文件、片段在源文件中的起止位置(毫秒，end_ms 为None表示整个文件)和速率
+StretchKey = namedtuple('StretchKey', ['source_file', 'start_ms', 'end_ms', 'rate'])
+
+
+def _hann(length):
+    """周期汉宁窗，帧移为窗长一半时各帧的窗函数之和恒为1"""
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)).astype(np.float32)
+
+
+def wsola(samples, rate, frame_rate, frame_ms=DEFAULT_FRAME_MS, search_ms=SEARCH_MS):
+    """
+    用WSOLA(波形相似重叠相加)改变语速而不改变音调
+
+    输出每隔半帧取一帧输入，取帧位置按 rate 推进；每帧在标称位置附近搜索
+    与上一帧自然延续最相似的波形，再加窗重叠相加，拼接处相位连续。
+    只有逐帧的位置搜索是循环，取帧、加窗和重叠相加都是整块的数组运算。
+
+    参数:
+    samples (np.ndarray): 形状为 (采样帧数, 声道数) 的PCM
+    rate (float): 播放速率，小于1变慢，大于1变快
+    frame_rate (int): 采样率
+    frame_ms (int): 分析帧长度(毫秒)
+    search_ms (int): 位置搜索范围(毫秒)
+
+    返回:
+    np.ndarray: float32，形状为 (约 采样帧数 / rate, 声道数)
+    """
+    x = np.asarray(samples, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[:, None]
+    length, channels = x.shape
+    out_length = int(round(length / rate))
+    frame = max(4, int(frame_rate * frame_ms / 1000) // 2 * 2)
+    hop = frame // 2
+    tolerance = int(frame_rate * search_ms / 1000)
+    if rate == 1.0:
+        return x.copy()
+    if length < frame:
+        # 不足一帧时只调整长度
+        return np.pad(x, ((0, max(0, out_length - length)), (0, 0)))[:out_length]
+
+    frame_count = -(-out_length // hop) + 1
+    # 两端补零，所有候选位置都不越界
+    pad = tolerance + frame
+    tail = int(frame_count * hop * rate) + 2 * frame + tolerance - length
+    xp = np.pad(x, ((pad, pad + max(0, tail)), (0, 0)))
+    mono = xp.mean(axis=1)
+    mono_coarse = mono[::SEARCH_DECIMATION]
+    offsets = np.arange(frame)
+    refine = np.arange(-SEARCH_DECIMATION, SEARCH_DECIMATION + 1)
+
+    positions = np.empty(frame_count, dtype=np.int64)
+    positions[0] = pad
+    for k in range(1, frame_count):
+        nominal = pad + int(round(k * hop * rate))
+        natural = positions[k - 1] + hop  # 上一帧在输入中的自然延续
+        low = nominal - tolerance
+
+        # 在抽取后的信号上粗搜索
+        template = mono_coarse[natural // SEARCH_DECIMATION:(natural + frame) // SEARCH_DECIMATION]
+        region = mono_coarse[low // SEARCH_DECIMATION:(nominal + tolerance + frame) // SEARCH_DECIMATION]
+        if len(region) >= len(template) > 0:
+            coarse = low + int(np.argmax(np.correlate(region, template, 'valid'))) * SEARCH_DECIMATION
+        else:
+            coarse = nominal
+
+        # 在原采样率下细调
+        candidates = np.clip(coarse + refine, low, nominal + tolerance)
+        scores = mono[candidates[:, None] + offsets] @ mono[natural:natural + frame]
+        positions[k] = candidates[int(np.argmax(scores))]
+
+    # 加窗后重叠相加：帧移为半帧，前半帧和后半帧各自拼成连续的数组再相加
+    window = _hann(frame)
+    frames = xp[positions[:, None] + offsets] * window[None, :, None]
+    output = np.zeros(((frame_count + 1) * hop, channels), dtype=np.float32)
+    output[:frame_count * hop] += frames[:, :hop].reshape(-1, channels)
+    output[hop:] += frames[:, hop:].reshape(-1, channels)
+
+    # 开头只有半个窗，按窗函数之和归一化
+    weights = np.zeros(len(output), dtype=np.float32)
+    weights[:frame_count * hop] += np.tile(window[:hop], frame_count)
+    weights[hop:] += np.tile(window[hop:], frame_count)
+    output /= np.maximum(weights, 1e-3)[:, None]
+    return output[:out_length]
+
+
+def stretch_audio(audio, rate):
+    """
+    改变AudioSegment的语速，音调不变
+
+    返回:
+    AudioSegment: 16位PCM，采样率和声道数与输入相同
+    """
+    audio = audio.set_sample_width(2)
+    samples = np.frombuffer(audio.raw_data, dtype='<i2').reshape(-1, audio.channels)
+    stretched = wsola(samples, rate, audio.frame_rate)
+    data = np.clip(np.round(stretched), -32768, 32767).astype('<i2').tobytes()
+    return AudioSegment(data=data, sample_width=2, frame_rate=audio.frame_rate, channels=audio.channels)
+
+
+class TimeStretchCache:
+    """
+    变速结果的LRU缓存
+
+    每个 (片段, 速率) 的渲染结果以WAV数据保存在内存中，总大小超过上限时淘汰最久未使用的项。
+    播放器需要文件路径，取用时才把WAV写入临时目录，同一项只写一次，淘汰时一并删除。
+    同一句反复慢放时只在第一次渲染。
+    片段列表改变时清空：重新分段后片段文件名不变而内容不同，旧的渲染结果不能再用。
+    """
+
+    def __init__(self, max_size_mb=DEFAULT_STRETCH_CACHE_MB):
+        """
+        参数:
+        max_size_mb (int): 缓存的WAV数据总大小上限(MB)
+        """
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.entries = OrderedDict()  # StretchKey -> WAV数据，最近使用的在后
+        self.files = {}  # StretchKey -> 已写出的临时文件
+        self.file_count = 0
+        self.lock = threading.Lock()  # 渲染在后台线程中进行
+        self.temp_dir = None
+        self.generation = 0  # 每次清空加一，清空前开始渲染的结果不再加入缓存
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def file_for(self, key):
+        """
+        返回变速结果的文件路径，并把它标记为最近使用
+
+        返回:
+        str: 临时WAV文件路径，没有缓存时返回None
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                return None
+            self.entries.move_to_end(key)
+            path = self.files.get(key)
+            if path is None or not os.path.exists(path):
+                self.file_count += 1
+                path = os.path.join(self._ensure_temp_dir(), f"stretch_{self.file_count}.wav")
+                with open(path, 'wb') as f:
+                    f.write(data)
+                self.files[key] = path
+            return path
+
+    def render(self, key, load_segment):
+        """
+        取得变速结果，没有缓存时渲染并加入缓存
+
+        参数:
+        key (StretchKey): 片段和速率
+        load_segment (callable): 根据 key 返回原速的AudioSegment
+
+        返回:
+        str: 临时WAV文件路径，渲染期间清空过缓存时返回None
+        """
+        if key not in self:
+            generation = self.generation
+            buffer = io.BytesIO()
+            stretch_audio(load_segment(key), key.rate).export(buffer, format='wav')
+            self.store(key, buffer.getvalue(), generation)
+        return self.file_for(key)
+
+    def store(self, key, data, generation=None):
+        """
+        加入一项WAV数据，然后按上限淘汰最久未使用的项(刚加入的一项总是保留)
+
+        参数:
+        generation (int): 开始渲染时的 generation，之后清空过缓存时丢弃这一项
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            total = sum(len(value) for value in self.entries.values())
+            while total > self.max_bytes and len(self.entries) > 1:
+                old_key, old_data = self.entries.popitem(last=False)
+                total -= len(old_data)
+                self._remove_file(old_key)
+
+    def clear(self):
+        """清空缓存并删除临时文件"""
+        with self.lock:
+            for key in list(self.files):
+                self._remove_file(key)
+            self.entries.clear()
+            self.generation += 1
+
+    def _ensure_temp_dir(self):
+        if self.temp_dir is None:
+            self.temp_dir = tempfile.mkdtemp(prefix='stretch_')
+            atexit.register(shutil.rmtree, self.temp_dir, True)
+        return self.temp_dir
+
+    def _remove_file(self, key):
+        path = self.files.pop(key, None)
+        if path:
+            try:
+                os.remove(path)
+            except OSError as e:
+                # 播放器仍在使用时(Windows)删除失败，退出时随临时目录一起删除
+                logger.info(f"删除变速文件失败: {str(e)}")
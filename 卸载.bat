@@ -1,3 +1,4 @@
 pip uninstall -y PyQt5
 pip uninstall -y pydub
-pip uninstall -y packaging
\ No newline at end of file
+pip uninstall -y packaging
+pip uninstall -y numpy
\ No newline at end of file